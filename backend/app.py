@@ -1,21 +1,75 @@
+import atexit
+import signal
+import sys
+import time
 from flask import Flask, jsonify
 from flask_cors import CORS
 
 from squats_routes import squats_bp
 from pushups_routes import pushups_bp
 from bicep_curls_routes import bicep_bp
+from group_routes import group_bp
+from persistence import PersistenceQueue
+from push_routes import push_bp
+from recording_routes import recording_bp
+from reports_routes import reports_bp
+from tracing_routes import tracing_bp
+from resource_manager import ResourceManager
+from session_store import NODE_ID
+from warmup import Warmup, WARMUP_ENABLED
 
-app = Flask(__name__)
-CORS(app, resources={r"/*": {"origins": "http://localhost:3000"}}, supports_credentials=True)
+def create_app(warmup=WARMUP_ENABLED):
+    """
+    Builds the Flask app. Registering the blueprints is cheap: each exercise imports its
+    model stack (cv2, MediaPipe, TensorFlow) the first time one of its routes is used.
+    With `warmup`, those imports and model loads start right away on a background thread.
+    """
+    app = Flask(__name__)
+    CORS(app, resources={r"/*": {"origins": "http://localhost:3000"}}, supports_credentials=True)
 
-# Register the exercise blueprints
-app.register_blueprint(squats_bp)
-app.register_blueprint(pushups_bp)
-app.register_blueprint(bicep_bp)
+    # Register the exercise blueprints
+    app.register_blueprint(squats_bp)
+    app.register_blueprint(pushups_bp)
+    app.register_blueprint(bicep_bp)
+    app.register_blueprint(group_bp)
+    app.register_blueprint(push_bp)
+    app.register_blueprint(recording_bp)
+    app.register_blueprint(reports_bp)
+    app.register_blueprint(tracing_bp)
 
-@app.route("/", methods=["GET"])
-def home():
-    return jsonify({"message": "FitPal Backend Running!"})
+    # Stop stream generators and free the camera and model when the process exits.
+    atexit.register(ResourceManager.get_instance().shutdown)
+
+    # Load and trace the pose models in the background so the first stream starts warm.
+    warmer = Warmup.get_instance()
+    if warmup:
+        warmer.start()
+
+    @app.route("/", methods=["GET"])
+    def home():
+        return jsonify({"message": "FitPal Backend Running!"})
+
+    @app.route("/healthz", methods=["GET"])
+    def healthz():
+        # Liveness only: the process is up and serving requests.
+        return jsonify({"status": "ok", "node": NODE_ID, "uptime_sec": round(time.time() - warmer.started_at, 2)})
+
+    @app.route("/persistence/stats", methods=["GET"])
+    def persistence_stats():
+        # Write-behind queue depth and flush latency for reports and progress files.
+        return jsonify(PersistenceQueue.get_instance().stats())
+
+    @app.route("/readyz", methods=["GET"])
+    def readyz():
+        # Readiness: models warmed and camera available. Load balancers should route on this.
+        status = warmer.status()
+        return jsonify(status), 200 if status["ready"] else 503
+
+    return app
+
+app = create_app()
 
 if __name__ == "__main__":
+    # Turn SIGTERM into a normal exit so the atexit shutdown hook runs.
+    signal.signal(signal.SIGTERM, lambda signum, frame: sys.exit(0))
     app.run(debug=False)
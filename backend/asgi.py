@@ -0,0 +1,130 @@
+# asgi.py
+"""
+ASGI serving mode for high-concurrency viewers.
+
+    uvicorn asgi:app --host 127.0.0.1 --port 5000
+
+Video feeds, server-sent events and WebSockets are served as async tasks fed from one
+shared FrameBroadcaster per exercise; every other route (start/end/report) is the
+unchanged Flask app mounted underneath, so all URLs stay the same.
+"""
+
+import asyncio
+import functools
+import json
+from contextlib import asynccontextmanager
+
+from a2wsgi import WSGIMiddleware
+from starlette.applications import Starlette
+from starlette.concurrency import run_in_threadpool
+from starlette.responses import JSONResponse, StreamingResponse
+from starlette.routing import Mount, Route, WebSocketRoute
+from starlette.websockets import WebSocketDisconnect
+
+from app import app as flask_app
+import squats_routes
+import pushups_routes
+import bicep_curls_routes
+import group_routes
+from broadcast import FrameBroadcaster
+from models.frame_pool import FramePool
+from models.preprocess import InferencePreprocessor
+from models.presence import new_presence_gate
+from models.recorder import new_recorder
+from resource_manager import ResourceManager
+
+STREAMS = {
+    "squats": squats_routes,
+    "pushups": pushups_routes,
+    "bicep_curls": bicep_curls_routes,
+    "group": group_routes,
+}
+def stream_producer(name, module):
+    # Each broadcaster is the single producer for its stream, so it owns that stream's buffers.
+    pool = FramePool()
+    produce = functools.partial(module.read_jpeg_frame, pool=pool, preprocessor=InferencePreprocessor(pool=pool),
+                                gate=new_presence_gate(), recorder=new_recorder(name))
+
+    def read_frame():
+        # cv2 and the exercise module are bound on the first frame, not at startup, so the
+        # model stack still loads only when a stream is actually watched.
+        nonlocal produce
+        if "cv2" not in produce.keywords:
+            import cv2
+            bound = {"cv2": cv2}
+            if hasattr(module, "exercise"):
+                bound["model"] = module.exercise()
+            produce = functools.partial(produce, **bound)
+        return produce()
+    return read_frame
+
+broadcasters = {name: FrameBroadcaster(name, stream_producer(name, module)) for name, module in STREAMS.items()}
+resource_manager = ResourceManager.get_instance()
+
+async def camera_ready():
+    cam = await run_in_threadpool(resource_manager.init_camera)
+    return cam.isOpened()
+
+async def mjpeg(broadcaster):
+    async for jpeg in broadcaster.subscribe():
+        yield (b'--frame\r\n'
+               b'Content-Type: image/jpeg\r\n\r\n' + jpeg + b'\r\n')
+
+def video_feed(name):
+    async def endpoint(request):
+        if not await camera_ready():
+            return JSONResponse({"message": "Camera not started. Start workout first."}, status_code=403)
+        return StreamingResponse(mjpeg(broadcasters[name]),
+                                 media_type="multipart/x-mixed-replace; boundary=frame")
+    return endpoint
+
+async def events(request):
+    name = request.path_params["exercise"]
+    if name not in STREAMS:
+        return JSONResponse({"message": f"Unknown exercise: {name}"}, status_code=404)
+
+    async def stats_stream():
+        # Emits the session stats whenever they change, paced by the shared frame stream.
+        last = None
+        async for _ in broadcasters[name].subscribe():
+            stats = STREAMS[name].session_stats()
+            if stats != last:
+                last = stats
+                yield f"data: {json.dumps(stats)}\n\n"
+
+    # The mounted Flask app handles CORS for everything else; EventSource needs it here too.
+    headers = {
+        "Cache-Control": "no-cache",
+        "Access-Control-Allow-Origin": "http://localhost:3000",
+        "Access-Control-Allow-Credentials": "true",
+    }
+    return StreamingResponse(stats_stream(), media_type="text/event-stream", headers=headers)
+
+async def frames_ws(websocket):
+    name = websocket.path_params["exercise"]
+    if name not in STREAMS:
+        await websocket.close(code=1008)
+        return
+    await websocket.accept()
+    try:
+        async for jpeg in broadcasters[name].subscribe():
+            await websocket.send_bytes(jpeg)
+    except WebSocketDisconnect:
+        return
+    await websocket.close()
+
+@asynccontextmanager
+async def lifespan(app):
+    yield
+    # Cancel the stream tokens first so every producer's next read returns None.
+    await run_in_threadpool(resource_manager.shutdown)
+    await asyncio.gather(*(b.stop() for b in broadcasters.values()))
+
+routes = [Route(f"/video_feed/{name}", video_feed(name)) for name in STREAMS]
+routes += [
+    Route("/events/{exercise}", events),
+    WebSocketRoute("/ws/{exercise}", frames_ws),
+    Mount("/", app=WSGIMiddleware(flask_app)),
+]
+
+app = Starlette(routes=routes, lifespan=lifespan)
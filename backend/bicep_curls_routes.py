@@ -1,63 +1,83 @@
-from flask import Blueprint, Response, jsonify
-import cv2
-import mediapipe as mp
+from flask import Blueprint, Response, jsonify, request
 import logging
+import threading
 import time
-from models.bicep_curl import process_bicep_frame, save_progress, Smoother, SMOOTHING_WINDOW, GESTURE_FRAME_THRESHOLD, MODE_PIXEL_THRESHOLD
+from models.tracing import activate, get_tracer, span, trace_requested, enable_tracing, disable_tracing
 from resource_manager import ResourceManager
-from utils import save_report  # ✅ for reporting
+from session_store import SessionManager
+from utils import save_report, dry_run_requested  # ✅ for reporting
 
 logging.basicConfig(level=logging.INFO, format='%(asctime)s %(levelname)s: %(message)s')
 bicep_bp = Blueprint('bicep_curls', __name__)
 resource_manager = ResourceManager.get_instance()
-pose = resource_manager.get_pose()
-
-state = {
-    'session_state': "waiting",
-    'calibration_data': [],
-    'calibration_target_frames': 30,
-    'baseline_shoulder_tilt': None,
-    'session_start_time': None,
-    'left_count': 0,
-    'right_count': 0,
-    'left_flag': False,
-    'right_flag': False,
-    'left_smoother': Smoother(window_size=SMOOTHING_WINDOW),
-    'right_smoother': Smoother(window_size=SMOOTHING_WINDOW),
-    'left_angle': 0,
-    'right_angle': 0,
-    'posture_alert': False,
-    'mode': "both",
-    'left_mode_counter': 0,
-    'right_mode_counter': 0,
-    'both_mode_counter': 0,
-    'gesture_frame_threshold': GESTURE_FRAME_THRESHOLD,
-    'mode_pixel_threshold': MODE_PIXEL_THRESHOLD,
-    'reset_gesture_counter': 0,
-    'pose': pose
-}
-streaming_active_bicep = True
+sessions = SessionManager.get_instance()
+STREAM = "bicep_curls"
+# models.bicep_curl pulls in cv2, MediaPipe and TensorFlow, so it is imported by exercise() on first use.
+_exercise = None
+_exercise_lock = threading.Lock()
+state = {}  # Filled in by exercise()
 session_start_time_bicep = None
+# Session state a resumed session carries over; calibration and smoothing start afresh.
+SNAPSHOT_KEYS = ('left_count', 'right_count', 'left_flag', 'right_flag', 'mode', 'session_state')
+
+def exercise():
+    """Imports the bicep curl model stack and builds the session state the first time it is needed."""
+    global _exercise
+    with _exercise_lock:
+        if _exercise is None:
+            from models import bicep_curl
+            state.update({
+                'session_state': "waiting",
+                'shoulder_baseline': bicep_curl.new_shoulder_baseline(bicep_curl.CALIBRATION_FRAMES),
+                'calibration_target_frames': bicep_curl.CALIBRATION_FRAMES,
+                'baseline_shoulder_tilt': None,
+                'session_start_time': None,
+                'left_count': 0,
+                'right_count': 0,
+                'left_flag': False,
+                'right_flag': False,
+                'left_smoother': bicep_curl.Smoother(window_size=bicep_curl.SMOOTHING_WINDOW),
+                'right_smoother': bicep_curl.Smoother(window_size=bicep_curl.SMOOTHING_WINDOW),
+                'left_angle': 0,
+                'right_angle': 0,
+                'posture_alert': False,
+                'mode': "both",
+                'left_mode_counter': 0,
+                'right_mode_counter': 0,
+                'both_mode_counter': 0,
+                'gesture_frame_threshold': bicep_curl.GESTURE_FRAME_THRESHOLD,
+                'mode_pixel_threshold': bicep_curl.MODE_PIXEL_THRESHOLD,
+                'reset_gesture_counter': 0,
+                'pose': None  # Fetched from the resource manager on every frame
+            })
+            _exercise = bicep_curl
+    return _exercise
 
 @bicep_bp.route('/start-bicep-curls', methods=['GET'])
 def start_bicep_curls():
-    global streaming_active_bicep, state, session_start_time_bicep
-    streaming_active_bicep = True
-    session_start_time_bicep = time.time()
+    global state, session_start_time_bicep
+    bicep_curl = exercise()
+    resource_manager.start_stream(STREAM)
+    if trace_requested(request):
+        enable_tracing(STREAM)
+    else:
+        disable_tracing(STREAM)
+    session_id, saved = sessions.begin(STREAM, request, user=request.args.get("user", "anonymous"))
+    session_start_time_bicep = saved["session_start_time"] if saved else time.time()
     cam = resource_manager.init_camera(source=0)
     if not cam.isOpened():
         return jsonify({"message": "Error: Unable to access camera."}), 500
     state.update({
         'session_state': "waiting",
-        'calibration_data': [],
+        'shoulder_baseline': bicep_curl.new_shoulder_baseline(state['calibration_target_frames']),
         'baseline_shoulder_tilt': None,
         'session_start_time': time.time(),
         'left_count': 0,
         'right_count': 0,
         'left_flag': False,
         'right_flag': False,
-        'left_smoother': Smoother(window_size=SMOOTHING_WINDOW),
-        'right_smoother': Smoother(window_size=SMOOTHING_WINDOW),
+        'left_smoother': bicep_curl.Smoother(window_size=bicep_curl.SMOOTHING_WINDOW),
+        'right_smoother': bicep_curl.Smoother(window_size=bicep_curl.SMOOTHING_WINDOW),
         'left_angle': 0,
         'right_angle': 0,
         'posture_alert': False,
@@ -66,45 +86,108 @@ def start_bicep_curls():
         'both_mode_counter': 0,
         'reset_gesture_counter': 0
     })
-    return jsonify({"message": "✅ Bicep curl trainer started successfully!"})
+    if saved:
+        state.update({key: saved["state"][key] for key in SNAPSHOT_KEYS if key in saved["state"]})
+        if state['session_state'] == "active":
+            # The shoulder baseline was not carried over, so learn it again before counting.
+            state['session_state'] = "calibrating"
+    return sessions.attach(jsonify({"message": "✅ Bicep curl trainer started successfully!",
+                                    "session": session_id, "session_token": sessions.token(STREAM),
+                                    "left_reps": state['left_count'], "right_reps": state['right_count']}), STREAM)
 
 @bicep_bp.route('/video_feed/bicep_curls', methods=['GET'])
 def video_feed_bicep_curls():
+    if trace_requested(request):
+        enable_tracing(STREAM)
     if not resource_manager.init_camera().isOpened():
         return jsonify({"message": "Camera not started. Start workout first."}), 403
-    return Response(generate_frames_bicep(), mimetype="multipart/x-mixed-replace; boundary=frame")
+    return sessions.attach(Response(generate_frames_bicep(), mimetype="multipart/x-mixed-replace; boundary=frame"), STREAM)
 
-def generate_frames_bicep():
-    global streaming_active_bicep, state
-    cam = resource_manager.init_camera()
-    while streaming_active_bicep:
-        ret, frame = cam.read()
+def snapshot():
+    return {"state": {key: state[key] for key in SNAPSHOT_KEYS}, "session_start_time": session_start_time_bicep}
+
+def read_jpeg_frame(token=None, pool=None, preprocessor=None, gate=None, recorder=None, cv2=None, model=None):
+    """
+    Reads, annotates and encodes one camera frame. Returns None once the stream should stop.
+    Pass the same FramePool, InferencePreprocessor, PresenceGate and Recorder on every call (one of each per stream),
+    and bind cv2 and the exercise module once per stream so a frame takes neither the import nor the exercise lock.
+    """
+    global state
+    if cv2 is None:
+        import cv2
+    bicep_curl = model or exercise()
+    token = token or resource_manager.stream_token(STREAM)
+    if token.cancelled:
+        return None
+    with activate(get_tracer(STREAM)), span("frame"):
+        with span("camera.read"):
+            ret, frame = pool.read('camera', resource_manager.read_frame) if pool is not None else resource_manager.read_frame()
         if not ret:
-            break
-        frame, state = process_bicep_frame(frame, state)
-        ret2, buffer = cv2.imencode('.jpg', frame)
-        if not ret2:
-            break
-        yield (b'--frame\r\n'
-               b'Content-Type: image/jpeg\r\n\r\n' + buffer.tobytes() + b'\r\n')
+            return None
+        state['pose'] = resource_manager.get_pose()
+        with span("process"):
+            frame, state = bicep_curl.process_bicep_frame(frame, state, pool, preprocessor, gate)
+        if recorder is not None:
+            with span("record"):
+                recorder.offer(frame, state['left_count'] + state['right_count'])
+        with span("jpeg.encode"):
+            ret2, buffer = cv2.imencode('.jpg', frame)
+        sessions.checkpoint(STREAM, snapshot)
+    if not ret2:
+        return None
+    return buffer.tobytes()
+
+def session_stats():
+    exercise()
+    return {
+        "left_reps": state['left_count'],
+        "right_reps": state['right_count'],
+        "mode": state['mode'],
+        "session_state": state['session_state'],
+        "posture_alert": state['posture_alert'],
+        "active": not resource_manager.stream_token(STREAM).cancelled
+    }
+
+def generate_frames_bicep():
+    import cv2
+    from models.frame_pool import FramePool
+    from models.preprocess import InferencePreprocessor
+    from models.presence import new_presence_gate
+    from models.recorder import new_recorder
+    token = resource_manager.stream_token(STREAM)
+    pool = FramePool()
+    preprocessor = InferencePreprocessor(pool=pool)
+    gate = new_presence_gate()
+    recorder = new_recorder(STREAM)
+    model = exercise()
+    with token:
+        while True:
+            jpeg = read_jpeg_frame(token, pool, preprocessor, gate, recorder, cv2, model)
+            if jpeg is None:
+                break
+            yield (b'--frame\r\n'
+                   b'Content-Type: image/jpeg\r\n\r\n' + jpeg + b'\r\n')
 
 @bicep_bp.route('/end-bicep-curls', methods=['GET'])
 def end_bicep_curls():
-    global streaming_active_bicep
-    streaming_active_bicep = False
-    resource_manager.release_camera()
+    resource_manager.end_stream(STREAM)
+    if _exercise is not None:  # Nothing to save, nor any reason to load the models, if it never started
+        sessions.checkpoint(STREAM, snapshot, force=True)
     return jsonify({"message": "Bicep curl workout ended."})
 
 @bicep_bp.route('/generate-bicep-curls-report', methods=['GET'])
 def generate_bicep_curls_report():
     global session_start_time_bicep, state
+    exercise()
     end_time = time.time()
     duration = round(end_time - session_start_time_bicep, 2) if session_start_time_bicep else 0
     total_reps = state['left_count'] + state['right_count'] if state['mode'] == "both" else state[f"{state['mode']}_count"]
 
-    report = save_report("bicep_curls", total_reps, duration, mode=state['mode'])
+    report = save_report("bicep_curls", total_reps, duration, mode=state['mode'], user=request.args.get("user", "anonymous"),
+                         session=sessions.session_id(STREAM), dry_run=dry_run_requested(request))
     state['left_count'] = 0
     state['right_count'] = 0
+    sessions.finish(STREAM)
 
     return jsonify({
         "message": "📄 Bicep curls report generated!",
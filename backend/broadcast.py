@@ -0,0 +1,81 @@
+# broadcast.py
+
+import asyncio
+import logging
+from concurrent.futures import ThreadPoolExecutor
+
+class FrameBroadcaster:
+    """
+    Runs one producer per exercise stream and fans the latest JPEG out to every viewer.
+
+    The producer is a blocking callable (e.g. squats_routes.read_jpeg_frame) that returns
+    the next encoded frame or None when the stream ends. It runs on a dedicated worker
+    thread so camera reads and inference never block the event loop, and it is shared:
+    a hundred viewers cost one inference per frame, not a hundred. Slow viewers simply
+    skip to the newest frame instead of queueing old ones.
+    """
+
+    def __init__(self, name, produce):
+        self.name = name
+        self.produce = produce
+        self.executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix=f"stream-{name}")
+        self.frame = None
+        self.seq = 0
+        self.closed = False
+        self.viewers = 0
+        self._cond = None
+        self._task = None
+
+    def _condition(self):
+        # Created lazily so it binds to the running event loop.
+        if self._cond is None:
+            self._cond = asyncio.Condition()
+        return self._cond
+
+    def _ensure_producer(self):
+        if self._task is None or self._task.done():
+            self.closed = False
+            self._task = asyncio.get_running_loop().create_task(self._run())
+
+    async def _run(self):
+        loop = asyncio.get_running_loop()
+        cond = self._condition()
+        try:
+            while self.viewers > 0:
+                jpeg = await loop.run_in_executor(self.executor, self.produce)
+                if jpeg is None:
+                    break
+                async with cond:
+                    self.frame = jpeg
+                    self.seq += 1
+                    cond.notify_all()
+        except Exception:
+            logging.exception("Stream producer %s failed", self.name)
+        finally:
+            async with cond:
+                self.closed = True
+                cond.notify_all()
+
+    async def subscribe(self):
+        """Async generator yielding each new frame until the stream ends."""
+        cond = self._condition()
+        self.viewers += 1
+        self._ensure_producer()
+        last_seq = self.seq
+        try:
+            while True:
+                async with cond:
+                    await cond.wait_for(lambda: self.seq != last_seq or self.closed)
+                    if self.seq == last_seq:
+                        return
+                    last_seq = self.seq
+                    frame = self.frame
+                yield frame
+        finally:
+            self.viewers -= 1
+
+    async def stop(self):
+        self.viewers = 0
+        if self._task is not None:
+            await asyncio.gather(self._task, return_exceptions=True)
+        self.executor.shutdown(wait=False)
@@ -0,0 +1,145 @@
+from flask import Blueprint, Response, jsonify, request
+import logging
+import threading
+import time
+from models.tracing import activate, get_tracer, span, trace_requested, enable_tracing, disable_tracing
+from resource_manager import ResourceManager
+from utils import save_report, dry_run_requested
+
+logging.basicConfig(level=logging.INFO, format='%(asctime)s %(levelname)s: %(message)s')
+
+group_bp = Blueprint('group', __name__)
+resource_manager = ResourceManager.get_instance()
+
+STREAM = "group"
+EXERCISES = ("squats", "pushups", "bicep_curls")
+# models.group pulls in cv2 and TensorFlow, so the session is built on first use.
+session = None
+session_lock = threading.Lock()
+session_start_time = None
+
+def group_session(exercise=None):
+    """The current GroupSession; a new one is built when `exercise` differs from it."""
+    global session
+    with session_lock:
+        if session is None or (exercise is not None and exercise != session.exercise):
+            from models.group import GroupSession
+            session = GroupSession(exercise or "squats")
+    return session
+
+@group_bp.route('/start-group', methods=['GET'])
+def start_group():
+    global session_start_time
+    exercise = request.args.get('exercise', 'squats')
+    if exercise not in EXERCISES:
+        return jsonify({"message": f"Unknown exercise: {exercise}. Use one of {list(EXERCISES)}."}), 400
+    group_session(exercise).reset()
+    resource_manager.start_stream(STREAM)
+    if trace_requested(request):
+        enable_tracing(STREAM)
+    else:
+        disable_tracing(STREAM)
+    session_start_time = time.time()
+    cam = resource_manager.init_camera(source=0)
+    if not cam.isOpened():
+        return jsonify({"message": "Error: Unable to access camera."}), 500
+    return jsonify({"message": f"✅ Group {exercise} session started successfully!", "exercise": exercise})
+
+@group_bp.route('/video_feed/group', methods=['GET'])
+def video_feed_group():
+    if trace_requested(request):
+        enable_tracing(STREAM)
+    if not resource_manager.init_camera().isOpened():
+        return jsonify({"message": "Camera not started. Start workout first."}), 403
+    return Response(generate_frames(), mimetype="multipart/x-mixed-replace; boundary=frame")
+
+def read_jpeg_frame(token=None, pool=None, preprocessor=None, gate=None, recorder=None, cv2=None):
+    """
+    Reads, annotates and encodes one camera frame with everyone in view.
+    Returns None once the stream should stop.
+    """
+    if cv2 is None:
+        import cv2
+    group = group_session()
+    token = token or resource_manager.stream_token(STREAM)
+    if token.cancelled:
+        return None
+    with activate(get_tracer(STREAM)), span("frame"):
+        with span("camera.read"):
+            ret, frame = pool.read('camera', resource_manager.read_frame) if pool is not None else resource_manager.read_frame()
+        if not ret:
+            return None
+        with span("process"):
+            processed_frame = group.process_frame(frame, pool, preprocessor, gate)
+        if recorder is not None:
+            with span("record"):
+                recorder.offer(processed_frame, sum(person["reps"] for person in group.stats()))
+        with span("jpeg.encode"):
+            ret2, buffer = cv2.imencode('.jpg', processed_frame)
+    if not ret2:
+        return None
+    return buffer.tobytes()
+
+def session_stats():
+    group = group_session()
+    return {"exercise": group.exercise, "people": group.stats(), "earlier": group.earlier_stats(),
+            "active": not resource_manager.stream_token(STREAM).cancelled}
+
+def generate_frames():
+    import cv2
+    from models.frame_pool import FramePool
+    from models.preprocess import InferencePreprocessor
+    from models.presence import new_presence_gate
+    from models.recorder import new_recorder
+    token = resource_manager.stream_token(STREAM)
+    pool = FramePool()
+    preprocessor = InferencePreprocessor(pool=pool)
+    gate = new_presence_gate()
+    recorder = new_recorder(STREAM)
+    with token:
+        while True:
+            jpeg = read_jpeg_frame(token, pool, preprocessor, gate, recorder, cv2)
+            if jpeg is None:
+                break
+            yield (b'--frame\r\n'
+                   b'Content-Type: image/jpeg\r\n\r\n' + jpeg + b'\r\n')
+
+@group_bp.route('/group/stats', methods=['GET'])
+def group_stats():
+    return jsonify(session_stats())
+
+@group_bp.route('/end-group', methods=['GET'])
+def end_group():
+    resource_manager.end_stream(STREAM)
+    group = group_session()
+    return jsonify({"message": "🏁 Group workout ended.", "people": group.stats(), "earlier": group.earlier_stats()})
+
+@group_bp.route('/generate-group-report', methods=['GET'])
+def generate_group_report():
+    # One report per tracked person, attributed to "<user>#<person id>", plus one for everyone
+    # the tracker no longer keeps individually, attributed to "<user>#earlier".
+    global session_start_time
+    group = group_session()
+    duration = round(time.time() - session_start_time, 2) if session_start_time else 0
+    user = request.args.get("user", "group")
+    people = []
+    for person in group.stats():
+        if person["reps"] == 0:
+            continue
+        report = save_report(group.exercise, person["reps"], duration, mode="group",
+                             user=f"{user}#{person['id']}", dry_run=dry_run_requested(request))
+        people.append({"id": person["id"], "reps": person["reps"], "calories": report["calories"]})
+    earlier = group.earlier_stats()
+    if earlier["reps"]:
+        report = save_report(group.exercise, earlier["reps"], duration, mode="group",
+                             user=f"{user}#earlier", dry_run=dry_run_requested(request))
+        people.append({"id": "earlier", "people": earlier["people"], "reps": earlier["reps"],
+                       "calories": report["calories"]})
+    group.reset()
+
+    return jsonify({
+        "message": "📄 Group report generated!",
+        "exercise": group.exercise,
+        "duration": duration,
+        "people": people
+    })
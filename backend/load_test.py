@@ -0,0 +1,359 @@
+"""
+Load test: how many concurrent trainees can one backend node serve?
+
+Starts N synthetic clients against a running server. Each one drives a whole session
+at a fixed frame rate, then ends it and generates its report. N is stepped up
+(1, 2, 4, ... by default) until quality degrades.
+
+    python load_test.py                                        # synthetic squat keypoints
+    python load_test.py --mode frames --source models/squats.mp4 --fps 15
+    python load_test.py --mode keypoints --source models/squats.mp4 --clients 1,8,32
+    python load_test.py --mode stream --exercise pushups       # viewers of the camera feed
+
+Modes:
+  keypoints  POST MoveNet keypoints to /push/<session>/keypoints (counting only).
+             --source is a video (its keypoints come from the keypoint cache) or a saved
+             (frames, 17, 3) .npy array; without --source a synthetic squat is sent.
+  frames     POST JPEG frames from a video to /push/<session>/frame (full pose inference).
+  stream     /start-<exercise>, every client reads /video_feed/<exercise>, then /end-* and
+             /generate-*-report. All clients share the node's one camera session.
+
+Reports are generated with ?dry_run=1, so load-test sessions never reach reports.json or
+the leaderboards.
+
+For every concurrency level it prints the sustained FPS per session, request latency
+percentiles (frame gaps in stream mode), errors, and the server's CPU and memory use from
+/push/stats. A level is degraded when the median session falls below --min-fps-ratio of
+the target FPS, p95 latency exceeds --max-p95-ms (default: one frame interval) or more than
+1% of requests fail.
+"""
+import argparse
+import http.client
+import json
+import sys
+import threading
+import time
+from urllib.parse import urlsplit
+
+import numpy as np
+
+MAX_ERROR_RATE = 0.01
+
+# ----- SOURCES -----
+def synthetic_keypoints(fps, seconds=4.0, rep_seconds=2.0):
+    """A person squatting and curling once every rep_seconds, as (frames, 17, 3) pixels."""
+    t = np.arange(int(fps * seconds)) / fps
+    bend = (1 - np.cos(2 * np.pi * t / rep_seconds)) / 2  # 0 standing .. 1 bottom
+    keypoints = np.zeros((len(t), 17, 3), dtype=np.float32)
+    keypoints[:, :, 2] = 0.9
+    base = {0: (320, 80), 5: (290, 150), 6: (350, 150), 11: (300, 280), 12: (340, 280)}
+    for index, (x, y) in base.items():
+        keypoints[:, index, :2] = (x, y)
+    # Each distal joint sits at `angle` from straight up around its middle joint.
+    for (root, joint, end), angle in (((11, 13, 15), 180 - 100 * bend), ((12, 14, 16), 180 - 100 * bend),
+                                      ((5, 7, 9), 180 - 140 * bend), ((6, 8, 10), 180 - 140 * bend)):
+        keypoints[:, joint, :2] = keypoints[:, root, :2] + (0, 90)
+        radians = np.radians(angle)
+        keypoints[:, end, 0] = keypoints[:, joint, 0] + 90 * np.sin(radians)
+        keypoints[:, end, 1] = keypoints[:, joint, 1] - 90 * np.cos(radians)
+    return keypoints
+
+def load_keypoint_payloads(source, fps):
+    if source is None:
+        keypoints = synthetic_keypoints(fps)
+    elif source.endswith(".npy"):
+        keypoints = np.load(source)
+    else:
+        from models.keypoint_cache import load_keypoints
+        keypoints = np.asarray(load_keypoints(source)[0].keypoints)
+    return [json.dumps({"keypoints": k.tolist()}).encode() for k in keypoints]
+
+def load_frame_payloads(source, width, quality, max_frames):
+    import cv2
+    if source is None:
+        sys.exit("--mode frames needs --source <video>")
+    cap = cv2.VideoCapture(source)
+    frames = []
+    while len(frames) < max_frames:
+        ok, frame = cap.read()
+        if not ok:
+            break
+        if width and frame.shape[1] > width:
+            frame = cv2.resize(frame, (width, round(frame.shape[0] * width / frame.shape[1])), interpolation=cv2.INTER_AREA)
+        frames.append(cv2.imencode(".jpg", frame, [cv2.IMWRITE_JPEG_QUALITY, quality])[1].tobytes())
+    cap.release()
+    if not frames:
+        sys.exit(f"Could not read any frames from {source}")
+    return frames
+
+# ----- CLIENTS -----
+class Client(threading.Thread):
+    """One synthetic trainee with its own keep-alive connection."""
+    def __init__(self, index, args, payloads, deadline):
+        super().__init__(name=f"client-{index}", daemon=True)
+        self.index = index
+        self.args = args
+        self.payloads = payloads
+        self.deadline = deadline
+        url = urlsplit(args.url)
+        self.host, self.port = url.hostname, url.port or 80
+        self.conn = None
+        self.latencies_ms = []
+        self.server_ms = []
+        self.frames = 0
+        self.errors = 0
+        self.elapsed = 0.0
+        self.reps = None
+        self.failure = None
+
+    def request(self, method, path, body=None, headers=None):
+        if self.conn is None:
+            self.conn = http.client.HTTPConnection(self.host, self.port, timeout=self.args.timeout)
+        try:
+            self.conn.request(method, path, body=body, headers=headers or {})
+            response = self.conn.getresponse()
+            data = response.read()
+        except (OSError, http.client.HTTPException):
+            self.conn.close()
+            self.conn = None
+            raise
+        return response.status, data
+
+    def call_json(self, path):
+        status, data = self.request("GET", path)
+        if status != 200:
+            raise RuntimeError(f"GET {path}: HTTP {status} {data[:200]!r}")
+        return json.loads(data)
+
+    def run(self):
+        try:
+            if self.args.mode == "stream":
+                self.run_stream()
+            else:
+                self.run_push()
+        except Exception as e:
+            self.failure = str(e)
+        finally:
+            if self.conn is not None:
+                self.conn.close()
+
+    def run_push(self):
+        args = self.args
+        user = f"loadtest-{self.index}"
+        session = self.call_json(f"/start-push?exercise={args.exercise}&user={user}")["session"]
+        path, content_type = ((f"/push/{session}/keypoints", "application/json") if args.mode == "keypoints"
+                              else (f"/push/{session}/frame", "image/jpeg"))
+        interval = 1.0 / args.fps
+        start = time.perf_counter()
+        next_send = start
+        while next_send < self.deadline:
+            payload = self.payloads[(self.frames + self.index) % len(self.payloads)]
+            sent = time.perf_counter()
+            try:
+                status, data = self.request("POST", path, payload, {"Content-Type": content_type})
+            except (OSError, http.client.HTTPException):
+                status, data = None, b""
+            done = time.perf_counter()
+            if status == 200:
+                self.frames += 1
+                self.latencies_ms.append((done - sent) * 1000)
+                self.server_ms.append(json.loads(data)["server_ms"])
+            else:
+                self.errors += 1
+            # Fixed schedule: a client that falls behind sends its next frame at once
+            # rather than catching up in a burst, so its FPS shows the shortfall.
+            next_send = max(next_send + interval, done)
+            time.sleep(max(0.0, next_send - time.perf_counter()))
+        self.elapsed = time.perf_counter() - start
+        self.call_json(f"/end-push/{session}")
+        self.reps = self.call_json(f"/generate-push-report/{session}?user={user}&dry_run=1")["reps"]
+
+    def run_stream(self):
+        # Frame boundaries in the MJPEG body; the gap between them is the latency sample.
+        self.conn = http.client.HTTPConnection(self.host, self.port, timeout=self.args.timeout)
+        self.conn.request("GET", f"/video_feed/{self.args.exercise}")
+        response = self.conn.getresponse()
+        if response.status != 200:
+            raise RuntimeError(f"/video_feed/{self.args.exercise}: HTTP {response.status}")
+        start = last = time.perf_counter()
+        tail = b""
+        while time.perf_counter() < self.deadline:
+            chunk = response.read1(65536)
+            if not chunk:
+                self.errors += 1  # Stream ended early
+                break
+            boundaries = (tail + chunk).count(b"--frame")
+            tail = (tail + chunk)[-(len(b"--frame") - 1):]  # Too short to hold a whole boundary
+            if boundaries:
+                now = time.perf_counter()
+                self.latencies_ms.extend([(now - last) * 1000 / boundaries] * boundaries)
+                self.frames += boundaries
+                last = now
+        self.elapsed = time.perf_counter() - start
+
+# ----- MEASUREMENT -----
+class ServerSampler(threading.Thread):
+    """Polls /push/stats once a second for the server's CPU time and memory."""
+    def __init__(self, url):
+        super().__init__(name="server-sampler", daemon=True)
+        self.url = urlsplit(url)
+        self.samples = []
+        self.stopped = threading.Event()
+
+    def sample(self):
+        conn = http.client.HTTPConnection(self.url.hostname, self.url.port or 80, timeout=5)
+        try:
+            conn.request("GET", "/push/stats")
+            response = conn.getresponse()
+            if response.status == 200:
+                stats = json.loads(response.read())
+                stats["at"] = time.perf_counter()
+                self.samples.append(stats)
+                return stats
+        except (OSError, http.client.HTTPException, ValueError):
+            pass
+        finally:
+            conn.close()
+        return None
+
+    def run(self):
+        while not self.stopped.wait(1.0):
+            self.sample()
+
+    def summary(self):
+        if len(self.samples) < 2:
+            return {"cpu_pct": None, "rss_mb": None}
+        first, last = self.samples[0], self.samples[-1]
+        rss = [s["rss_mb"] for s in self.samples if s.get("rss_mb") is not None]
+        return {"cpu_pct": round(100 * (last["cpu_sec"] - first["cpu_sec"]) / (last["at"] - first["at"]), 1),
+                "rss_mb": max(rss) if rss else None}
+
+def percentile(values, q):
+    return round(float(np.percentile(values, q)), 1) if values else None
+
+def run_level(clients_count, args, payloads):
+    control = Client(-1, args, payloads, 0)  # Starts and ends the shared stream session
+    if args.mode == "stream":
+        control.call_json(f"/start-{args.exercise}")
+    sampler = ServerSampler(args.url)
+    sampler.sample()
+    sampler.start()
+    deadline = time.perf_counter() + args.duration
+    clients = [Client(i, args, payloads, deadline) for i in range(clients_count)]
+    for client in clients:
+        client.start()
+    for client in clients:
+        client.join(args.duration + args.timeout * 3)
+    sampler.stopped.set()
+    sampler.join()
+    sampler.sample()
+    if args.mode == "stream":
+        control.call_json(f"/end-{args.exercise}")
+        control.call_json(f"/generate-{args.exercise}-report?user=loadtest&dry_run=1")
+
+    fps = sorted(c.frames / c.elapsed if c.elapsed else 0.0 for c in clients)
+    latencies = [ms for c in clients for ms in c.latencies_ms]
+    server_ms = [ms for c in clients for ms in c.server_ms]
+    frames = sum(c.frames for c in clients)
+    errors = sum(c.errors for c in clients)
+    failures = [c.failure for c in clients if c.failure]
+    result = {
+        "clients": clients_count,
+        "fps_median": round(float(np.median(fps)), 2),
+        "fps_min": round(fps[0], 2),
+        "total_fps": round(sum(fps), 1),
+        "p50_ms": percentile(latencies, 50),
+        "p95_ms": percentile(latencies, 95),
+        "p99_ms": percentile(latencies, 99),
+        "server_p95_ms": percentile(server_ms, 95),
+        "frames": frames,
+        "errors": errors + len(failures),
+        "failures": failures[:3],
+        "reps": [c.reps for c in clients if c.reps is not None],
+        **sampler.summary(),
+    }
+    reasons = []
+    if failures:
+        reasons.append(f"{len(failures)} session(s) failed")
+    if result["fps_median"] < args.min_fps_ratio * args.fps:
+        reasons.append(f"median {result['fps_median']} FPS < {args.min_fps_ratio:.0%} of {args.fps}")
+    if result["p95_ms"] is not None and result["p95_ms"] > args.max_p95_ms:
+        reasons.append(f"p95 {result['p95_ms']} ms > {args.max_p95_ms:.0f} ms")
+    if errors > MAX_ERROR_RATE * max(frames + errors, 1):
+        reasons.append(f"{errors} failed requests")
+    result["degraded"] = reasons
+    return result
+
+def print_row(r):
+    def fmt(value, spec=""):
+        return "-" if value is None else format(value, spec)
+    print(f"{r['clients']:>7} {r['fps_median']:>8.1f} {r['fps_min']:>7.1f} {r['total_fps']:>8.1f} "
+          f"{fmt(r['p50_ms']):>7} {fmt(r['p95_ms']):>7} {fmt(r['p99_ms']):>7} {fmt(r['server_p95_ms']):>8} "
+          f"{r['errors']:>6} {fmt(r['cpu_pct']):>6} {fmt(r['rss_mb']):>7}  {'; '.join(r['degraded']) or 'ok'}")
+
+def concurrency_levels(spec):
+    if "," in spec or spec.isdigit():
+        return [int(n) for n in spec.split(",")]
+    low, high = (int(n) for n in spec.split(":"))  # "1:64" doubles from 1 up to 64
+    levels = [low]
+    while levels[-1] * 2 <= high:
+        levels.append(levels[-1] * 2)
+    return levels
+
+def main():
+    parser = argparse.ArgumentParser(description="Load-test a FitPal backend with concurrent synthetic trainees.")
+    parser.add_argument("--url", default="http://127.0.0.1:5000")
+    parser.add_argument("--mode", choices=("keypoints", "frames", "stream"), default="keypoints")
+    parser.add_argument("--exercise", choices=("squats", "pushups", "bicep_curls"), default="squats")
+    parser.add_argument("--source", help="video file, or .npy keypoints for --mode keypoints")
+    parser.add_argument("--clients", default="1:64",
+                        help="concurrency levels: a list (1,4,16) or a doubling range (1:64)")
+    parser.add_argument("--fps", type=float, default=15.0, help="target frames per second per session")
+    parser.add_argument("--duration", type=float, default=20.0, help="seconds per concurrency level")
+    parser.add_argument("--frame-width", type=int, default=640, help="downscale pushed frames to this width")
+    parser.add_argument("--jpeg-quality", type=int, default=80)
+    parser.add_argument("--max-frames", type=int, default=300, help="frames kept in memory from --source")
+    parser.add_argument("--min-fps-ratio", type=float, default=0.9)
+    parser.add_argument("--max-p95-ms", type=float, help="latency budget (default: one frame interval)")
+    parser.add_argument("--timeout", type=float, default=30.0)
+    parser.add_argument("--keep-going", action="store_true", help="run every level even after degradation")
+    parser.add_argument("--json", help="also write the results to this file")
+    args = parser.parse_args()
+    if args.max_p95_ms is None:
+        args.max_p95_ms = 1000.0 / args.fps
+
+    if args.mode == "keypoints":
+        payloads = load_keypoint_payloads(args.source, args.fps)
+    elif args.mode == "frames":
+        payloads = load_frame_payloads(args.source, args.frame_width, args.jpeg_quality, args.max_frames)
+    else:
+        payloads = []
+    print(f"{args.mode} mode, {args.exercise} at {args.fps:g} FPS for {args.duration:g}s per level "
+          f"against {args.url} ({len(payloads)} distinct payloads)")
+    print(f"{'clients':>7} {'fps/ses':>8} {'min':>7} {'total':>8} {'p50ms':>7} {'p95ms':>7} {'p99ms':>7} "
+          f"{'srv p95':>8} {'errors':>6} {'cpu%':>6} {'rss MB':>7}  quality")
+
+    results = []
+    degraded_at = None
+    for level in concurrency_levels(args.clients):
+        result = run_level(level, args, payloads)
+        results.append(result)
+        print_row(result)
+        if result["degraded"] and degraded_at is None:
+            degraded_at = level
+            if not args.keep_going:
+                break
+
+    healthy = [r["clients"] for r in results if not r["degraded"]]
+    if degraded_at is None:
+        print(f"No degradation up to {results[-1]['clients']} concurrent sessions.")
+    else:
+        print(f"Quality degrades at {degraded_at} concurrent sessions"
+              + (f"; last healthy level: {max(c for c in healthy if c < degraded_at)}."
+                 if any(c < degraded_at for c in healthy) else "."))
+    if args.json:
+        with open(args.json, "w") as f:
+            json.dump({"args": vars(args), "levels": results, "degraded_at": degraded_at}, f, indent=2)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,90 @@
+import argparse
+import os
+import sys
+import time
+import tracemalloc
+import cv2
+import numpy as np
+
+# Add parent directory of `models/` (i.e., `backend/`) to Python path
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from models.frame_pool import FramePool, pooled, copy_frame, blend_overlay
+from models import squats, pushups
+
+def squat_pipeline(frame, pool):
+    cv2.cvtColor(frame, cv2.COLOR_BGR2RGB, dst=pooled(pool, 'rgb', frame))
+    return squats.render_ui(frame, 140.0, "Down", 3, squats.Config(), pool)
+
+def pushup_pipeline(frame, pool):
+    cv2.cvtColor(frame, cv2.COLOR_BGR2RGB, dst=pooled(pool, 'rgb', frame))
+    return pushups.render_ui(frame, 130.0, "Up", 3, pushups.Config(), pool)
+
+def bicep_pipeline(frame, pool):
+    # Same image operations as process_bicep_frame, minus the models.
+    frame = cv2.flip(frame, 1, dst=pooled(pool, 'flipped', frame))
+    cv2.cvtColor(frame, cv2.COLOR_BGR2RGB, dst=pooled(pool, 'rgb', frame))
+    overlay = copy_frame(pool, 'overlay', frame)
+    cv2.rectangle(overlay, (0, 0), (frame.shape[1], 100), (50, 50, 50), -1)
+    return blend_overlay(overlay, 0.6, frame, 0.4, pool)
+
+PIPELINES = {"squats": squat_pipeline, "pushups": pushup_pipeline, "bicep_curls": bicep_pipeline}
+
+def make_reader(video_path, width, height):
+    """Returns read(out) -> (ret, frame), from a video file or a synthetic noise frame."""
+    if video_path:
+        cap = cv2.VideoCapture(video_path)
+        if not cap.isOpened():
+            sys.exit(f"Error: Could not open video file: {video_path}")
+        def read(out=None):
+            ret, frame = cap.read(out)
+            if not ret:  # Loop the clip so every run measures the same number of frames.
+                cap.set(cv2.CAP_PROP_POS_FRAMES, 0)
+                ret, frame = cap.read(out)
+            return ret, frame
+        return read
+    source = np.random.default_rng(0).integers(0, 255, (height, width, 3), dtype=np.uint8)
+    def read(out=None):
+        if out is None:
+            return True, source.copy()
+        np.copyto(out, source)
+        return True, out
+    return read
+
+def measure(pipeline, read, frames, warmup, use_pool):
+    pool = FramePool() if use_pool else None
+    allocated, elapsed = [], []
+    tracemalloc.start()
+    try:
+        for i in range(warmup + frames):
+            tracemalloc.reset_peak()
+            before, _ = tracemalloc.get_traced_memory()
+            start = time.perf_counter()
+            ret, frame = pool.read('camera', read) if pool is not None else read()
+            pipeline(frame, pool)
+            elapsed.append(time.perf_counter() - start)
+            _, peak = tracemalloc.get_traced_memory()
+            allocated.append(peak - before)
+    finally:
+        tracemalloc.stop()
+    steady = slice(warmup, None)
+    return np.mean(allocated[steady]), np.mean(elapsed[steady]) * 1000
+
+def main():
+    parser = argparse.ArgumentParser(description="Bytes allocated per frame with and without a FramePool.")
+    parser.add_argument("--video", help="Video file to read frames from (default: synthetic frames)")
+    parser.add_argument("--width", type=int, default=1920)
+    parser.add_argument("--height", type=int, default=1080)
+    parser.add_argument("--frames", type=int, default=100)
+    parser.add_argument("--warmup", type=int, default=5)
+    args = parser.parse_args()
+
+    read = make_reader(args.video, args.width, args.height)
+    print(f"{'pipeline':<12} {'pool':<5} {'bytes/frame':>14} {'ms/frame':>9}")
+    for name, pipeline in PIPELINES.items():
+        for use_pool in (False, True):
+            nbytes, ms = measure(pipeline, read, args.frames, args.warmup, use_pool)
+            print(f"{name:<12} {'yes' if use_pool else 'no':<5} {nbytes:>14,.0f} {ms:>9.2f}")
+
+if __name__ == '__main__':
+    main()
@@ -1,42 +1,174 @@
 import cv2
 import numpy as np
 import json
+import sys
 import time
 from collections import deque
 
-from .pose_estimation import detect_pose, calc_angle, compute_shoulder_tilt, Smoother
+from .pose_estimation import detect_pose, detect_keypoints, calc_angle, compute_shoulder_tilt, Smoother
+from .preprocess import prepare_frame
+from .streaming_stats import BaselineCalibrator
+from .frame_pool import pooled, copy_frame, blend_overlay
+from .tracing import span
+from .config_overrides import apply_overrides
 import mediapipe as mp
 
 # ----- PARAMETERS & SETTINGS -----
 BENT_ANGLE = 50       # Angle considered "fully bent"
 EXTENDED_ANGLE = 160  # Angle considered "fully extended"
 SMOOTHING_WINDOW = 5  # Number of frames for angle smoothing
-POSTURE_THRESHOLD = 5  # Allowed deviation (in degrees) for shoulder tilt
+POSTURE_THRESHOLD = 5  # Minimum allowed deviation (in degrees) for shoulder tilt
+POSTURE_SIGMA = 3.0    # Allowed deviation in standard deviations of the user's own calibration jitter
+BASELINE_ADAPT_RATE = 0.01  # How fast the shoulder baseline follows the user during a session
+CALIBRATION_FRAMES = 30
 TARGET_REPS = 20      # Target rep count for progress bar
 
 GESTURE_FRAME_THRESHOLD = 30   # ~1 second at 30 FPS
 MODE_PIXEL_THRESHOLD = 50      # How far the wrist must be from the shoulder
 
+apply_overrides("bicep_curls", sys.modules[__name__])
+
 # Initialize MediaPipe for drawing landmarks (if needed)
 mp_drawing = mp.solutions.drawing_utils
 mp_pose = mp.solutions.pose
 
+def new_shoulder_baseline(target_frames=CALIBRATION_FRAMES):
+    return BaselineCalibrator(target_frames=target_frames, sigma=POSTURE_SIGMA,
+                              min_threshold=POSTURE_THRESHOLD, adapt_rate=BASELINE_ADAPT_RATE)
+
+class BicepCounter:
+    """
+    Rep counter for one person's curls, counting both arms. Used in group mode, where
+    the gesture-driven session flow of process_bicep_frame does not apply: counting
+    starts right away and posture is judged against a shoulder-tilt baseline learned
+    from the person's first frames.
+    """
+    def __init__(self, min_confidence=0.3):
+        self.min_confidence = min_confidence
+        self.reset()
+
+    def reset(self):
+        self.left_count = 0
+        self.right_count = 0
+        self.left_flag = False
+        self.right_flag = False
+        self.left_smoother = Smoother(window_size=SMOOTHING_WINDOW)
+        self.right_smoother = Smoother(window_size=SMOOTHING_WINDOW)
+        self.shoulder_baseline = new_shoulder_baseline()
+        self.posture_alert = False
+        self.last_rep_time = None
+
+    @property
+    def count(self):
+        return self.left_count + self.right_count
+
+    def process_keypoints(self, keypoints, timestamp=None):
+        """
+        Returns (average elbow angle, feedback), or (None, message) without enough keypoints.
+        `timestamp` is the frame's capture time (default now), recorded as last_rep_time.
+        """
+        if len(keypoints) < 11 or min(keypoints[i][2] for i in range(5, 11)) < self.min_confidence:
+            return None, "Insufficient keypoints detected"
+        left_shoulder, right_shoulder = keypoints[5], keypoints[6]
+        left_angle = self.left_smoother.update(calc_angle(left_shoulder, keypoints[7], keypoints[9]))
+        right_angle = self.right_smoother.update(calc_angle(right_shoulder, keypoints[8], keypoints[10]))
+
+        tilt = compute_shoulder_tilt(left_shoulder, right_shoulder)
+        if self.shoulder_baseline.calibrated:
+            self.posture_alert = self.shoulder_baseline.update(tilt)
+        else:
+            self.shoulder_baseline.calibrate(tilt)
+
+        count_before = self.left_count + self.right_count
+        if left_angle > EXTENDED_ANGLE:
+            self.left_flag = False
+        if left_angle < BENT_ANGLE and not self.left_flag:
+            self.left_count += 1
+            self.left_flag = True
+        if right_angle > EXTENDED_ANGLE:
+            self.right_flag = False
+        if right_angle < BENT_ANGLE and not self.right_flag:
+            self.right_count += 1
+            self.right_flag = True
+
+        if self.left_count + self.right_count > count_before:
+            self.last_rep_time = time.time() if timestamp is None else timestamp
+
+        if self.posture_alert:
+            feedback = "Adjust your posture!"
+        else:
+            feedback = "Curl" if self.left_flag or self.right_flag else "Extend"
+        return (left_angle + right_angle) / 2, feedback
+
 # ----- SAVE PROGRESS FUNCTION -----
-def save_progress(user, left_reps, right_reps, filename="progress.json"):
+def save_progress(user, left_reps, right_reps, filename="progress.json", session="default"):
+    """Queues the user's progress for this session; the write-behind worker writes it to `filename`."""
+    from persistence import PersistenceQueue
     data = {"user": user, "left_reps": left_reps, "right_reps": right_reps, "timestamp": time.time()}
-    with open(filename, "w") as f:
-        json.dump(data, f)
+    PersistenceQueue.get_instance().submit("progress", filename, user=user, session=session, data=data)
 
 # ----- PROCESSING FUNCTION FOR BICEP CURLS -----
-def process_bicep_frame(frame, state):
+def draw_instruction(frame, session_state):
+    """Draws the prompt shown before a session is active, in place."""
+    height, width, _ = frame.shape
+    if session_state == "waiting":
+        cv2.putText(frame, "Cross your arms to start", ((width - 300) // 2, height // 2),
+                    cv2.FONT_HERSHEY_SIMPLEX, 1, (0, 0, 255), 2)
+    elif session_state == "calibrating":
+        cv2.putText(frame, "Hold a neutral pose for calibration...", ((width - 400) // 2, height // 2),
+                    cv2.FONT_HERSHEY_SIMPLEX, 1, (255, 255, 0), 2)
+
+def render_panel(frame, state, pool=None):
+    """
+    Draws the time, reps, mode and progress panel of an active session from `state`.
+    Returns the annotated frame (written into `frame` itself when a FramePool is given).
+    """
+    height, width, _ = frame.shape
+    elapsed_time = time.time() - state['session_start_time'] if state['session_start_time'] else 0
+    if state['mode'] == "both":
+        total_reps = state['left_count'] + state['right_count']
+    elif state['mode'] == "left":
+        total_reps = state['left_count']
+    else:
+        total_reps = state['right_count']
+    panel_height = 100
+    overlay = copy_frame(pool, 'overlay', frame)
+    cv2.rectangle(overlay, (0, 0), (width, panel_height), (50, 50, 50), -1)
+    cv2.putText(overlay, f"Time: {int(elapsed_time)} sec", (10, 30),
+                cv2.FONT_HERSHEY_SIMPLEX, 0.8, (255, 255, 255), 2)
+    cv2.putText(overlay, f"Reps: {total_reps}", (10, 60),
+                cv2.FONT_HERSHEY_SIMPLEX, 0.8, (255, 255, 255), 2)
+    cv2.putText(overlay, f"Mode: {state['mode'].upper()} ARM", (width - 250, 30),
+                cv2.FONT_HERSHEY_SIMPLEX, 0.8, (200, 200, 0), 2)
+    progress_ratio = min(total_reps / TARGET_REPS, 1.0)
+    bar_width = int(width * progress_ratio)
+    cv2.rectangle(overlay, (0, panel_height - 10), (bar_width, panel_height), (0, 255, 0), -1)
+    cv2.putText(overlay, "Reset: Raise both hands above your head", (10, height - 20),
+                cv2.FONT_HERSHEY_SIMPLEX, 0.8, (255, 255, 0), 2)
+    if state['posture_alert']:
+        cv2.putText(overlay, "Adjust your posture!", (10, 90),
+                    cv2.FONT_HERSHEY_SIMPLEX, 0.8, (0, 0, 255), 2)
+    return blend_overlay(overlay, 0.6, frame, 0.4, pool)
+
+def render_ui(frame, state, pool=None):
+    """The overlay for the current session state, drawn without running the models."""
+    if state['session_state'] == "active":
+        return render_panel(frame, state, pool)
+    draw_instruction(frame, state['session_state'])
+    return frame
+
+def process_bicep_frame(frame, state, pool=None, preprocessor=None, gate=None):
     """
-    Processes a single frame for bicep curls.
+    Processes a single frame for bicep curls. With a FramePool, the mirrored frame,
+    RGB copy and overlay reuse its buffers instead of allocating new images. With an
+    InferencePreprocessor, both models run on one downscaled RGB copy. With a
+    PresenceGate, neither model runs while the room is empty.
     
     The state dictionary holds:
       - session_state: "waiting", "calibrating", or "active"
-      - calibration_data: list of shoulder tilt measurements during calibration
+      - shoulder_baseline: BaselineCalibrator for shoulder tilt (see new_shoulder_baseline)
       - calibration_target_frames: number of frames to calibrate (e.g. 30)
-      - baseline_shoulder_tilt: computed average from calibration
+      - baseline_shoulder_tilt: current shoulder tilt baseline (None until calibrated)
       - session_start_time: time when active session began
       - left_count, right_count: rep counters
       - left_flag, right_flag: booleans for rep detection
@@ -50,14 +182,26 @@ def process_bicep_frame(frame, state):
       - pose: MediaPipe Pose instance
     """
     # Mirror and prepare the frame
-    frame = cv2.flip(frame, 1)
+    with span("flip"):
+        frame = cv2.flip(frame, 1, dst=pooled(pool, 'flipped', frame))
     height, width, _ = frame.shape
-    rgb_frame = cv2.cvtColor(frame, cv2.COLOR_BGR2RGB)
+    if gate is not None:
+        with span("presence"):
+            infer = gate.should_infer(frame)
+        if not infer:
+            # Nobody in view: skip the models but keep the overlay for the current state.
+            with span("render"):
+                return render_ui(frame, state, pool), state
+    with span("preprocess"):
+        prepared = prepare_frame(frame, preprocessor, pool)
     
     # Process pose using MediaPipe (for drawing later)
-    results = state['pose'].process(rgb_frame)
-    # Get keypoints using the shared detect_pose function
-    keypoints = detect_pose(rgb_frame)
+    with span("mediapipe"):
+        results = state['pose'].process(prepared.rgb)
+    if gate is not None:
+        gate.report(results.pose_landmarks is not None)
+    # Get keypoints using the shared MoveNet detection
+    keypoints = detect_keypoints(prepared)
     if len(keypoints) < 11:
         return frame, state  # Not enough keypoints detected
     
@@ -80,9 +224,8 @@ def process_bicep_frame(frame, state):
     
     # Compute shoulder tilt for posture feedback
     current_shoulder_tilt = compute_shoulder_tilt(left_shoulder, right_shoulder)
-    posture_alert = False
-    if state['baseline_shoulder_tilt'] is not None and abs(current_shoulder_tilt - state['baseline_shoulder_tilt']) > POSTURE_THRESHOLD:
-        posture_alert = True
+    posture_alert = state['shoulder_baseline'].update(current_shoulder_tilt)
+    state['baseline_shoulder_tilt'] = state['shoulder_baseline'].baseline
     state['posture_alert'] = posture_alert
     
     # Session state management
@@ -94,17 +237,12 @@ def process_bicep_frame(frame, state):
         dist_right = np.linalg.norm(np.array(right_wrist) - np.array(left_shoulder))
         if dist_left < cross_threshold and dist_right < cross_threshold:
             state['session_state'] = "calibrating"
-            state['calibration_data'] = []
-        instruction = "Cross your arms to start"
-        cv2.putText(frame, instruction, ((width - 300) // 2, height // 2),
-                    cv2.FONT_HERSHEY_SIMPLEX, 1, (0, 0, 255), 2)
+            state['shoulder_baseline'] = new_shoulder_baseline(state['calibration_target_frames'])
+        draw_instruction(frame, "waiting")
     elif state['session_state'] == "calibrating":
-        instruction = "Hold a neutral pose for calibration..."
-        cv2.putText(frame, instruction, ((width - 400) // 2, height // 2),
-                    cv2.FONT_HERSHEY_SIMPLEX, 1, (255, 255, 0), 2)
-        state['calibration_data'].append(current_shoulder_tilt)
-        if len(state['calibration_data']) >= state['calibration_target_frames']:
-            state['baseline_shoulder_tilt'] = np.mean(state['calibration_data'])
+        draw_instruction(frame, "calibrating")
+        if state['shoulder_baseline'].calibrate(current_shoulder_tilt):
+            state['baseline_shoulder_tilt'] = state['shoulder_baseline'].baseline
             state['session_state'] = "active"
             state['session_start_time'] = time.time()
     elif state['session_state'] == "active":
@@ -134,31 +272,7 @@ def process_bicep_frame(frame, state):
                 state['right_flag'] = True
         
         # Overlay information panel
-        elapsed_time = time.time() - state['session_start_time'] if state['session_start_time'] else 0
-        if state['mode'] == "both":
-            total_reps = state['left_count'] + state['right_count']
-        elif state['mode'] == "left":
-            total_reps = state['left_count']
-        else:
-            total_reps = state['right_count']
-        panel_height = 100
-        overlay = frame.copy()
-        cv2.rectangle(overlay, (0, 0), (width, panel_height), (50, 50, 50), -1)
-        cv2.putText(overlay, f"Time: {int(elapsed_time)} sec", (10, 30),
-                    cv2.FONT_HERSHEY_SIMPLEX, 0.8, (255, 255, 255), 2)
-        cv2.putText(overlay, f"Reps: {total_reps}", (10, 60),
-                    cv2.FONT_HERSHEY_SIMPLEX, 0.8, (255, 255, 255), 2)
-        cv2.putText(overlay, f"Mode: {state['mode'].upper()} ARM", (width - 250, 30),
-                    cv2.FONT_HERSHEY_SIMPLEX, 0.8, (200, 200, 0), 2)
-        progress_ratio = min(total_reps / TARGET_REPS, 1.0)
-        bar_width = int(width * progress_ratio)
-        cv2.rectangle(overlay, (0, panel_height - 10), (bar_width, panel_height), (0, 255, 0), -1)
-        cv2.putText(overlay, "Reset: Raise both hands above your head", (10, height - 20),
-                    cv2.FONT_HERSHEY_SIMPLEX, 0.8, (255, 255, 0), 2)
-        if posture_alert:
-            cv2.putText(overlay, "Adjust your posture!", (10, 90),
-                        cv2.FONT_HERSHEY_SIMPLEX, 0.8, (0, 0, 255), 2)
-        frame = cv2.addWeighted(overlay, 0.6, frame, 0.4, 0)
+        frame = render_panel(frame, state, pool)
         
         # Mode selection gesture detection
         left_gesture_active = left_wrist[0] < left_shoulder[0] - state['mode_pixel_threshold']
@@ -201,7 +315,7 @@ def process_bicep_frame(frame, state):
             state['left_flag'] = False
             state['right_flag'] = False
             state['session_state'] = "waiting"
-            state['calibration_data'] = []
+            state['shoulder_baseline'].reset()
             state['baseline_shoulder_tilt'] = None
             state['session_start_time'] = None
             state['reset_gesture_counter'] = 0
@@ -210,8 +324,9 @@ def process_bicep_frame(frame, state):
     
     # Optionally draw landmarks from MediaPipe
     if results.pose_landmarks:
-        mp_drawing.draw_landmarks(frame, results.pose_landmarks, mp_pose.POSE_CONNECTIONS,
-                                  mp_drawing.DrawingSpec(color=(0,255,0), thickness=2, circle_radius=4),
-                                  mp_drawing.DrawingSpec(color=(255,0,0), thickness=2, circle_radius=2))
+        with span("landmarks"):
+            mp_drawing.draw_landmarks(frame, results.pose_landmarks, mp_pose.POSE_CONNECTIONS,
+                                      mp_drawing.DrawingSpec(color=(0,255,0), thickness=2, circle_radius=4),
+                                      mp_drawing.DrawingSpec(color=(255,0,0), thickness=2, circle_radius=2))
     
     return frame, state
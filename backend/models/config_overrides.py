@@ -0,0 +1,43 @@
+# config_overrides.py
+import json
+import logging
+import os
+
+# Tuned thresholds written by threshold_sweep.py, keyed by exercise. Set FITPAL_CONFIG_OVERRIDES
+# to use another file; a missing file means the defaults in each model module apply.
+OVERRIDES_PATH = os.environ.get("FITPAL_CONFIG_OVERRIDES",
+                                os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))),
+                                             "config_overrides.json"))
+
+def load_overrides(path=OVERRIDES_PATH):
+    if not os.path.exists(path):
+        return {}
+    with open(path) as f:
+        return json.load(f)
+
+def apply_overrides(exercise, target, path=OVERRIDES_PATH):
+    """
+    Sets each overridden setting for `exercise` as an attribute of `target` (a Config
+    class, or the bicep_curl module whose settings are module constants). Names the
+    target does not already define are ignored with a warning, so typos cannot add settings.
+    """
+    applied = {}
+    for name, value in load_overrides(path).get(exercise, {}).items():
+        if not hasattr(target, name):
+            logging.warning("Ignoring unknown %s setting in %s: %s", exercise, path, name)
+            continue
+        setattr(target, name, value)
+        applied[name] = value
+    if applied:
+        logging.info("Applied %s overrides from %s: %s", exercise, path, applied)
+    return applied
+
+def save_overrides(exercise, values, path=OVERRIDES_PATH):
+    """Replaces the overrides for one exercise, keeping the others."""
+    overrides = load_overrides(path)
+    overrides[exercise] = values
+    tmp = path + ".tmp"
+    with open(tmp, "w") as f:
+        json.dump(overrides, f, indent=2, sort_keys=True)
+    os.replace(tmp, path)
+    return overrides
@@ -0,0 +1,51 @@
+# frame_pool.py
+import cv2
+import numpy as np
+
+class FramePool:
+    """
+    Reusable full-resolution frame buffers for one streaming session.
+
+    Each stage of the pipeline (camera read, mirror, RGB conversion, overlay) asks for
+    a buffer by name and gets the same array back every frame, so OpenCV writes into
+    it through `dst=` instead of allocating a new image. A buffer is only reallocated
+    when the frame size changes. Pools are not thread-safe: use one per stream.
+    """
+    def __init__(self):
+        self.buffers = {}
+
+    def get(self, name, shape, dtype=np.uint8):
+        buf = self.buffers.get(name)
+        if buf is None or buf.shape != shape or buf.dtype != dtype:
+            buf = np.empty(shape, dtype=dtype)
+            self.buffers[name] = buf
+        return buf
+
+    def like(self, name, frame):
+        return self.get(name, frame.shape, frame.dtype)
+
+    def read(self, name, read_frame):
+        """Reads a frame with `read_frame(out)` (e.g. VideoCapture.read) into the named buffer."""
+        ret, frame = read_frame(self.buffers.get(name))
+        if ret:
+            self.buffers[name] = frame
+        return ret, frame
+
+    @property
+    def nbytes(self):
+        return sum(buf.nbytes for buf in self.buffers.values())
+
+def pooled(pool, name, like):
+    """Returns a buffer shaped like `like` for OpenCV's dst=, or None (let OpenCV allocate) without a pool."""
+    return pool.like(name, like) if pool is not None else None
+
+def copy_frame(pool, name, frame):
+    if pool is None:
+        return frame.copy()
+    buf = pool.like(name, frame)
+    np.copyto(buf, frame)
+    return buf
+
+def blend_overlay(overlay, alpha, frame, beta, pool):
+    """cv2.addWeighted(overlay, alpha, frame, beta, 0), written back into `frame` when pooled."""
+    return cv2.addWeighted(overlay, alpha, frame, beta, 0, dst=frame if pool is not None else None)
@@ -0,0 +1,109 @@
+# group.py
+import importlib
+import threading
+import cv2
+
+from .frame_pool import copy_frame, blend_overlay
+from .pose_estimation import detect_poses
+from .preprocess import prepare_frame
+from .tracing import span
+from .tracking import PoseTracker
+
+# MoveNet keypoint pairs drawn as the skeleton (MediaPipe is not used in group mode).
+SKELETON_EDGES = [(5, 6), (5, 7), (7, 9), (6, 8), (8, 10), (5, 11), (6, 12),
+                  (11, 12), (11, 13), (13, 15), (12, 14), (14, 16)]
+MIN_DRAW_CONFIDENCE = 0.3
+EXERCISES = ("squats", "pushups", "bicep_curls")
+COLORS = [(0, 255, 0), (255, 128, 0), (0, 200, 255), (255, 0, 255), (255, 255, 0), (0, 0, 255)]
+
+def counter_factory(exercise):
+    """Returns a function building one fresh rep counter for `exercise`, importing only that model."""
+    if exercise == "squats":
+        squats = importlib.import_module(".squats", __package__)
+        config = squats.Config()
+        return lambda: squats.SquatCounter(config)
+    if exercise == "pushups":
+        pushups = importlib.import_module(".pushups", __package__)
+        config = pushups.Config()
+        return lambda: pushups.PushupCounter(config)
+    if exercise == "bicep_curls":
+        bicep_curl = importlib.import_module(".bicep_curl", __package__)
+        return bicep_curl.BicepCounter
+    raise ValueError(f"Unknown exercise: {exercise}")
+
+class GroupSession:
+    """
+    Multi-person rep counting from one camera. Every frame runs a single MultiPose
+    inference for everyone in view; a PoseTracker keeps identities across frames and each
+    tracked person gets their own counter, so adding a person only adds counter and
+    drawing work, not another model pass. People who left long ago (beyond the tracker's
+    max_retired) are folded into `earlier`, a running total of their count and reps.
+    """
+    def __init__(self, exercise, min_score=0.25, max_missing=15):
+        self.exercise = exercise
+        self.min_score = min_score
+        new_counter = counter_factory(exercise)
+        self.tracker = PoseTracker(lambda track_id: new_counter(), max_missing=max_missing, on_drop=self._fold)
+        self.lock = threading.Lock()
+        self.earlier = {"people": 0, "reps": 0}
+
+    def reset(self):
+        with self.lock:
+            self.tracker.reset()
+            self.earlier = {"people": 0, "reps": 0}
+
+    def _fold(self, track):
+        # Called by the tracker under self.lock.
+        self.earlier["people"] += 1
+        self.earlier["reps"] += int(track.state.count)
+
+    def process_frame(self, frame, pool=None, preprocessor=None, gate=None):
+        if gate is not None:
+            with span("presence"):
+                if not gate.should_infer(frame):
+                    with self.lock, span("render"):
+                        return render_group_ui(frame, [], {}, self.exercise, pool)
+        with span("preprocess"):
+            prepared = prepare_frame(frame, preprocessor, pool)
+        keypoints, boxes, _ = detect_poses(prepared, self.min_score)
+        if gate is not None:
+            gate.report(len(boxes) > 0)
+        with self.lock:
+            with span("track"):
+                people = self.tracker.update(keypoints, boxes)
+            with span("count"):
+                feedback = {track.id: track.state.process_keypoints(track.keypoints)[1] for track in people}
+            with span("render"):
+                return render_group_ui(frame, people, feedback, self.exercise, pool)
+
+    def stats(self):
+        with self.lock:
+            return [{"id": track.id, "reps": int(track.state.count), "in_view": track.missing == 0}
+                    for track in self.tracker.all_tracks()]
+
+    def earlier_stats(self):
+        with self.lock:
+            return dict(self.earlier)
+
+def render_group_ui(frame, people, feedback, exercise, pool=None):
+    height, width, _ = frame.shape
+    overlay = copy_frame(pool, 'overlay', frame)
+    cv2.rectangle(overlay, (0, 0), (width, 50), (0, 0, 0), cv2.FILLED)
+    cv2.putText(overlay, f"Group {exercise.replace('_', ' ')}: {len(people)} in view", (10, 35),
+                cv2.FONT_HERSHEY_SIMPLEX, 1, (255, 255, 255), 2)
+    frame = blend_overlay(overlay, 0.6, frame, 0.4, pool)
+
+    for track in people:
+        color = COLORS[track.id % len(COLORS)]
+        points = track.keypoints
+        for a, b in SKELETON_EDGES:
+            if points[a][2] >= MIN_DRAW_CONFIDENCE and points[b][2] >= MIN_DRAW_CONFIDENCE:
+                cv2.line(frame, (int(points[a][0]), int(points[a][1])),
+                         (int(points[b][0]), int(points[b][1])), color, 2)
+        x1, y1, x2, y2 = (int(v) for v in track.box)
+        cv2.rectangle(frame, (x1, y1), (x2, y2), color, 2)
+        cv2.putText(frame, f"#{track.id} Reps: {int(track.state.count)}", (x1, max(y1 - 30, 70)),
+                    cv2.FONT_HERSHEY_SIMPLEX, 0.7, color, 2)
+        cv2.putText(frame, feedback[track.id], (x1, max(y1 - 8, 92)),
+                    cv2.FONT_HERSHEY_SIMPLEX, 0.6, color, 2)
+    return frame
@@ -0,0 +1,219 @@
+# keypoint_cache.py
+"""
+Content-addressed on-disk cache of per-frame pose keypoints for recorded videos.
+
+Re-running a video after changing thresholds in Config only changes the counter logic,
+so the MoveNet and MediaPipe outputs are stored once per (video content, model,
+preprocessing) and replayed from memory-mapped .npy files afterwards:
+
+    python -m models.keypoint_cache models/squats.mp4 --exercise squats
+"""
+import argparse
+import hashlib
+import importlib.metadata
+import json
+import os
+import shutil
+import tempfile
+import time
+from collections import namedtuple
+import numpy as np
+
+CACHE_FORMAT = 1
+CACHE_DIR = os.environ.get("FITPAL_KEYPOINT_CACHE",
+                           os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), ".keypoint_cache"))
+MAX_CACHE_BYTES = int(os.environ.get("FITPAL_KEYPOINT_CACHE_BYTES", 2 * 1024 ** 3))
+ARRAYS = ("keypoints", "timestamps", "visibility")
+
+# keypoints: (N, 17, 3) MoveNet (x, y, score) rows in display pixels. timestamps: (N,) seconds
+# from the start of the video. visibility: (N,) MediaPipe nose visibility, 0 when no pose was found.
+VideoKeypoints = namedtuple("VideoKeypoints", ARRAYS)
+
+_digests = {}
+
+def file_digest(path, chunk_size=1 << 20):
+    """sha256 of a file's contents, memoised per (path, size, mtime) for this process."""
+    stat = os.stat(path)
+    memo_key = (os.path.abspath(path), stat.st_size, stat.st_mtime_ns)
+    digest = _digests.get(memo_key)
+    if digest is None:
+        sha = hashlib.sha256()
+        with open(path, "rb") as f:
+            for block in iter(lambda: f.read(chunk_size), b""):
+                sha.update(block)
+        digest = _digests[memo_key] = sha.hexdigest()
+    return digest
+
+class KeypointCache:
+    """
+    Entries live in `root/<key[:2]>/<key>/` as one .npy file per array. Reads are
+    memory-mapped, so replaying a long video does not load it into memory. Every read
+    touches the entry's mtime; once the cache grows past `max_bytes`, the least recently
+    used entries are deleted.
+    """
+    def __init__(self, root=CACHE_DIR, max_bytes=MAX_CACHE_BYTES):
+        self.root = root
+        self.max_bytes = max_bytes
+
+    def key(self, video_path, model_id, params):
+        spec = {"format": CACHE_FORMAT, "video": file_digest(video_path), "model": model_id, "params": params}
+        return hashlib.sha256(json.dumps(spec, sort_keys=True).encode()).hexdigest()
+
+    def _entry(self, key):
+        return os.path.join(self.root, key[:2], key)
+
+    def get(self, key):
+        """The cached VideoKeypoints (memory-mapped, read-only) or None."""
+        entry = self._entry(key)
+        try:
+            arrays = [np.load(os.path.join(entry, f"{name}.npy"), mmap_mode="r") for name in ARRAYS]
+            os.utime(entry)
+        except FileNotFoundError:
+            return None
+        return VideoKeypoints(*arrays)
+
+    def put(self, key, video_keypoints):
+        os.makedirs(self.root, exist_ok=True)
+        # Write into a temporary directory and rename it into place, so readers never see a partial entry.
+        tmp = tempfile.mkdtemp(prefix="tmp-", dir=self.root)
+        for name, array in zip(ARRAYS, video_keypoints):
+            np.save(os.path.join(tmp, f"{name}.npy"), np.ascontiguousarray(array))
+        entry = self._entry(key)
+        os.makedirs(os.path.dirname(entry), exist_ok=True)
+        try:
+            os.rename(tmp, entry)
+        except OSError:
+            shutil.rmtree(tmp, ignore_errors=True)  # Another process stored the same entry first.
+        self.evict(keep=entry)
+        cached = self.get(key)
+        # An entry larger than max_bytes on its own is kept anyway until the next put.
+        return cached if cached is not None else video_keypoints
+
+    def entries(self):
+        """(mtime, size in bytes, path) of every entry."""
+        found = []
+        if not os.path.isdir(self.root):
+            return found
+        for shard in os.scandir(self.root):
+            if not shard.is_dir() or shard.name.startswith("tmp-"):
+                continue
+            for entry in os.scandir(shard.path):
+                size = sum(f.stat().st_size for f in os.scandir(entry.path))
+                found.append((entry.stat().st_mtime, size, entry.path))
+        return found
+
+    def evict(self, keep=None):
+        """Deletes least recently used entries until the cache fits; `keep` (an entry path) is never deleted."""
+        entries = sorted(self.entries())
+        total = sum(size for _, size, _ in entries)
+        for _, size, path in entries:
+            if total <= self.max_bytes:
+                break
+            if keep is not None and os.path.samefile(path, keep):
+                continue
+            shutil.rmtree(path, ignore_errors=True)
+            total -= size
+        return total
+
+# ----- EXTRACTION -----
+def model_spec(inference_size):
+    """Model id and preprocessing parameters that determine the extracted keypoints."""
+    from .pose_estimation import MOVENET_URL, MOVENET_INPUT_SIZE
+    # Read the version from the package metadata: importing MediaPipe would cost every cache hit.
+    try:
+        mediapipe_version = importlib.metadata.version("mediapipe")
+    except importlib.metadata.PackageNotFoundError:
+        mediapipe_version = "missing"
+    model_id = f"{MOVENET_URL}+mediapipe-{mediapipe_version}"
+    params = {"inference_size": inference_size, "movenet_input_size": MOVENET_INPUT_SIZE,
+              "min_detection_confidence": 0.7, "min_tracking_confidence": 0.5}
+    return model_id, params
+
+def extract_keypoints(video_path, inference_size=None):
+    """Runs MoveNet and MediaPipe over every frame of a video, the way the live streams do."""
+    import cv2
+    import mediapipe as mp
+    from .pose_estimation import detect_keypoints
+    from .preprocess import INFERENCE_SIZE, InferencePreprocessor
+
+    cap = cv2.VideoCapture(video_path)
+    if not cap.isOpened():
+        raise IOError(f"Could not open video file: {video_path}")
+    fps = cap.get(cv2.CAP_PROP_FPS) or 30.0
+    preprocessor = InferencePreprocessor(size=inference_size or INFERENCE_SIZE)
+    _, params = model_spec(preprocessor.size)
+    pose = mp.solutions.pose.Pose(min_detection_confidence=params["min_detection_confidence"],
+                                  min_tracking_confidence=params["min_tracking_confidence"])
+    keypoints, timestamps, visibility = [], [], []
+    try:
+        while True:
+            ret, frame = cap.read()
+            if not ret:
+                break
+            timestamps.append(cap.get(cv2.CAP_PROP_POS_MSEC) / 1000 or len(timestamps) / fps)
+            prepared = preprocessor.process(frame)
+            results = pose.process(prepared.rgb)
+            visibility.append(results.pose_landmarks.landmark[0].visibility if results.pose_landmarks else 0.0)
+            keypoints.append(detect_keypoints(prepared))
+    finally:
+        cap.release()
+        pose.close()
+    return VideoKeypoints(np.asarray(keypoints, dtype=np.float32).reshape(-1, 17, 3),
+                          np.asarray(timestamps, dtype=np.float64),
+                          np.asarray(visibility, dtype=np.float32))
+
+def load_keypoints(video_path, inference_size=None, cache=None):
+    """Keypoints for every frame of a video, from the cache when possible. Returns (VideoKeypoints, hit)."""
+    from .preprocess import INFERENCE_SIZE
+    cache = cache or KeypointCache()
+    inference_size = inference_size or INFERENCE_SIZE
+    key = cache.key(video_path, *model_spec(inference_size))
+    cached = cache.get(key)
+    if cached is not None:
+        return cached, True
+    return cache.put(key, extract_keypoints(video_path, inference_size)), False
+
+# ----- REPLAY -----
+def new_counter(exercise):
+    if exercise == "squats":
+        from .squats import Config, SquatCounter
+        return SquatCounter(Config())
+    if exercise == "pushups":
+        from .pushups import Config, PushupCounter
+        return PushupCounter(Config())
+    if exercise == "bicep_curls":
+        from .bicep_curl import BicepCounter
+        return BicepCounter()
+    raise ValueError(f"Unknown exercise: {exercise}")
+
+def replay(counter, video_keypoints, min_visibility=None):
+    """
+    Feeds recorded keypoints through a counter with their original timestamps and returns
+    its final count. With `min_visibility`, frames where MediaPipe did not see the person
+    are skipped, as process_pushup_frame does.
+    """
+    for keypoints, timestamp, visibility in zip(*video_keypoints):
+        if min_visibility is not None and visibility < min_visibility:
+            continue
+        counter.process_keypoints(keypoints, timestamp=float(timestamp))
+    return counter.count
+
+def main():
+    parser = argparse.ArgumentParser(description="Count reps in a video from cached keypoints.")
+    parser.add_argument("video")
+    parser.add_argument("--exercise", choices=("squats", "pushups", "bicep_curls"), default="squats")
+    parser.add_argument("--inference-size", type=int)
+    args = parser.parse_args()
+
+    start = time.perf_counter()
+    video_keypoints, hit = load_keypoints(args.video, args.inference_size)
+    loaded = time.perf_counter()
+    reps = replay(new_counter(args.exercise), video_keypoints,
+                  min_visibility=0.5 if args.exercise == "pushups" else None)
+    done = time.perf_counter()
+    print(f"{len(video_keypoints.timestamps)} frames, keypoints {'from cache' if hit else 'extracted'} "
+          f"in {loaded - start:.2f}s, replay {done - loaded:.3f}s")
+    print(f"{args.exercise}: {reps} reps")
+
+if __name__ == "__main__":
+    main()
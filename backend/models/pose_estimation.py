@@ -1,27 +1,103 @@
 # pose_estimation.py
 import cv2
 import numpy as np
-import tensorflow as tf
-import tensorflow_hub as hub
+import threading
 from collections import deque
 
-# Load MoveNet model (Thunder version for better accuracy)
-movenet = hub.load("https://tfhub.dev/google/movenet/singlepose/thunder/3")
+from .preprocess import LetterboxTransform
+from .tracing import span
+
+# MoveNet model (Thunder version for better accuracy). TensorFlow and the model are only
+# loaded on the first detection, so importing this module stays cheap.
+MOVENET_URL = "https://tfhub.dev/google/movenet/singlepose/thunder/3"
+MOVENET_INPUT_SIZE = 256
+_movenet = None
+_movenet_lock = threading.Lock()
+
+# MoveNet MultiPose detects up to 6 people in one forward pass (group mode).
+MULTIPOSE_URL = "https://tfhub.dev/google/movenet/multipose/lightning/1"
+MULTIPOSE_INPUT_SIZE = 256
+MAX_POSES = 6
+_multipose = None
+
+def get_movenet():
+    global _movenet
+    if _movenet is None:
+        with _movenet_lock:
+            if _movenet is None:
+                import tensorflow_hub as hub
+                _movenet = hub.load(MOVENET_URL)
+    return _movenet
+
+def get_movenet_multipose():
+    global _multipose
+    if _multipose is None:
+        with _movenet_lock:
+            if _multipose is None:
+                import tensorflow_hub as hub
+                _multipose = hub.load(MULTIPOSE_URL)
+    return _multipose
 
 def detect_pose(image):
     """
     Given an image (RGB), returns the detected keypoints from MoveNet.
-    Each keypoint is returned as a tuple: (x, y, score).
+    Each keypoint is returned as a row: (x, y, score).
     """
-    input_image = tf.image.resize_with_pad(tf.expand_dims(image, axis=0), 256, 256)
+    import tensorflow as tf
+    input_image = tf.image.resize_with_pad(tf.expand_dims(image, axis=0), MOVENET_INPUT_SIZE, MOVENET_INPUT_SIZE)
     input_tensor = tf.cast(input_image, dtype=tf.int32)
-    outputs = movenet.signatures["serving_default"](input_tensor)
+    outputs = get_movenet().signatures["serving_default"](input_tensor)
     keypoints = outputs["output_0"].numpy()[0, 0]
 
     # Convert from (y, x, score) to (x, y, score) in pixel coordinates
     height, width = image.shape[:2]
-    keypoints = [(kp[1] * width, kp[0] * height, kp[2]) for kp in keypoints]
-    return keypoints
+    return keypoints[:, [1, 0, 2]] * np.array([width, height, 1], dtype=np.float32)
+
+def detect_pose_letterboxed(canvas, transform):
+    """
+    Runs MoveNet on an RGB square already letterboxed by InferencePreprocessor and maps
+    the keypoints back to display pixels in one vectorized step.
+    """
+    import tensorflow as tf
+    input_tensor = tf.expand_dims(canvas, axis=0)
+    if canvas.shape[0] != MOVENET_INPUT_SIZE:
+        input_tensor = tf.image.resize(input_tensor, (MOVENET_INPUT_SIZE, MOVENET_INPUT_SIZE))
+    outputs = get_movenet().signatures["serving_default"](tf.cast(input_tensor, dtype=tf.int32))
+    return transform.to_display(outputs["output_0"].numpy()[0, 0])
+
+def detect_keypoints(prepared):
+    """MoveNet keypoints for a PreparedFrame (see preprocess.prepare_frame)."""
+    with span("movenet"):
+        if prepared.transform is None:
+            return detect_pose(prepared.rgb)
+        return detect_pose_letterboxed(prepared.canvas, prepared.transform)
+
+def detect_poses(prepared, min_score=0.25):
+    """
+    Everyone in a PreparedFrame from a single MultiPose inference.
+    Returns (keypoints, boxes, scores): keypoints is (N, 17, 3) as (x, y, score) rows and
+    boxes is (N, 4) as (x1, y1, x2, y2), both in display pixels. N counts only the
+    detections scoring at least `min_score`.
+    """
+    import tensorflow as tf
+    with span("movenet.multipose"):
+        if prepared.transform is None:
+            transform = LetterboxTransform(prepared.rgb.shape, MULTIPOSE_INPUT_SIZE)
+            input_tensor = tf.image.resize_with_pad(tf.expand_dims(prepared.rgb, axis=0),
+                                                    MULTIPOSE_INPUT_SIZE, MULTIPOSE_INPUT_SIZE)
+        else:
+            transform = prepared.transform
+            input_tensor = tf.expand_dims(prepared.canvas, axis=0)
+            if prepared.canvas.shape[0] != MULTIPOSE_INPUT_SIZE:
+                input_tensor = tf.image.resize(input_tensor, (MULTIPOSE_INPUT_SIZE, MULTIPOSE_INPUT_SIZE))
+        outputs = get_movenet_multipose().signatures["serving_default"](tf.cast(input_tensor, dtype=tf.int32))
+        # Each of the MAX_POSES rows: 17 x (y, x, score), then ymin, xmin, ymax, xmax, score.
+        detections = outputs["output_0"].numpy()[0]
+    detections = detections[detections[:, 55] >= min_score]
+    keypoints = transform.to_display(detections[:, :51].reshape(-1, 17, 3))
+    corners = transform.to_display(np.stack([detections[:, [51, 52, 55]], detections[:, [53, 54, 55]]], axis=1))
+    boxes = corners[:, :, :2].reshape(-1, 4)
+    return keypoints, boxes, detections[:, 55]
 
 def calc_angle(a, b, c):
     """
@@ -36,6 +112,17 @@ def calc_angle(a, b, c):
     cosine_angle = np.clip(cosine_angle, -1.0, 1.0)
     return round(np.degrees(np.arccos(cosine_angle)), 2)
 
+def calc_angles(a, b, c):
+    """calc_angle over arrays of points: a, b and c are (..., 2), the result is (...)."""
+    ba = np.asarray(a, dtype=np.float64) - b
+    bc = np.asarray(c, dtype=np.float64) - b
+    norm_ba = np.linalg.norm(ba, axis=-1)
+    norm_bc = np.linalg.norm(bc, axis=-1)
+    valid = (norm_ba != 0) & (norm_bc != 0)
+    cosine = np.einsum("...i,...i->...", ba, bc) / np.where(valid, norm_ba * norm_bc, 1.0)
+    angles = np.round(np.degrees(np.arccos(np.clip(cosine, -1.0, 1.0))), 2)
+    return np.where(valid, angles, 0.0)
+
 def compute_shoulder_tilt(left_shoulder, right_shoulder):
     """
     Computes the tilt angle of the line between the left and right shoulder
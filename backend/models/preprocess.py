@@ -0,0 +1,87 @@
+# preprocess.py
+import os
+from collections import namedtuple
+import cv2
+import numpy as np
+
+from .frame_pool import FramePool, pooled
+
+# Side of the square model input. 256 matches MoveNet Thunder, so no further resize is needed.
+INFERENCE_SIZE = int(os.environ.get("FITPAL_INFERENCE_SIZE", 256))
+
+# rgb: RGB image handed to MediaPipe. canvas: letterboxed square for MoveNet (None without a
+# preprocessor). transform: maps canvas keypoints back to display pixels (None without a preprocessor).
+PreparedFrame = namedtuple("PreparedFrame", ["rgb", "canvas", "transform"])
+
+class LetterboxTransform:
+    """Geometry of fitting a frame of `frame_shape` into a `size` x `size` square, centred."""
+    def __init__(self, frame_shape, size):
+        height, width = frame_shape[:2]
+        self.frame_shape = frame_shape
+        self.size = size
+        self.scale = size / max(height, width)
+        self.resized_width = max(1, round(width * self.scale))
+        self.resized_height = max(1, round(height * self.scale))
+        self.pad_x = (size - self.resized_width) // 2
+        self.pad_y = (size - self.resized_height) // 2
+
+    def to_display(self, keypoints):
+        """
+        Converts MoveNet output rows (y, x, score), normalised to the letterboxed square,
+        into (x, y, score) rows in display pixels. Works on any (..., 3) array at once.
+        """
+        keypoints = np.asarray(keypoints, dtype=np.float32)
+        out = np.empty_like(keypoints)
+        out[..., 0] = (keypoints[..., 1] * self.size - self.pad_x) / self.scale
+        out[..., 1] = (keypoints[..., 0] * self.size - self.pad_y) / self.scale
+        out[..., 2] = keypoints[..., 2]
+        return out
+
+class InferencePreprocessor:
+    """
+    One preprocessing stage shared by every model in a stream.
+
+    The display frame is downscaled once to the inference resolution and converted to
+    RGB once, at that small size. MediaPipe gets the small RGB image and MoveNet gets it
+    letterboxed into a square, so inference cost no longer depends on camera resolution.
+    The letterbox geometry is cached per frame size and buffers come from a FramePool.
+    """
+    def __init__(self, size=INFERENCE_SIZE, pool=None):
+        self.size = size
+        self.pool = pool if pool is not None else FramePool()
+        self._transforms = {}
+        self._canvas_transform = None
+
+    def transform_for(self, frame_shape):
+        key = frame_shape[:2]
+        transform = self._transforms.get(key)
+        if transform is None:
+            transform = self._transforms[key] = LetterboxTransform(frame_shape, self.size)
+        return transform
+
+    def process(self, frame):
+        transform = self.transform_for(frame.shape)
+        small_shape = (transform.resized_height, transform.resized_width, 3)
+        small = self.pool.get('inference_bgr', small_shape)
+        cv2.resize(frame, (transform.resized_width, transform.resized_height), dst=small,
+                   interpolation=cv2.INTER_AREA)
+        rgb = self.pool.get('inference_rgb', small_shape)
+        cv2.cvtColor(small, cv2.COLOR_BGR2RGB, dst=rgb)
+
+        canvas = self.pool.get('inference_canvas', (self.size, self.size, 3))
+        if self._canvas_transform is not transform:
+            canvas.fill(0)  # Padding only needs clearing when the geometry changes.
+            self._canvas_transform = transform
+        canvas[transform.pad_y:transform.pad_y + transform.resized_height,
+               transform.pad_x:transform.pad_x + transform.resized_width] = rgb
+        return PreparedFrame(rgb, canvas, transform)
+
+def prepare_frame(frame, preprocessor=None, pool=None):
+    """
+    Builds the model inputs for a BGR display frame: through the preprocessor when one is
+    given, otherwise the original full-resolution RGB conversion.
+    """
+    if preprocessor is not None:
+        return preprocessor.process(frame)
+    rgb = cv2.cvtColor(frame, cv2.COLOR_BGR2RGB, dst=pooled(pool, 'rgb', frame))
+    return PreparedFrame(rgb, None, None)
@@ -0,0 +1,108 @@
+# presence.py
+import os
+import time
+import cv2
+import numpy as np
+
+# Set FITPAL_PRESENCE_GATE=0 to run the pose models on every frame.
+PRESENCE_GATE_ENABLED = os.environ.get("FITPAL_PRESENCE_GATE", "1") != "0"
+
+class PresenceGate:
+    """
+    Decides per frame whether the pose models need to run at all.
+
+    Each frame is shrunk to a `size`-pixel-wide grayscale thumbnail and compared with the
+    previous thumbnail (motion) and with a slowly learned background of the empty room.
+    The gate has hysteresis: it opens on the first frame with enough change, so nobody
+    waits on it when stepping in, but only closes after the pose models have found no one
+    for `empty_frames` frames in a row. While closed, the models still run once every
+    `recheck_interval` seconds to catch someone who entered without being seen moving.
+    Not thread-safe: use one gate per stream.
+    """
+    def __init__(self, size=64, pixel_threshold=25, motion_fraction=0.02, foreground_fraction=0.05,
+                 empty_frames=30, recheck_interval=2.0, background_rate=0.05):
+        self.size = size
+        self.pixel_threshold = pixel_threshold
+        self.motion_fraction = motion_fraction
+        self.foreground_fraction = foreground_fraction
+        self.empty_frames = empty_frames
+        self.recheck_interval = recheck_interval
+        self.background_rate = background_rate
+        self.reset()
+
+    def reset(self):
+        self.present = True  # Start open so a session begins with a real detection.
+        self.misses = 0
+        self.last_check = 0.0
+        self.skipped = 0
+        self._small = None
+        self._gray = None
+        self._previous = None
+        self._background = None
+        self._background_u8 = None
+        self._diff = None
+
+    def _thumbnail(self, frame):
+        height, width = frame.shape[:2]
+        shape = (max(1, round(height * self.size / width)), self.size)
+        if self._gray is None or self._gray.shape != shape:
+            self._small = np.empty(shape + (3,), dtype=np.uint8)
+            self._gray = np.empty(shape, dtype=np.uint8)
+            self._previous = None
+            self._background = None
+            self._background_u8 = np.empty(shape, dtype=np.uint8)
+            self._diff = np.empty(shape, dtype=np.uint8)
+        cv2.resize(frame, (shape[1], shape[0]), dst=self._small, interpolation=cv2.INTER_AREA)
+        cv2.cvtColor(self._small, cv2.COLOR_BGR2GRAY, dst=self._gray)
+        return self._gray
+
+    def _changed_fraction(self, a, b):
+        cv2.absdiff(a, b, dst=self._diff)
+        return np.count_nonzero(self._diff > self.pixel_threshold) / self._diff.size
+
+    def should_infer(self, frame, now=None):
+        """True if the pose models should run on this BGR frame."""
+        now = time.monotonic() if now is None else now
+        gray = self._thumbnail(frame)
+        if self._previous is None:
+            self._previous = gray.copy()
+            self._background = gray.astype(np.float32)
+            return True
+        motion = self._changed_fraction(gray, self._previous)
+        np.copyto(self._previous, gray)
+        if self.present:
+            return True
+
+        cv2.convertScaleAbs(self._background, dst=self._background_u8)
+        foreground = self._changed_fraction(gray, self._background_u8)
+        if motion >= self.motion_fraction or foreground >= self.foreground_fraction:
+            self.present = True
+            self.misses = 0
+            return True
+        # Room still looks empty: keep learning it so lighting drift does not wake the gate.
+        cv2.accumulateWeighted(gray, self._background, self.background_rate)
+        if now - self.last_check >= self.recheck_interval:
+            self.last_check = now
+            return True
+        self.skipped += 1
+        return False
+
+    def report(self, person_found):
+        """Feeds back whether the pose models found someone in the frame they ran on."""
+        if person_found:
+            self.present = True
+            self.misses = 0
+            return
+        self.misses += 1
+        if self._background is None:
+            return
+        if self.present and self.misses >= self.empty_frames:
+            # Closing: the current view is the empty room from now on.
+            self.present = False
+            self._background[:] = self._gray
+        else:
+            cv2.accumulateWeighted(self._gray, self._background, self.background_rate)
+
+def new_presence_gate():
+    """A PresenceGate for one stream, or None when gating is disabled."""
+    return PresenceGate() if PRESENCE_GATE_ENABLED else None
@@ -6,7 +6,12 @@ import mediapipe as mp
 import logging
 import os
 
-from .pose_estimation import detect_pose, calc_angle, compute_shoulder_tilt, Smoother
+from .pose_estimation import detect_pose, detect_keypoints, calc_angle, compute_shoulder_tilt, Smoother
+from .preprocess import prepare_frame
+from .streaming_stats import BaselineCalibrator
+from .frame_pool import copy_frame, blend_overlay
+from .tracing import span
+from .config_overrides import apply_overrides
 
 logging.basicConfig(level=logging.INFO, format='%(asctime)s %(levelname)s: %(message)s')
 
@@ -16,11 +21,18 @@ class Config:
     EXTENDED_ANGLE = 170    # Elbow angle at the top (up phase)
     SMOOTHING_WINDOW = 5    # Frames for angle smoothing
     # Body alignment: the torso (average shoulder to hip line) should be nearly horizontal.
-    BODY_ALIGNMENT_THRESHOLD = 10  
+    BODY_ALIGNMENT_THRESHOLD = 10  # Minimum allowed deviation (degrees) from the calibrated body line
+    ALIGNMENT_SIGMA = 3.0          # Allowed deviation in standard deviations of the user's own jitter
+    ENABLE_ALIGNMENT_CHECK = False # Toggle body alignment check
+    CALIBRATION_FRAMES = 30        # Plank frames (arms extended, torso level) used to learn the body line
+    PLANK_MAX_TILT = 30            # Largest torso tilt (degrees from horizontal) accepted as a plank
+    BASELINE_ADAPT_RATE = 0.01
     TARGET_REPS = 20        # Target push-up count (for progress tracking)
     VIDEO_FILENAME = None   # Set to None to use webcam.
     VIDEO_SOURCE = 0        # Use webcam if VIDEO_FILENAME is None.
 
+apply_overrides("pushups", Config)
+
 # Initialize MediaPipe for drawing landmarks
 mp_drawing = mp.solutions.drawing_utils
 mp_pose = mp.solutions.pose
@@ -32,11 +44,26 @@ class PushupCounter:
         self.direction = "upwards"  # Can be "upwards" or "downwards"
         self.angle_smoother = Smoother(window_size=config.SMOOTHING_WINDOW)
         self.progress = 0  # Percent of the current push-up completion
-
-    def process_keypoints(self, keypoints):
+        self.last_rep_time = None
+        self.alignment_baseline = BaselineCalibrator(target_frames=config.CALIBRATION_FRAMES,
+                                                     sigma=config.ALIGNMENT_SIGMA,
+                                                     min_threshold=config.BODY_ALIGNMENT_THRESHOLD,
+                                                     adapt_rate=config.BASELINE_ADAPT_RATE)
+
+    def snapshot(self):
+        """Rep state another node needs to resume this session (see session_store.py)."""
+        return {"count": self.count, "direction": self.direction, "last_rep_time": self.last_rep_time}
+
+    def restore(self, snapshot):
+        self.count = snapshot.get("count", 0)
+        self.direction = snapshot.get("direction", "upwards")
+        self.last_rep_time = snapshot.get("last_rep_time")
+
+    def process_keypoints(self, keypoints, timestamp=None):
         """
         Processes keypoints and updates the push-up count.
         Returns (avg_elbow_angle, feedback). If insufficient keypoints, returns (None, error message).
+        `timestamp` is the frame's capture time (default now), recorded as last_rep_time.
         """
         if len(keypoints) < 17:
             return None, "Insufficient keypoints detected"
@@ -56,15 +83,26 @@ class PushupCounter:
         right_elbow_angle = calc_angle(right_shoulder, right_elbow, right_wrist)
         raw_avg_elbow_angle = (left_elbow_angle + right_elbow_angle) / 2
 
-        # Calculate body alignment
-        body_alignment_angle = compute_body_alignment_angle(left_shoulder, right_shoulder, left_hip, right_hip)
-        proper_alignment = True
-
         # Interpolate percentage (e.g. 0% at bent, 100% at extended)
         self.progress = np.interp(raw_avg_elbow_angle,
                                   (self.config.BENT_ANGLE, self.config.EXTENDED_ANGLE),
                                   (0, 100))
 
+        # Calculate body alignment. The baseline is learned only in the plank (arms extended,
+        # torso near horizontal), not while the user is standing or kneeling to get into position.
+        body_alignment_angle = compute_body_alignment_angle(left_shoulder, right_shoulder, left_hip, right_hip)
+        in_plank = (self.progress > 95 and
+                    min(body_alignment_angle, 180 - body_alignment_angle) <= self.config.PLANK_MAX_TILT)
+        if not self.alignment_baseline.calibrated:
+            if in_plank:
+                self.alignment_baseline.calibrate(body_alignment_angle)
+            misaligned = False
+        elif in_plank:
+            misaligned = self.alignment_baseline.update(body_alignment_angle)
+        else:
+            misaligned = self.alignment_baseline.is_outlier(body_alignment_angle)
+        proper_alignment = (not misaligned) if self.config.ENABLE_ALIGNMENT_CHECK else True
+
         # Count push-ups based on full rep completion (down then up)
         if proper_alignment:
             if self.progress < 5 and self.direction == "upwards":
@@ -72,6 +110,7 @@ class PushupCounter:
             elif self.progress > 95 and self.direction == "downwards":
                 self.count += 1
                 self.direction = "upwards"
+                self.last_rep_time = time.time() if timestamp is None else timestamp
         else:
             self.direction = "upwards"  # Reset if misaligned
 
@@ -99,13 +138,13 @@ def compute_body_alignment_angle(left_shoulder, right_shoulder, left_hip, right_
     angle = np.degrees(np.arccos(cos_theta))
     return angle
 
-def render_ui(frame, avg_elbow_angle, feedback, pushup_count, config: Config):
+def render_ui(frame, avg_elbow_angle, feedback, pushup_count, config: Config, pool=None):
     """
     Draws an overlay with a vertical slider, rep counter, and feedback text.
-    Returns the annotated frame.
+    Returns the annotated frame (written into `frame` itself when a FramePool is given).
     """
     height, width, _ = frame.shape
-    overlay = frame.copy()
+    overlay = copy_frame(pool, 'overlay', frame)
     # Vertical slider
     slider_x = width - 50
     slider_top = 50
@@ -128,9 +167,9 @@ def render_ui(frame, avg_elbow_angle, feedback, pushup_count, config: Config):
     cv2.rectangle(overlay, (width // 2 - 70, 10), (width // 2 + 70, 50), (255, 255, 255), cv2.FILLED)
     cv2.putText(overlay, feedback, (width // 2 - 50, 40),
                 cv2.FONT_HERSHEY_SIMPLEX, 1, (0, 255, 0), 2)
-    return cv2.addWeighted(overlay, 0.6, frame, 0.4, 0)
+    return blend_overlay(overlay, 0.6, frame, 0.4, pool)
 
-def process_pushup_frame(frame, pushup_counter, pose, config):
+def process_pushup_frame(frame, pushup_counter, pose, config, pool=None, preprocessor=None, gate=None):
     """
     Processes a single frame for push-ups:
       - Converts the frame to RGB.
@@ -138,20 +177,33 @@ def process_pushup_frame(frame, pushup_counter, pose, config):
       - Uses detect_pose to get keypoints.
       - Updates the pushup counter and gets the average elbow angle and feedback.
       - Renders an overlay onto the frame.
-    Returns the annotated frame.
+    Returns the annotated frame. With a FramePool, intermediate images reuse its buffers;
+    with an InferencePreprocessor, both models run on one downscaled RGB copy; with a
+    PresenceGate, neither model runs while the room is empty.
     """
-    rgb_frame = cv2.cvtColor(frame, cv2.COLOR_BGR2RGB)
-    results = pose.process(rgb_frame)
+    if gate is not None:
+        with span("presence"):
+            if not gate.should_infer(frame):
+                return frame
+    with span("preprocess"):
+        prepared = prepare_frame(frame, preprocessor, pool)
+    with span("mediapipe"):
+        results = pose.process(prepared.rgb)
 
     # ✅ Person presence check (using landmark[0] visibility)
-    if not results.pose_landmarks or results.pose_landmarks.landmark[0].visibility < 0.5:
+    person_found = results.pose_landmarks is not None and results.pose_landmarks.landmark[0].visibility >= 0.5
+    if gate is not None:
+        gate.report(person_found)
+    if not person_found:
         return frame  # Person not confidently detected
 
-    keypoints = detect_pose(rgb_frame)
-    avg_elbow_angle, feedback = pushup_counter.process_keypoints(keypoints)
+    keypoints = detect_keypoints(prepared)
+    with span("count"):
+        avg_elbow_angle, feedback = pushup_counter.process_keypoints(keypoints)
     if avg_elbow_angle is None:
         return frame  # Return unmodified if detection fails.
 
-    frame_ui = render_ui(frame, avg_elbow_angle, feedback, pushup_counter.count, config)
-    mp_drawing.draw_landmarks(frame_ui, results.pose_landmarks, mp_pose.POSE_CONNECTIONS)
+    with span("render"):
+        frame_ui = render_ui(frame, avg_elbow_angle, feedback, pushup_counter.count, config, pool)
+        mp_drawing.draw_landmarks(frame_ui, results.pose_landmarks, mp_pose.POSE_CONNECTIONS)
     return frame_ui
@@ -0,0 +1,387 @@
+# recorder.py
+"""
+Background recorder for the annotated video feed.
+
+The frame loop hands each rendered frame to Recorder.offer(), which keeps only every
+frame needed for RECORD_FPS and shrinks it into a preallocated ring slot (well under a
+millisecond at 480 px). Everything else happens on the recorder's own thread. That thread
+JPEG-encodes the frames into an in-memory history of the last HISTORY_SECONDS, writes
+them to a video file while a recording is persisted, and cuts a highlight clip around
+every rep. The frame loop never waits on it: if the encoder falls behind, the oldest
+unencoded frames are dropped. Highlight clips are written to disk by a separate clip
+writer thread, so a persisted recording never holds up encoding.
+"""
+import collections
+import logging
+import os
+import queue
+import threading
+import time
+import cv2
+import numpy as np
+from .streaming_stats import P2Quantile
+
+# Set FITPAL_RECORDER=0 to turn the recorder off entirely.
+RECORDER_ENABLED = os.environ.get("FITPAL_RECORDER", "1") != "0"
+RECORDINGS_DIR = os.environ.get("FITPAL_RECORDINGS",
+                                os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))),
+                                             "recordings"))
+HISTORY_SECONDS = float(os.environ.get("FITPAL_RECORDER_SECONDS", 30))
+RECORD_FPS = 10
+RECORD_WIDTH = 480
+RING_SECONDS = 2.0          # Frames waiting for the encoder before the oldest are dropped
+JPEG_QUALITY = 80
+HIGHLIGHT_BEFORE = 2.5      # Seconds of a highlight clip before the rep was counted
+HIGHLIGHT_AFTER = 1.0       # ... and after it
+MAX_HIGHLIGHTS = 20
+IDLE_SLEEP = 0.02           # Encoder poll interval when the ring is empty
+DUE_SLACK = 0.002           # Tolerance on frame timestamps when decimating to RECORD_FPS
+FOURCC = "mp4v"
+
+class FrameRing:
+    """
+    Fixed set of preallocated frame slots from one producer to one consumer, without locks.
+
+    The producer fills the slot at `written % capacity` and then bumps `written`; the
+    consumer copies slots below `written` and advances `read`. Only the producer writes
+    `written` and only the consumer writes `read`, so neither waits on the other. A
+    producer that laps the consumer overwrites the oldest slot; the consumer notices
+    (the lap shows in `written` after its copy) and counts that frame as dropped.
+    """
+    def __init__(self, capacity, shape):
+        self.capacity = capacity
+        self.slots = np.empty((capacity,) + shape, dtype=np.uint8)
+        self.times = np.zeros(capacity, dtype=np.float64)
+        self.written = 0
+        self.read = 0
+        self.dropped = 0
+
+    @property
+    def shape(self):
+        return self.slots.shape[1:]
+
+    def slot(self):
+        """The slot the producer fills next; call publish() once it is written."""
+        return self.slots[self.written % self.capacity]
+
+    def publish(self, timestamp):
+        self.times[self.written % self.capacity] = timestamp
+        self.written += 1
+
+    def take(self, out):
+        """Copies the oldest unread frame into `out` and returns its timestamp, or None."""
+        while self.read < self.written:
+            if self.written - self.read >= self.capacity:
+                # Lapped: this slot is being (or has been) overwritten.
+                skip = self.written - self.read - self.capacity + 1
+                self.dropped += skip
+                self.read += skip
+                continue
+            index = self.read % self.capacity
+            np.copyto(out, self.slots[index])
+            timestamp = self.times[index]
+            if self.written - self.read >= self.capacity:
+                continue  # Overwritten while copying; the loop drops it.
+            self.read += 1
+            return float(timestamp)
+        return None
+
+class Highlight:
+    """A short clip around one rep, as JPEG frames shared with the history."""
+    def __init__(self, rep, rep_time, frames):
+        self.rep = rep
+        self.rep_time = rep_time
+        self.frames = frames  # [(timestamp, jpeg bytes)]
+        self.path = None
+
+    def info(self):
+        return {"rep": self.rep, "rep_time": self.rep_time, "frames": len(self.frames),
+                "seconds": round(self.frames[-1][0] - self.frames[0][0], 2) if self.frames else 0.0,
+                "path": self.path}
+
+def write_clip(path, frames, fps=RECORD_FPS):
+    """Writes [(timestamp, jpeg)] frames to a video file."""
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    writer = None
+    try:
+        for _, jpeg in frames:
+            image = cv2.imdecode(np.frombuffer(jpeg, dtype=np.uint8), cv2.IMREAD_COLOR)
+            if writer is None:
+                writer = cv2.VideoWriter(path, cv2.VideoWriter_fourcc(*FOURCC), fps, (image.shape[1], image.shape[0]))
+            writer.write(image)
+    finally:
+        if writer is not None:
+            writer.release()
+    return path
+
+class Recorder:
+    """
+    Records one stream. offer() is called from that stream's frame loop only (one
+    producer); every other method may be called from request threads.
+    """
+    def __init__(self, stream, fps=RECORD_FPS, width=RECORD_WIDTH, history_seconds=HISTORY_SECONDS, previous=None):
+        self.stream = stream
+        self.interval = 1.0 / fps
+        self.fps = fps
+        self.width = width
+        self.history_seconds = history_seconds
+        self.ring = None
+        self.next_due = 0.0
+        self.last_reps = None
+        self.pending_reps = collections.deque()   # (rep number, rep time), appended by offer()
+        self.history = collections.deque()        # (timestamp, jpeg), appended by the encoder only
+        self.highlights = collections.deque(maxlen=MAX_HIGHLIGHTS)
+        self.history_bytes = 0
+        if previous is not None:
+            # Another frame loop took over the stream: keep what was recorded so far. The
+            # previous encoder has been closed; copy its deques rather than share them, so a
+            # straggling encoder (close() timed out) cannot mutate this recorder's state.
+            self.history.extend(list(previous.history))
+            self.history_bytes = sum(len(jpeg) for _, jpeg in self.history)
+            self.highlights.extend(list(previous.highlights))
+            self.pending_reps.extend(list(previous.pending_reps))
+            self.last_reps = previous.last_reps
+        self.persist_path = None
+        self._clip_lock = threading.Lock()
+        self._persist_requests = queue.Queue()  # Paths to start writing, or False to stop
+        self._writer = None
+        self.offered = 0
+        self.accepted = 0
+        self.encoded = 0
+        self.offer_p95 = P2Quantile(0.95)
+        self.encode_p95 = P2Quantile(0.95)
+        self.closed = False
+        self._flushing = False
+        self._thread = None
+
+    # ----- FRAME LOOP SIDE -----
+    def offer(self, frame, reps=None, rep_time=None, now=None):
+        """
+        Hands a rendered frame to the recorder without waiting. `reps` is the current rep
+        count; when it goes up, a highlight is cut around `rep_time` (default now).
+        """
+        if self.closed:
+            return False
+        now = time.time() if now is None else now
+        self.offered += 1
+        if reps is not None:
+            if self.last_reps is not None and reps > self.last_reps:
+                self.pending_reps.append((reps, rep_time or now))
+            self.last_reps = reps
+        if now < self.next_due - DUE_SLACK:
+            return False
+        start = time.perf_counter()
+        if self.ring is None:
+            height, width = frame.shape[:2]
+            target = min(self.width, width)
+            shape = (max(1, round(height * target / width)), target, 3)
+            self.ring = FrameRing(max(2, int(RING_SECONDS * self.fps)), shape)
+        if self._thread is None:
+            self._start()  # First frame, or the first since flush()
+        slot = self.ring.slot()
+        # INTER_LINEAR: about a tenth of INTER_AREA's cost at these ratios, and this runs in the frame loop.
+        cv2.resize(frame, (slot.shape[1], slot.shape[0]), dst=slot, interpolation=cv2.INTER_LINEAR)
+        self.ring.publish(now)
+        # Keep to the RECORD_FPS grid, restarting it after a stall instead of catching up.
+        self.next_due += self.interval
+        if self.next_due <= now:
+            self.next_due = now + self.interval
+        self.accepted += 1
+        self.offer_p95.update((time.perf_counter() - start) * 1000)
+        return True
+
+    # ----- ENCODER THREAD -----
+    def _start(self):
+        self._thread = threading.Thread(target=self._run, name=f"recorder-{self.stream}", daemon=True)
+        self._thread.start()
+
+    def _run(self):
+        scratch = np.empty(self.ring.shape, dtype=np.uint8)
+        while True:
+            self._apply_persist_request()
+            timestamp = self.ring.take(scratch)
+            if timestamp is None:
+                if self.closed or self._flushing:
+                    break
+                self._cut_highlights()
+                time.sleep(IDLE_SLEEP)
+                continue
+            start = time.perf_counter()
+            ok, jpeg = cv2.imencode(".jpg", scratch, [cv2.IMWRITE_JPEG_QUALITY, JPEG_QUALITY])
+            if ok:
+                self._append(timestamp, jpeg.tobytes())
+            if self._writer is not None:
+                self._writer.write(scratch)
+            self.encoded += 1
+            self.encode_p95.update((time.perf_counter() - start) * 1000)
+            self._cut_highlights()
+        self._cut_highlights(final=True)
+        self._close_writer()
+        self._flushing = False
+        self._thread = None
+
+    def _append(self, timestamp, jpeg):
+        self.history.append((timestamp, jpeg))
+        self.history_bytes += len(jpeg)
+        while self.history and self.history[0][0] < timestamp - self.history_seconds:
+            self.history_bytes -= len(self.history.popleft()[1])
+
+    def _cut_highlights(self, final=False):
+        latest = self.history[-1][0] if self.history else None
+        while self.pending_reps:
+            rep, rep_time = self.pending_reps[0]
+            if latest is None or (latest < rep_time + HIGHLIGHT_AFTER and not final):
+                return
+            self.pending_reps.popleft()
+            frames = [item for item in list(self.history)
+                      if rep_time - HIGHLIGHT_BEFORE <= item[0] <= rep_time + HIGHLIGHT_AFTER]
+            if not frames:
+                continue
+            highlight = Highlight(rep, rep_time, frames)
+            self.highlights.append(highlight)
+            if self.persist_path is not None:
+                _queue_clip(self, highlight)
+
+    def _apply_persist_request(self):
+        request = None
+        while True:  # Only the latest request matters.
+            try:
+                request = self._persist_requests.get_nowait()
+            except queue.Empty:
+                break
+        if request is None:
+            return
+        self._close_writer()
+        if request is False:
+            return
+        os.makedirs(os.path.dirname(request), exist_ok=True)
+        height, width = self.ring.shape[:2]
+        self._writer = cv2.VideoWriter(request, cv2.VideoWriter_fourcc(*FOURCC), self.fps, (width, height))
+        for _, jpeg in list(self.history):  # Start from what is still in memory.
+            self._writer.write(cv2.imdecode(np.frombuffer(jpeg, dtype=np.uint8), cv2.IMREAD_COLOR))
+        logging.info("Recording %s to %s", self.stream, request)
+
+    def _close_writer(self):
+        if self._writer is not None:
+            self._writer.release()
+            self._writer = None
+
+    # ----- REQUEST SIDE -----
+    def _path(self, *parts):
+        return os.path.join(RECORDINGS_DIR, self.stream, *parts)
+
+    def persist(self):
+        """Writes the in-memory history to a file and keeps appending to it until stop_persist()."""
+        self.persist_path = self._path(time.strftime("%Y%m%dT%H%M%S") + ".mp4")
+        self._persist_requests.put(self.persist_path)
+        return self.persist_path
+
+    def stop_persist(self):
+        path, self.persist_path = self.persist_path, None
+        self._persist_requests.put(False)
+        return path
+
+    def save_recent(self, seconds=None):
+        """Writes the last `seconds` (default: everything in memory) to a new file."""
+        frames = list(self.history)
+        if seconds is not None and frames:
+            frames = [item for item in frames if item[0] >= frames[-1][0] - seconds]
+        if not frames:
+            return None
+        return write_clip(self._path("clips", time.strftime("%Y%m%dT%H%M%S") + ".mp4"), frames, self.fps)
+
+    def highlight(self, rep):
+        return next((h for h in list(self.highlights) if h.rep == rep), None)
+
+    def save_highlight(self, highlight):
+        # Called from request threads and the clip writer; the lock keeps one write per clip.
+        with self._clip_lock:
+            if highlight.path is None:
+                stamp = time.strftime("%Y%m%dT%H%M%S", time.localtime(highlight.rep_time))
+                highlight.path = write_clip(self._path("highlights", f"{stamp}-rep{highlight.rep}.mp4"),
+                                            highlight.frames, self.fps)
+        return highlight.path
+
+    def flush(self, timeout=5.0):
+        """
+        Ends the session's recording: stops persisting (finalizing the file), cuts the last
+        reps' highlights and stops the encoder once it has drained the ring. History and
+        highlights stay, and the next offer() starts a new encoder. Returns False if the
+        encoder was still running after `timeout` seconds.
+        """
+        self.stop_persist()
+        thread = self._thread
+        if thread is None or thread is threading.current_thread():
+            return True
+        self._flushing = True
+        thread.join(timeout)
+        return not thread.is_alive()
+
+    def close(self, timeout=5.0):
+        """
+        Stops the encoder once it has drained the ring. History and highlights stay available.
+        Returns False if the encoder was still running after `timeout` seconds.
+        """
+        self.closed = True
+        thread = self._thread
+        if thread is not None and thread is not threading.current_thread():
+            thread.join(timeout)
+            return not thread.is_alive()
+        return True
+
+    def stats(self):
+        return {
+            "stream": self.stream,
+            "recording": self._thread is not None,
+            "offered": self.offered,
+            "accepted": self.accepted,
+            "encoded": self.encoded,
+            "dropped": self.ring.dropped if self.ring is not None else 0,
+            "history_sec": round(self.history[-1][0] - self.history[0][0], 2) if len(self.history) > 1 else 0.0,
+            "history_mb": round(self.history_bytes / 1e6, 2),
+            "p95_offer_ms": round(self.offer_p95.value, 3) if self.offer_p95.count else None,
+            "p95_encode_ms": round(self.encode_p95.value, 2) if self.encode_p95.count else None,
+            "persist_path": self.persist_path,
+            "highlights": [h.info() for h in list(self.highlights)],
+        }
+
+_clips = queue.Queue()      # (recorder, highlight) waiting for the clip writer
+_clip_writer = None
+_clip_writer_lock = threading.Lock()
+
+def _queue_clip(recorder, highlight):
+    """Hands a highlight to the clip writer thread, which is started on first use."""
+    global _clip_writer
+    with _clip_writer_lock:
+        if _clip_writer is None:
+            _clip_writer = threading.Thread(target=_write_clips, name="recorder-clips", daemon=True)
+            _clip_writer.start()
+    _clips.put((recorder, highlight))
+
+def _write_clips():
+    while True:
+        recorder, highlight = _clips.get()
+        try:
+            recorder.save_highlight(highlight)
+        except Exception:
+            logging.exception("Could not write highlight of rep %s on %s", highlight.rep, recorder.stream)
+
+_recorders = {}
+_recorders_lock = threading.Lock()
+
+def new_recorder(stream):
+    """
+    The recorder a new frame loop for `stream` should feed, or None when recording is off.
+    It replaces (and inherits the history of) the stream's previous recorder.
+    """
+    if not RECORDER_ENABLED:
+        return None
+    with _recorders_lock:
+        previous = _recorders.get(stream)
+        if previous is not None and not previous.close():
+            logging.warning("Recorder for %s did not stop in time; its last frames are not carried over", stream)
+        recorder = _recorders[stream] = Recorder(stream, previous=previous)
+    return recorder
+
+def get_recorder(stream):
+    return _recorders.get(stream)
@@ -5,7 +5,12 @@ import json
 import mediapipe as mp
 import logging
 import os
-from .pose_estimation import detect_pose, calc_angle, compute_shoulder_tilt, Smoother
+from .pose_estimation import detect_pose, detect_keypoints, calc_angle, compute_shoulder_tilt, Smoother
+from .preprocess import prepare_frame
+from .streaming_stats import BaselineCalibrator
+from .frame_pool import copy_frame, blend_overlay
+from .tracing import span
+from .config_overrides import apply_overrides
 
 logging.basicConfig(level=logging.INFO, format='%(asctime)s %(levelname)s: %(message)s')
 
@@ -19,6 +24,11 @@ class Config:
     MIN_KEYPOINT_CONFIDENCE = 0.3
     MIN_REP_INTERVAL = 0.5
     ENABLE_TORSO_CHECK = False  # Toggle torso upright check
+    CALIBRATION_FRAMES = 30     # Standing frames used to learn the user's neutral torso angle
+    TORSO_SIGMA = 3.0           # Allowed torso deviation in standard deviations (TORSO_ANGLE_THRESHOLD is the floor)
+    BASELINE_ADAPT_RATE = 0.01
+
+apply_overrides("squats", Config)
 
 mp_drawing = mp.solutions.drawing_utils
 mp_pose = mp.solutions.pose
@@ -52,8 +62,30 @@ class SquatCounter:
         self.squat_flag = False
         self.last_rep_time = 0
         self.angle_smoother = Smoother(window_size=self.config.SMOOTHING_WINDOW)
-
-    def process_keypoints(self, keypoints):
+        self.torso_baseline = BaselineCalibrator(target_frames=self.config.CALIBRATION_FRAMES,
+                                                 sigma=self.config.TORSO_SIGMA,
+                                                 min_threshold=self.config.TORSO_ANGLE_THRESHOLD,
+                                                 adapt_rate=self.config.BASELINE_ADAPT_RATE)
+
+    @property
+    def count(self):
+        return self.squat_count
+
+    def snapshot(self):
+        """Rep state another node needs to resume this session (see session_store.py)."""
+        return {"squat_count": self.squat_count, "squat_flag": self.squat_flag,
+                "last_rep_time": self.last_rep_time}
+
+    def restore(self, snapshot):
+        self.squat_count = snapshot.get("squat_count", 0)
+        self.squat_flag = snapshot.get("squat_flag", False)
+        self.last_rep_time = snapshot.get("last_rep_time", 0)
+
+    def process_keypoints(self, keypoints, timestamp=None):
+        """
+        Updates the count from one frame of MoveNet keypoints. `timestamp` (seconds) is the
+        frame's capture time; it defaults to now and is passed when replaying recorded frames.
+        """
         if len(keypoints) < 17:
             return None, "Insufficient keypoints detected"
 
@@ -71,9 +103,19 @@ class SquatCounter:
         avg_knee_angle = self.angle_smoother.update(knee_angle)
 
         torso_angle = compute_torso_angle(left_shoulder, left_hip)
-        upright_torso = (torso_angle < self.config.TORSO_ANGLE_THRESHOLD) if self.config.ENABLE_TORSO_CHECK else True
+        # Learn the neutral torso angle while standing; until then fall back to the fixed limit.
+        standing = avg_knee_angle > self.config.MAX_SQUAT_ANGLE
+        if not self.torso_baseline.calibrated:
+            if standing:
+                self.torso_baseline.calibrate(torso_angle)
+            torso_off = torso_angle >= self.config.TORSO_ANGLE_THRESHOLD
+        elif standing:
+            torso_off = self.torso_baseline.update(torso_angle)
+        else:
+            torso_off = self.torso_baseline.is_outlier(torso_angle)
+        upright_torso = (not torso_off) if self.config.ENABLE_TORSO_CHECK else True
 
-        current_time = time.time()
+        current_time = time.time() if timestamp is None else timestamp
 
         if upright_torso:
             if avg_knee_angle < self.config.MIN_SQUAT_ANGLE:
@@ -95,18 +137,16 @@ class SquatCounter:
         return avg_knee_angle, feedback
 
 
-def save_progress(user, squat_count, filename="squat_progress.json"):
+def save_progress(user, squat_count, filename="squat_progress.json", session="default"):
+    """Queues the user's progress for this session; the write-behind worker writes it to `filename`."""
+    from persistence import PersistenceQueue
     data = {"user": user, "squats": squat_count, "timestamp": time.time()}
-    try:
-        with open(filename, "w") as f:
-            json.dump(data, f)
-        logging.info("Progress saved successfully.")
-    except Exception as e:
-        logging.error("Failed to save progress: %s", e)
+    PersistenceQueue.get_instance().submit("progress", filename, user=user, session=session, data=data)
+    logging.info("Progress queued for saving.")
 
-def render_ui(frame, avg_knee_angle, feedback, squat_count, config: Config):
+def render_ui(frame, avg_knee_angle, feedback, squat_count, config: Config, pool=None):
     height, width, _ = frame.shape
-    overlay = frame.copy()
+    overlay = copy_frame(pool, 'overlay', frame)
 
     cv2.rectangle(overlay, (10, 10), (150, 70), (0, 0, 0), cv2.FILLED)
     cv2.putText(overlay, f"Reps: {squat_count}", (20, 50),
@@ -131,19 +171,37 @@ def render_ui(frame, avg_knee_angle, feedback, squat_count, config: Config):
     cv2.putText(overlay, feedback, (width // 2 - 60, height - 40),
                 cv2.FONT_HERSHEY_SIMPLEX, 1, (255, 255, 255), 2)
 
-    return cv2.addWeighted(overlay, 0.8, frame, 0.2, 0)
-
-def process_squat_frame(frame, squat_counter, config, pose):
-    image_rgb = cv2.cvtColor(frame, cv2.COLOR_BGR2RGB)
-    results = pose.process(image_rgb)
-    keypoints = detect_pose(image_rgb)
-    avg_knee_angle, feedback = squat_counter.process_keypoints(keypoints)
+    return blend_overlay(overlay, 0.8, frame, 0.2, pool)
+
+def process_squat_frame(frame, squat_counter, config, pose, pool=None, preprocessor=None, gate=None):
+    """
+    Annotates one frame. With a FramePool the RGB copy, overlay and blend reuse the
+    pool's buffers and the result is written into `frame` itself. With an
+    InferencePreprocessor both models run on one downscaled RGB copy. With a
+    PresenceGate, neither model runs while the room is empty.
+    """
+    if gate is not None:
+        with span("presence"):
+            infer = gate.should_infer(frame)
+        if not infer:
+            with span("render"):
+                return render_ui(frame, config.MAX_SQUAT_ANGLE, "No user detected", squat_counter.squat_count, config, pool)
+    with span("preprocess"):
+        prepared = prepare_frame(frame, preprocessor, pool)
+    with span("mediapipe"):
+        results = pose.process(prepared.rgb)
+    keypoints = detect_keypoints(prepared)
+    with span("count"):
+        avg_knee_angle, feedback = squat_counter.process_keypoints(keypoints)
+    if gate is not None:
+        gate.report(results.pose_landmarks is not None)
     if avg_knee_angle is None:
         avg_knee_angle = config.MAX_SQUAT_ANGLE  
         feedback = "No user detected"
-    processed_frame = render_ui(frame, avg_knee_angle, feedback, squat_counter.squat_count, config)
-    if results.pose_landmarks:
-        mp_drawing.draw_landmarks(processed_frame, results.pose_landmarks, mp_pose.POSE_CONNECTIONS)
+    with span("render"):
+        processed_frame = render_ui(frame, avg_knee_angle, feedback, squat_counter.squat_count, config, pool)
+        if results.pose_landmarks:
+            mp_drawing.draw_landmarks(processed_frame, results.pose_landmarks, mp_pose.POSE_CONNECTIONS)
     return processed_frame
 
 def run_squat_trainer():
@@ -155,6 +213,7 @@ def run_squat_trainer():
     pose = mp_pose.Pose(min_detection_confidence=0.7, min_tracking_confidence=0.5)
     squat_counter = SquatCounter(config)
     user = "User1"
+    session = time.strftime("%Y%m%dT%H%M%S")
     try:
         while True:
             success, frame = cap.read()
@@ -169,7 +228,7 @@ def run_squat_trainer():
     except Exception as e:
         logging.exception("An error occurred during squat training: %s", e)
     finally:
-        save_progress(user, squat_counter.squat_count)
+        save_progress(user, squat_counter.squat_count, session=session)
         cap.release()
         cv2.destroyAllWindows()
 
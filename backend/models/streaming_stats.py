@@ -0,0 +1,175 @@
+# streaming_stats.py
+import math
+
+class RunningStats:
+    """
+    Welford's online mean/variance. Constant memory however many values are added.
+    """
+    def __init__(self):
+        self.reset()
+
+    def reset(self):
+        self.count = 0
+        self.mean = 0.0
+        self._m2 = 0.0
+
+    def update(self, value):
+        self.count += 1
+        delta = value - self.mean
+        self.mean += delta / self.count
+        self._m2 += delta * (value - self.mean)
+        return self.mean
+
+    @property
+    def variance(self):
+        return self._m2 / (self.count - 1) if self.count > 1 else 0.0
+
+    @property
+    def std(self):
+        return math.sqrt(self.variance)
+
+
+class P2Quantile:
+    """
+    Streaming quantile estimate using the P-square algorithm (Jain & Chlamtac).
+    Keeps five markers instead of the samples, so memory is constant.
+    """
+    def __init__(self, q=0.5):
+        self.q = q
+        self.reset()
+
+    def reset(self):
+        self.count = 0
+        self._heights = []
+        self._positions = [1, 2, 3, 4, 5]
+        self._desired = [1, 1 + 2 * self.q, 1 + 4 * self.q, 3 + 2 * self.q, 5]
+        self._increments = [0, self.q / 2, self.q, (1 + self.q) / 2, 1]
+
+    def update(self, value):
+        self.count += 1
+        heights = self._heights
+        if self.count <= 5:
+            heights.append(value)
+            heights.sort()
+            return self.value
+
+        # Find the cell the new value falls in, extending the extremes if needed.
+        if value < heights[0]:
+            heights[0] = value
+            k = 0
+        elif value >= heights[4]:
+            heights[4] = value
+            k = 3
+        else:
+            k = next(i for i in range(4) if heights[i] <= value < heights[i + 1])
+
+        for i in range(k + 1, 5):
+            self._positions[i] += 1
+        for i in range(5):
+            self._desired[i] += self._increments[i]
+
+        # Nudge the three middle markers towards their desired positions.
+        for i in range(1, 4):
+            offset = self._desired[i] - self._positions[i]
+            if (offset >= 1 and self._positions[i + 1] - self._positions[i] > 1) or \
+               (offset <= -1 and self._positions[i - 1] - self._positions[i] < -1):
+                step = 1 if offset > 0 else -1
+                candidate = self._parabolic(i, step)
+                if not heights[i - 1] < candidate < heights[i + 1]:
+                    candidate = self._linear(i, step)
+                heights[i] = candidate
+                self._positions[i] += step
+        return self.value
+
+    def _parabolic(self, i, step):
+        n, h = self._positions, self._heights
+        return h[i] + step / (n[i + 1] - n[i - 1]) * (
+            (n[i] - n[i - 1] + step) * (h[i + 1] - h[i]) / (n[i + 1] - n[i]) +
+            (n[i + 1] - n[i] - step) * (h[i] - h[i - 1]) / (n[i] - n[i - 1]))
+
+    def _linear(self, i, step):
+        n, h = self._positions, self._heights
+        return h[i] + step * (h[i + step] - h[i]) / (n[i + step] - n[i])
+
+    @property
+    def value(self):
+        if not self._heights:
+            return None
+        if self.count <= 5:
+            # Exact quantile of the few samples seen so far.
+            return self._heights[min(int(self.q * len(self._heights)), len(self._heights) - 1)]
+        return self._heights[2]
+
+
+class BaselineCalibrator:
+    """
+    Learns a person's neutral value for a posture metric (shoulder tilt, torso angle,
+    body alignment) and flags frames that deviate from it.
+
+    - Calibration: the first `target_frames` values feed Welford stats and a streaming
+      median; the baseline is the median, which ignores the transition frames at the
+      start of calibration.
+    - Threshold: `sigma` standard deviations of the person's own jitter, but never
+      tighter than `min_threshold` degrees.
+    - Adaptation: after calibration, in-tolerance values slowly pull the baseline and
+      variance (exponential forgetting with `adapt_rate`), so a long session follows a
+      drifting camera or a tired user. Out-of-tolerance values are ignored so bad
+      posture does not become the new normal.
+    """
+    def __init__(self, target_frames=30, sigma=3.0, min_threshold=5.0, adapt_rate=0.01):
+        self.target_frames = target_frames
+        self.sigma = sigma
+        self.min_threshold = min_threshold
+        self.adapt_rate = adapt_rate
+        self.stats = RunningStats()
+        self.median = P2Quantile(0.5)
+        self.reset()
+
+    def reset(self):
+        self.stats.reset()
+        self.median.reset()
+        self.baseline = None
+        self.variance = 0.0
+
+    @property
+    def calibrated(self):
+        return self.baseline is not None
+
+    @property
+    def progress(self):
+        return min(self.stats.count / self.target_frames, 1.0)
+
+    @property
+    def threshold(self):
+        return max(self.min_threshold, self.sigma * math.sqrt(self.variance))
+
+    def calibrate(self, value):
+        """Adds a calibration sample. Returns True once the baseline is locked in."""
+        if self.calibrated:
+            return True
+        self.stats.update(value)
+        self.median.update(value)
+        if self.stats.count >= self.target_frames:
+            self.baseline = self.median.value
+            self.variance = self.stats.variance
+        return self.calibrated
+
+    def deviation(self, value):
+        return value - self.baseline if self.calibrated else 0.0
+
+    def is_outlier(self, value):
+        return self.calibrated and abs(self.deviation(value)) > self.threshold
+
+    def update(self, value):
+        """
+        Checks a live value against the baseline and adapts the baseline with it.
+        Returns True when the value is outside the person's normal range.
+        """
+        if not self.calibrated:
+            return False
+        if self.is_outlier(value):
+            return True
+        delta = value - self.baseline
+        self.baseline += self.adapt_rate * delta
+        self.variance = (1 - self.adapt_rate) * (self.variance + self.adapt_rate * delta * delta)
+        return False
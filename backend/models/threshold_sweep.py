@@ -0,0 +1,346 @@
+# threshold_sweep.py
+"""
+Tunes the rep counter thresholds against recordings with known rep counts.
+
+    python -m models.threshold_sweep labels.json
+    python -m models.threshold_sweep labels.json --exercise squats --grid MIN_SQUAT_ANGLE=90:130:2 --export
+
+labels.json lists recordings, with paths relative to the file:
+
+    [{"video": "models/squats.mp4", "exercise": "squats", "reps": 12},
+     {"keypoints": "recordings/pushups-1.npz", "exercise": "pushups", "reps": 8}]
+
+A "video" goes through the keypoint cache (extracted once, then memory-mapped); a
+"keypoints" file is an .npz with the keypoints, timestamps and visibility arrays of
+keypoint_cache.VideoKeypoints. Each exercise's counter is re-implemented here as numpy
+operations over a vector of parameter sets, so one pass over a recording evaluates
+every combination in the grid; recordings and parameter chunks run in a process pool.
+
+Every combination is scored by the mean absolute rep error over its recordings and by
+latency, the mean time from the bottom of a rep (lowest raw joint angle since the
+previous count) to the moment it is counted. The Pareto front of the two is printed,
+and --export writes the chosen point to config_overrides.json.
+"""
+import argparse
+import itertools
+import json
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor
+import numpy as np
+
+from .config_overrides import OVERRIDES_PATH, save_overrides
+from .keypoint_cache import VideoKeypoints, load_keypoints
+from .pose_estimation import calc_angles
+
+# Default grids (start, stop inclusive, step) over the hand-picked constants.
+GRIDS = {
+    "squats": {
+        "MIN_SQUAT_ANGLE": (80, 140, 5),
+        "MAX_SQUAT_ANGLE": (140, 175, 5),
+        "SMOOTHING_WINDOW": (1, 9, 1),
+        "MIN_REP_INTERVAL": (0.3, 0.9, 0.3),
+    },
+    "pushups": {
+        "BENT_ANGLE": (60, 120, 5),
+        "EXTENDED_ANGLE": (140, 175, 5),
+    },
+    "bicep_curls": {
+        "BENT_ANGLE": (30, 80, 5),
+        "EXTENDED_ANGLE": (130, 170, 5),
+        "SMOOTHING_WINDOW": (1, 9, 1),
+    },
+}
+# Pairs that must satisfy low < high for a combination to be valid.
+ORDERED = {
+    "squats": ("MIN_SQUAT_ANGLE", "MAX_SQUAT_ANGLE"),
+    "pushups": ("BENT_ANGLE", "EXTENDED_ANGLE"),
+    "bicep_curls": ("BENT_ANGLE", "EXTENDED_ANGLE"),
+}
+# Settings the sweep holds fixed, matching the counters' defaults.
+SQUAT_MIN_KEYPOINT_CONFIDENCE = 0.3   # squats.Config.MIN_KEYPOINT_CONFIDENCE
+PUSHUP_MIN_VISIBILITY = 0.5           # process_pushup_frame's presence check
+# The bicep sweep replays the single-user process_bicep_frame: reps count only once the
+# cross-arms start gesture and shoulder calibration are done, the raise-both-hands gesture
+# zeroes them, and every frame counts whatever its keypoint confidence. It assumes "both"
+# arm mode throughout. Group mode's BicepCounter shares the exported angles but has no
+# start gesture and skips low-confidence frames; the sweep does not model it.
+BICEP_CALIBRATION_FRAMES = 30         # bicep_curl.CALIBRATION_FRAMES
+BICEP_GESTURE_FRAME_THRESHOLD = 30    # bicep_curl.GESTURE_FRAME_THRESHOLD
+BICEP_CROSS_RATIO = 0.6               # Wrist to opposite shoulder, in shoulder widths, to start
+CHUNK_SIZE = 2048
+
+def grid_values(start, stop, step):
+    return np.round(np.arange(start, stop + step / 2, step), 6)
+
+def build_grid(exercise, overrides=None):
+    """All valid combinations as a dict of equal-length arrays, one per setting."""
+    spec = dict(GRIDS[exercise], **(overrides or {}))
+    names = list(spec)
+    combos = np.array(list(itertools.product(*(grid_values(*spec[name]) for name in names))), dtype=np.float64)
+    grid = {name: combos[:, i] for i, name in enumerate(names)}
+    low, high = ORDERED[exercise]
+    keep = grid[low] < grid[high]
+    return {name: values[keep] for name, values in grid.items()}
+
+def moving_average(values, window):
+    """What Smoother(window) returns after each value: the mean of up to the last `window` values."""
+    cumulative = np.concatenate(([0.0], np.cumsum(values)))
+    index = np.arange(len(values))
+    start = np.maximum(index + 1 - window, 0)
+    return (cumulative[index + 1] - cumulative[start]) / (index + 1 - start)
+
+def smoothed_by_window(values, windows):
+    """The signal smoothed once per distinct window, (windows, T), and each parameter set's row."""
+    unique, rows = np.unique(windows.astype(int), return_inverse=True)
+    smoothed = np.stack([moving_average(values, w) for w in unique]).reshape(len(unique), len(values))
+    return smoothed, rows
+
+# ----- VECTORIZED COUNTERS -----
+# Each returns (counts, latency_sums) with one entry per parameter set.
+def sweep_squats(recording, params):
+    keypoints, timestamps = recording.keypoints, recording.timestamps
+    valid = (keypoints[:, [5, 11, 13, 15], 2] >= SQUAT_MIN_KEYPOINT_CONFIDENCE).all(axis=1)
+    raw = calc_angles(keypoints[valid, 11, :2], keypoints[valid, 13, :2], keypoints[valid, 15, :2])
+    times = timestamps[valid]
+    smoothed, rows = smoothed_by_window(raw, params["SMOOTHING_WINDOW"])
+    min_angle, max_angle, interval = params["MIN_SQUAT_ANGLE"], params["MAX_SQUAT_ANGLE"], params["MIN_REP_INTERVAL"]
+
+    size = len(rows)
+    flag = np.zeros(size, dtype=bool)
+    counts = np.zeros(size, dtype=np.int64)
+    last_rep = np.zeros(size)
+    bottom_angle = np.full(size, np.inf)
+    bottom_time = np.zeros(size)
+    latency = np.zeros(size)
+    for t in range(len(raw)):
+        angle = smoothed[rows, t]
+        deeper = raw[t] < bottom_angle
+        bottom_angle[deeper] = raw[t]
+        bottom_time[deeper] = times[t]
+        down = angle < min_angle
+        rep = ~down & (angle > max_angle) & flag & (times[t] - last_rep >= interval)
+        flag |= down
+        flag &= ~rep
+        counts += rep
+        last_rep[rep] = times[t]
+        latency[rep] += times[t] - bottom_time[rep]
+        bottom_angle[rep] = np.inf
+    return counts, latency
+
+def sweep_pushups(recording, params):
+    keypoints, timestamps = recording.keypoints, recording.timestamps
+    valid = recording.visibility >= PUSHUP_MIN_VISIBILITY
+    kp = keypoints[valid]
+    raw = (calc_angles(kp[:, 5, :2], kp[:, 7, :2], kp[:, 9, :2])
+           + calc_angles(kp[:, 6, :2], kp[:, 8, :2], kp[:, 10, :2])) / 2
+    times = timestamps[valid]
+    bent, extended = params["BENT_ANGLE"], params["EXTENDED_ANGLE"]
+    # PushupCounter's progress < 5% and > 95%, as elbow angles.
+    low = bent + 0.05 * (extended - bent)
+    high = bent + 0.95 * (extended - bent)
+
+    size = len(bent)
+    downwards = np.zeros(size, dtype=bool)
+    counts = np.zeros(size, dtype=np.int64)
+    bottom_angle = np.full(size, np.inf)
+    bottom_time = np.zeros(size)
+    latency = np.zeros(size)
+    for t in range(len(raw)):
+        deeper = raw[t] < bottom_angle
+        bottom_angle[deeper] = raw[t]
+        bottom_time[deeper] = times[t]
+        start = (raw[t] < low) & ~downwards
+        rep = (raw[t] > high) & downwards
+        downwards = (downwards | start) & ~rep
+        counts += rep
+        latency[rep] += times[t] - bottom_time[rep]
+        bottom_angle[rep] = np.inf
+    return counts, latency
+
+def bicep_session_phases(keypoints):
+    """
+    Replays process_bicep_frame's session states, which do not depend on the swept angles.
+    Returns (active, reset): the frames on which reps are counted, and the frames on which
+    the reset gesture zeroes the counts (after that frame's counting) and returns to waiting.
+    """
+    left_shoulder, right_shoulder = keypoints[:, 5, :2], keypoints[:, 6, :2]
+    left_wrist, right_wrist, nose = keypoints[:, 9, :2], keypoints[:, 10, :2], keypoints[:, 0, :2]
+    cross = BICEP_CROSS_RATIO * np.linalg.norm(left_shoulder - right_shoulder, axis=1)
+    crossed = ((np.linalg.norm(left_wrist - right_shoulder, axis=1) < cross)
+               & (np.linalg.norm(right_wrist - left_shoulder, axis=1) < cross))
+    raised = (left_wrist[:, 1] < nose[:, 1]) & (right_wrist[:, 1] < nose[:, 1])
+    active = np.zeros(len(keypoints), dtype=bool)
+    reset = np.zeros(len(keypoints), dtype=bool)
+    phase, calibration, held = "waiting", 0, 0
+    for t in range(len(keypoints)):
+        if phase == "waiting":
+            if crossed[t]:
+                phase, calibration = "calibrating", 0
+        elif phase == "calibrating":
+            calibration += 1
+            if calibration >= BICEP_CALIBRATION_FRAMES:
+                phase = "active"
+        else:
+            active[t] = True
+            held = held + 1 if raised[t] else 0
+            if held > BICEP_GESTURE_FRAME_THRESHOLD:
+                reset[t] = True
+                phase, held = "waiting", 0
+    return active, reset
+
+def sweep_bicep_curls(recording, params):
+    kp, times = recording.keypoints, recording.timestamps
+    active, reset = bicep_session_phases(kp)
+    bent, extended = params["BENT_ANGLE"], params["EXTENDED_ANGLE"]
+    size = len(bent)
+    counts = np.zeros(size, dtype=np.int64)
+    latency = np.zeros(size)
+    for shoulder, elbow, wrist in ((5, 7, 9), (6, 8, 10)):
+        # The smoothers run on every frame, counting only on active ones.
+        raw = calc_angles(kp[:, shoulder, :2], kp[:, elbow, :2], kp[:, wrist, :2])
+        smoothed, rows = smoothed_by_window(raw, params["SMOOTHING_WINDOW"])
+        arm_counts = np.zeros(size, dtype=np.int64)
+        arm_latency = np.zeros(size)
+        flag = np.zeros(size, dtype=bool)
+        bottom_angle = np.full(size, np.inf)
+        bottom_time = np.zeros(size)
+        for t in np.flatnonzero(active):
+            angle = smoothed[rows, t]
+            deeper = raw[t] < bottom_angle
+            bottom_angle[deeper] = raw[t]
+            bottom_time[deeper] = times[t]
+            flag &= ~(angle > extended)
+            rep = (angle < bent) & ~flag
+            flag |= rep
+            arm_counts += rep
+            arm_latency[rep] += times[t] - bottom_time[rep]
+            bottom_angle[rep] = np.inf
+            if reset[t]:
+                arm_counts[:], arm_latency[:], flag[:] = 0, 0.0, False
+                bottom_angle[:] = np.inf
+        counts += arm_counts
+        latency += arm_latency
+    return counts, latency
+
+SWEEPS = {"squats": sweep_squats, "pushups": sweep_pushups, "bicep_curls": sweep_bicep_curls}
+
+def run_chunk(exercise, recording, params):
+    # Process pool entry point: plain arrays in, plain arrays out.
+    return SWEEPS[exercise](VideoKeypoints(*recording), params)
+
+# ----- RECORDINGS -----
+def load_labels(path):
+    base = os.path.dirname(os.path.abspath(path))
+    with open(path) as f:
+        labels = json.load(f)
+    recordings = []
+    for label in labels:
+        if "keypoints" in label:
+            with np.load(os.path.join(base, label["keypoints"])) as data:
+                recording = VideoKeypoints(*(data[name] for name in VideoKeypoints._fields))
+            name = label["keypoints"]
+        else:
+            recording, _ = load_keypoints(os.path.join(base, label["video"]))
+            name = label["video"]
+        recordings.append({"name": name, "exercise": label["exercise"], "reps": int(label["reps"]),
+                           "recording": VideoKeypoints(*(np.asarray(a) for a in recording))})
+    return recordings
+
+# ----- SCORING -----
+def pareto_front(errors, latencies):
+    """Indices of the combinations no other combination beats on both error and latency."""
+    order = np.lexsort((latencies, errors))
+    front, best_latency = [], np.inf
+    for i in order:
+        if not front or latencies[i] < best_latency:
+            front.append(i)
+            best_latency = latencies[i]
+    return np.array(front, dtype=np.int64)
+
+def sweep(exercise, recordings, grid, workers=None):
+    """Per-combination mean absolute error, exact-count accuracy and mean latency (seconds)."""
+    size = len(next(iter(grid.values())))
+    chunks = [slice(i, min(i + CHUNK_SIZE, size)) for i in range(0, size, CHUNK_SIZE)]
+    abs_error = np.zeros(size)
+    exact = np.zeros(size)
+    latency = np.zeros(size)
+    counted = np.zeros(size)
+    with ProcessPoolExecutor(max_workers=workers) as pool:
+        jobs = [(label, chunk, pool.submit(run_chunk, exercise, tuple(label["recording"]),
+                                           {name: values[chunk] for name, values in grid.items()}))
+                for label in recordings for chunk in chunks]
+        for label, chunk, job in jobs:
+            counts, latency_sums = job.result()
+            abs_error[chunk] += np.abs(counts - label["reps"])
+            exact[chunk] += counts == label["reps"]
+            latency[chunk] += latency_sums
+            counted[chunk] += counts
+    mean_latency = np.where(counted > 0, latency / np.maximum(counted, 1), np.inf)
+    return abs_error / len(recordings), exact / len(recordings), mean_latency
+
+def choose(front, errors, latencies, max_latency=None):
+    """Lowest-error point on the front, optionally within a latency budget (seconds)."""
+    candidates = [i for i in front if max_latency is None or latencies[i] <= max_latency]
+    return min(candidates or front, key=lambda i: (errors[i], latencies[i]))
+
+def format_latency(seconds):
+    return f"{seconds * 1000:.0f}ms" if np.isfinite(seconds) else "-"
+
+INTEGER_SETTINGS = {"SMOOTHING_WINDOW"}
+
+def as_setting(name, value):
+    """The evaluated grid value as a JSON number; only whole-number settings are cast to int."""
+    value = float(value)
+    return int(value) if name in INTEGER_SETTINGS or value.is_integer() else value
+
+def parse_grid(items):
+    overrides = {}
+    for item in items or []:
+        name, _, spec = item.partition("=")
+        start, stop, step = (float(v) for v in spec.split(":"))
+        overrides[name] = (start, stop, step)
+    return overrides
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("labels", help="JSON list of recordings with ground-truth rep counts")
+    parser.add_argument("--exercise", choices=tuple(GRIDS), action="append",
+                        help="exercise(s) to tune (default: every exercise in the labels)")
+    parser.add_argument("--grid", action="append", metavar="NAME=START:STOP:STEP",
+                        help="override one setting's range (applies to every tuned exercise that has it)")
+    parser.add_argument("--workers", type=int, help="worker processes (default: one per CPU)")
+    parser.add_argument("--max-latency", type=float, help="latency budget in seconds when picking a point")
+    parser.add_argument("--top", type=int, default=15, help="Pareto points to print")
+    parser.add_argument("--export", action="store_true", help=f"write the chosen values to {OVERRIDES_PATH}")
+    args = parser.parse_args()
+
+    recordings = load_labels(args.labels)
+    grid_overrides = parse_grid(args.grid)
+    for exercise in args.exercise or sorted({r["exercise"] for r in recordings}):
+        labelled = [r for r in recordings if r["exercise"] == exercise]
+        if not labelled:
+            print(f"\n{exercise}: no recordings")
+            continue
+        grid = build_grid(exercise, {k: v for k, v in grid_overrides.items() if k in GRIDS[exercise]})
+        size = len(next(iter(grid.values())))
+        start = time.perf_counter()
+        errors, accuracy, latencies = sweep(exercise, labelled, grid, args.workers)
+        elapsed = time.perf_counter() - start
+        front = pareto_front(errors, latencies)
+        print(f"\n== {exercise}: {size} combinations x {len(labelled)} recordings in {elapsed:.2f}s ==")
+        names = list(grid)
+        print(f"{'error':>7} {'exact':>6} {'latency':>8}  " + "  ".join(names))
+        for i in front[:args.top]:
+            values = "  ".join(f"{as_setting(n, grid[n][i])!s:>{len(n)}}" for n in names)
+            print(f"{errors[i]:7.2f} {accuracy[i]:6.0%} {format_latency(latencies[i]):>8}  {values}")
+
+        best = choose(front, errors, latencies, args.max_latency)
+        chosen = {name: as_setting(name, grid[name][best]) for name in names}
+        print(f"chosen: {chosen} (error {errors[best]:.2f}, latency {format_latency(latencies[best])})")
+        if args.export:
+            save_overrides(exercise, chosen)
+            print(f"exported to {OVERRIDES_PATH}")
+
+if __name__ == "__main__":
+    main()
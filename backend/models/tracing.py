@@ -0,0 +1,202 @@
+# tracing.py
+"""
+Opt-in per-session tracing (Chrome trace-event JSON) and a sampling profiler
+(speedscope JSON or folded stacks for flame graphs).
+
+Pipeline code marks stages with `with span("movenet"):`. A span only records when the
+current thread has an active Tracer (see `activate`); otherwise `span` returns a shared
+no-op context manager, so instrumented code costs one thread-local lookup per stage.
+"""
+import os
+import sys
+import threading
+import time
+from collections import Counter, deque
+
+TRACE_HEADER = "X-FitPal-Trace"
+MAX_TRACE_EVENTS = 200_000
+
+_local = threading.local()
+_tracers = {}
+_tracers_lock = threading.Lock()
+
+class _NullSpan:
+    __slots__ = ()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        return False
+
+NULL_SPAN = _NullSpan()
+
+class _Span:
+    __slots__ = ("tracer", "name", "start")
+
+    def __init__(self, tracer, name):
+        self.tracer = tracer
+        self.name = name
+
+    def __enter__(self):
+        self.start = time.perf_counter_ns()
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        end = time.perf_counter_ns()
+        self.tracer.events.append((self.name, self.start, end - self.start, threading.get_ident()))
+        return False
+
+class Tracer:
+    """Collects span timings for one session in a bounded buffer."""
+    def __init__(self, name, max_events=MAX_TRACE_EVENTS):
+        self.name = name
+        self.events = deque(maxlen=max_events)
+        self.started_at = time.perf_counter_ns()
+
+    def span(self, name):
+        return _Span(self, name)
+
+    def chrome_trace(self):
+        """Trace-event JSON, loadable in chrome://tracing, Perfetto or speedscope."""
+        pid = os.getpid()
+        thread_names = {t.ident: t.name for t in threading.enumerate()}
+        events = [{
+            "name": name,
+            "cat": self.name,
+            "ph": "X",
+            "ts": (start - self.started_at) / 1000,
+            "dur": duration / 1000,
+            "pid": pid,
+            "tid": tid,
+        } for name, start, duration, tid in list(self.events)]
+        for tid in {event["tid"] for event in events}:
+            events.append({"name": "thread_name", "ph": "M", "pid": pid, "tid": tid,
+                           "args": {"name": thread_names.get(tid, str(tid))}})
+        return {"traceEvents": events, "displayTimeUnit": "ms", "otherData": {"session": self.name}}
+
+def span(name):
+    tracer = getattr(_local, "tracer", None)
+    if tracer is None:
+        return NULL_SPAN
+    return tracer.span(name)
+
+class activate:
+    """Makes `tracer` (may be None) the current thread's tracer for the duration of the block."""
+    __slots__ = ("tracer", "previous")
+
+    def __init__(self, tracer):
+        self.tracer = tracer
+
+    def __enter__(self):
+        self.previous = getattr(_local, "tracer", None)
+        _local.tracer = self.tracer
+        return self.tracer
+
+    def __exit__(self, exc_type, exc, tb):
+        _local.tracer = self.previous
+        return False
+
+# ----- PER-SESSION TRACERS -----
+def trace_requested(request):
+    """True if a request asks for tracing with ?trace=1 or the X-FitPal-Trace: 1 header."""
+    return request.args.get("trace") == "1" or request.headers.get(TRACE_HEADER) == "1"
+
+def enable_tracing(session):
+    with _tracers_lock:
+        tracer = _tracers[session] = Tracer(session)
+    return tracer
+
+def disable_tracing(session):
+    with _tracers_lock:
+        return _tracers.pop(session, None)
+
+def get_tracer(session):
+    return _tracers.get(session)
+
+# ----- SAMPLING PROFILER -----
+class SamplingProfiler:
+    """
+    Samples the Python stacks of every thread at a fixed interval for a fixed time.
+    Runs on its own daemon thread; nothing is instrumented while it is off.
+    """
+    def __init__(self, seconds, interval=0.005):
+        self.seconds = seconds
+        self.interval = interval
+        self.samples = {}   # thread name -> Counter of stacks (root first)
+        self.started_at = None
+        self.finished_at = None
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._run, name="sampling-profiler", daemon=True)
+
+    @property
+    def running(self):
+        return self._thread.is_alive()
+
+    def start(self):
+        self.started_at = time.time()
+        self._thread.start()
+        return self
+
+    def stop(self):
+        self._stop.set()
+        self._thread.join()
+
+    def _run(self):
+        own = threading.get_ident()
+        deadline = time.monotonic() + self.seconds
+        while not self._stop.is_set() and time.monotonic() < deadline:
+            names = {t.ident: t.name for t in threading.enumerate()}
+            for tid, frame in sys._current_frames().items():
+                if tid == own:
+                    continue
+                stack = []
+                while frame is not None:
+                    code = frame.f_code
+                    stack.append((code.co_name, code.co_filename, code.co_firstlineno))
+                    frame = frame.f_back
+                stack.reverse()
+                self.samples.setdefault(names.get(tid, str(tid)), Counter())[tuple(stack)] += 1
+            self._stop.wait(self.interval)
+        self.finished_at = time.time()
+
+    def speedscope(self):
+        """Sampled profiles, one per thread, in speedscope's file format."""
+        frames, index = [], {}
+        profiles = []
+        for thread_name, stacks in self.samples.items():
+            samples, weights = [], []
+            for stack, count in stacks.items():
+                ids = []
+                for frame in stack:
+                    if frame not in index:
+                        index[frame] = len(frames)
+                        frames.append({"name": frame[0], "file": frame[1], "line": frame[2]})
+                    ids.append(index[frame])
+                samples.append(ids)
+                weights.append(count * self.interval)
+            profiles.append({
+                "type": "sampled",
+                "name": thread_name,
+                "unit": "seconds",
+                "startValue": 0,
+                "endValue": sum(weights),
+                "samples": samples,
+                "weights": weights,
+            })
+        return {
+            "$schema": "https://www.speedscope.app/file-format-schema.json",
+            "shared": {"frames": frames},
+            "profiles": profiles,
+            "name": f"fitpal profile ({self.seconds}s)",
+            "exporter": "fitpal",
+        }
+
+    def folded(self):
+        """Folded stacks ("thread;outer;inner count" per line) for flamegraph.pl and similar tools."""
+        lines = []
+        for thread_name, stacks in self.samples.items():
+            for stack, count in stacks.items():
+                names = [thread_name] + [f"{name} ({os.path.basename(path)}:{line})" for name, path, line in stack]
+                lines.append(";".join(names) + f" {count}")
+        return "\n".join(lines) + "\n"
@@ -0,0 +1,117 @@
+# tracking.py
+import collections
+import itertools
+import numpy as np
+
+def iou_matrix(a, b):
+    """IoU between every box in `a` (N, 4) and every box in `b` (M, 4), boxes as (x1, y1, x2, y2)."""
+    a = np.asarray(a, dtype=np.float32).reshape(-1, 1, 4)
+    b = np.asarray(b, dtype=np.float32).reshape(1, -1, 4)
+    width = np.clip(np.minimum(a[..., 2], b[..., 2]) - np.maximum(a[..., 0], b[..., 0]), 0, None)
+    height = np.clip(np.minimum(a[..., 3], b[..., 3]) - np.maximum(a[..., 1], b[..., 1]), 0, None)
+    inter = width * height
+    area_a = (a[..., 2] - a[..., 0]) * (a[..., 3] - a[..., 1])
+    area_b = (b[..., 2] - b[..., 0]) * (b[..., 3] - b[..., 1])
+    union = area_a + area_b - inter
+    return np.where(union > 0, inter / np.maximum(union, 1e-6), 0.0)
+
+def keypoint_similarity(a, b, min_confidence=0.2):
+    """
+    Similarity in [0, 1] between every pose in `a` (N, 17, 3) and every pose in `b` (M, 17, 3):
+    mean keypoint distance over joints visible in both, relative to the size of the `a` pose.
+    """
+    a = np.asarray(a, dtype=np.float32)[:, None]
+    b = np.asarray(b, dtype=np.float32)[None, :]
+    visible = (a[..., 2] >= min_confidence) & (b[..., 2] >= min_confidence)
+    distance = np.linalg.norm(a[..., :2] - b[..., :2], axis=-1)
+    extent = np.ptp(a[..., :2], axis=2).max(axis=-1)  # (N, 1): longer side of each pose's bounds
+    mean_distance = (distance * visible).sum(-1) / np.maximum(visible.sum(-1), 1)
+    similarity = np.exp(-mean_distance / np.maximum(extent, 1.0))
+    return np.where(visible.any(-1), similarity, 0.0)
+
+class Track:
+    """One person followed across frames, with whatever per-person state the caller attaches."""
+    def __init__(self, track_id, keypoints, box, state):
+        self.id = track_id
+        self.keypoints = keypoints
+        self.box = box
+        self.state = state
+        self.missing = 0
+        self.hits = 1
+
+class PoseTracker:
+    """
+    Keeps identities across frames for multi-person detections.
+
+    Each frame, existing tracks are matched to detections greedily by a blend of box IoU
+    and keypoint similarity, best pair first. Unmatched detections start new tracks (their
+    state comes from `new_state(track_id)`, e.g. a fresh rep counter) and tracks unseen for
+    more than `max_missing` frames are retired (kept for reporting if they lasted at least
+    `min_hits` frames, so brief false detections are dropped). Only the latest `max_retired`
+    retired tracks are kept; older ones are handed to `on_drop(track)` so the caller can fold
+    their state into a total. Matching is a small (tracks x detections) numpy computation,
+    negligible next to the single pose inference.
+    """
+    def __init__(self, new_state, max_missing=15, min_hits=5, min_similarity=0.3, iou_weight=0.5,
+                 max_retired=50, on_drop=None):
+        self.new_state = new_state
+        self.max_retired = max_retired
+        self.on_drop = on_drop
+        self.max_missing = max_missing
+        self.min_hits = min_hits
+        self.min_similarity = min_similarity
+        self.iou_weight = iou_weight
+        self.reset()
+
+    def reset(self):
+        self.tracks = {}
+        # Tracks that left the frame, kept so their counts can still be reported
+        self.retired = collections.deque()
+        self._ids = itertools.count(1)
+
+    def update(self, keypoints, boxes):
+        """Assigns this frame's detections to tracks. Returns the tracks seen in this frame."""
+        tracks = list(self.tracks.values())
+        matched_tracks, matched_detections, seen = set(), set(), []
+        if tracks and len(boxes):
+            similarity = (self.iou_weight * iou_matrix([t.box for t in tracks], boxes)
+                          + (1 - self.iou_weight) * keypoint_similarity([t.keypoints for t in tracks], keypoints))
+            for flat in np.argsort(similarity, axis=None)[::-1]:
+                t, d = np.unravel_index(flat, similarity.shape)
+                if similarity[t, d] < self.min_similarity:
+                    break
+                if t in matched_tracks or d in matched_detections:
+                    continue
+                matched_tracks.add(t)
+                matched_detections.add(d)
+                track = tracks[t]
+                track.keypoints, track.box = keypoints[d], boxes[d]
+                track.missing = 0
+                track.hits += 1
+                seen.append(track)
+
+        for t, track in enumerate(tracks):
+            if t not in matched_tracks:
+                track.missing += 1
+                if track.missing > self.max_missing:
+                    del self.tracks[track.id]
+                    if track.hits >= self.min_hits:
+                        self._retire(track)
+
+        for d in range(len(boxes)):
+            if d not in matched_detections:
+                track_id = next(self._ids)
+                track = self.tracks[track_id] = Track(track_id, keypoints[d], boxes[d], self.new_state(track_id))
+                seen.append(track)
+        return sorted(seen, key=lambda track: track.id)
+
+    def _retire(self, track):
+        self.retired.append(track)
+        while len(self.retired) > self.max_retired:
+            dropped = self.retired.popleft()
+            if self.on_drop is not None:
+                self.on_drop(dropped)
+
+    def all_tracks(self):
+        """Active and retired tracks, in order of first appearance."""
+        return sorted(list(self.tracks.values()) + self.retired, key=lambda track: track.id)
@@ -0,0 +1,246 @@
+# persistence.py
+"""
+Write-behind persistence for reports and progress files.
+
+Request threads hand records to a bounded queue and return immediately; one background
+thread drains the queue in batches. Each batch reads every target file once, applies
+all of its records, and writes it back with a single fsync (plus one directory fsync),
+so a burst of saves costs one round of disk syncs instead of one per save.
+"""
+import atexit
+import json
+import logging
+import os
+import queue
+import threading
+import time
+
+from models.streaming_stats import P2Quantile
+
+MAX_QUEUE = int(os.environ.get("FITPAL_PERSIST_QUEUE", 1000))
+BATCH_SIZE = 256
+BATCH_WINDOW = 0.05    # Seconds to wait for more records after the first one of a batch
+ENQUEUE_TIMEOUT = 1.0  # Seconds a caller waits on a full queue before writing synchronously
+CLOSE_TIMEOUT = 10.0
+
+def _fsync_dir(path):
+    try:
+        fd = os.open(path, os.O_RDONLY)
+    except OSError:
+        return  # Not supported on this platform (e.g. Windows).
+    try:
+        os.fsync(fd)
+    finally:
+        os.close(fd)
+
+def _read_json(filename, default):
+    try:
+        with open(filename, 'r') as f:
+            return json.load(f)
+    except (FileNotFoundError, json.JSONDecodeError):
+        return default
+
+def _write_json(filename, data, **kwargs):
+    tmp = filename + ".tmp"
+    with open(tmp, 'w') as f:
+        json.dump(data, f, **kwargs)
+        f.flush()
+        os.fsync(f.fileno())
+    os.replace(tmp, filename)
+
+def _apply_reports(filename, records):
+    data = _read_json(filename, [])
+    data.extend(record["report"] for record in records)
+    _write_json(filename, data, indent=2)
+
+def _apply_progress(filename, records):
+    # {user: {session: progress}}. Older files held a single user's progress at the top level.
+    data = _read_json(filename, {})
+    if "user" in data and not isinstance(data["user"], dict):
+        data = {str(data["user"]): {"legacy": data}}
+    for record in records:
+        data.setdefault(record["user"], {})[record["session"]] = record["data"]
+    _write_json(filename, data, indent=2)
+
+WRITERS = {"report": _apply_reports, "progress": _apply_progress}
+
+class PersistenceQueue:
+    """
+    Bounded write-behind queue with one background writer thread.
+
+    Records are keyed by user and session: a report is appended to its file, and a
+    progress record replaces that user's entry for that session (only the newest one per
+    key in a batch is written). If the queue is full for ENQUEUE_TIMEOUT seconds the caller
+    writes its record itself, so nothing is dropped under overload. close() (run at exit)
+    drains the queue before returning.
+    """
+    _instance = None
+    _lock = threading.Lock()
+
+    def __init__(self, maxsize=MAX_QUEUE, batch_size=BATCH_SIZE, batch_window=BATCH_WINDOW):
+        self.queue = queue.Queue(maxsize=maxsize)
+        self.batch_size = batch_size
+        self.batch_window = batch_window
+        self.write_lock = threading.Lock()  # Serialises the worker with synchronous fallback writes
+        self.after_flush = []               # Callbacks run after each batch is on disk
+        self.stats_lock = threading.Lock()
+        self.enqueued = 0
+        self.written = 0
+        self.batches = 0
+        self.overflows = 0
+        self.failures = 0
+        self.max_depth = 0
+        self.last_flush_ms = None
+        self.max_flush_ms = 0.0
+        self.flush_p95 = P2Quantile(0.95)
+        self._closed = False
+        self._submitting = 0                # Submits between their closed check and their put
+        self._closing = threading.Condition()
+        self._thread = None
+
+    @classmethod
+    def get_instance(cls):
+        with cls._lock:
+            if cls._instance is None:
+                cls._instance = cls()
+            return cls._instance
+
+    def _start(self):
+        with self._lock:
+            if self._thread is None:
+                self._thread = threading.Thread(target=self._run, name="persistence-writer", daemon=True)
+                self._thread.start()
+                atexit.register(self.close)
+
+    def submit(self, kind, filename, user="anonymous", session="default", **fields):
+        """Queues one record for `filename`. Returns False if it had to be written synchronously."""
+        record = dict(fields, kind=kind, filename=filename, user=str(user), session=str(session))
+        with self._closing:
+            closed = self._closed
+            if not closed:
+                self._submitting += 1
+        if closed:
+            self._write([record])
+            return False
+        try:
+            self._start()
+            self.queue.put(record, timeout=ENQUEUE_TIMEOUT)
+        except queue.Full:
+            with self.stats_lock:
+                self.overflows += 1
+            self._write([record])
+            return False
+        finally:
+            # close() waits for this, so its stop marker is queued behind every accepted record.
+            with self._closing:
+                self._submitting -= 1
+                self._closing.notify_all()
+        with self.stats_lock:
+            self.enqueued += 1
+            self.max_depth = max(self.max_depth, self.queue.qsize())
+        return True
+
+    def _next_batch(self):
+        batch = [self.queue.get()]
+        deadline = time.monotonic() + self.batch_window
+        while len(batch) < self.batch_size:
+            remaining = deadline - time.monotonic()
+            try:
+                batch.append(self.queue.get(timeout=max(remaining, 0)) if remaining > 0 else self.queue.get_nowait())
+            except queue.Empty:
+                break
+        return batch
+
+    def _run(self):
+        while True:
+            batch = self._next_batch()
+            stop = any(record is None for record in batch)
+            records = [record for record in batch if record is not None]
+            if records:
+                self._write(records)
+            for _ in batch:
+                self.queue.task_done()
+            if stop:
+                return
+
+    def _write(self, records):
+        # Group by (kind, file); progress keeps only the newest record per (user, session).
+        groups = {}
+        for record in records:
+            group = groups.setdefault((record["kind"], record["filename"]), {})
+            key = (record["user"], record["session"]) if record["kind"] == "progress" else len(group)
+            group[key] = record
+        start = time.perf_counter()
+        with self.write_lock:
+            directories = set()
+            for (kind, filename), group in groups.items():
+                try:
+                    WRITERS[kind](filename, list(group.values()))
+                    directories.add(os.path.dirname(os.path.abspath(filename)))
+                except Exception:
+                    with self.stats_lock:
+                        self.failures += len(group)
+                    logging.exception("Failed to persist %d %s record(s) to %s", len(group), kind, filename)
+            for directory in directories:
+                _fsync_dir(directory)
+            for callback in self.after_flush:
+                try:
+                    callback()
+                except Exception:
+                    logging.exception("Persistence after-flush callback failed")
+        elapsed_ms = (time.perf_counter() - start) * 1000
+        with self.stats_lock:
+            self.written += len(records)
+            self.batches += 1
+            self.last_flush_ms = elapsed_ms
+            self.max_flush_ms = max(self.max_flush_ms, elapsed_ms)
+            self.flush_p95.update(elapsed_ms)
+
+    def flush(self):
+        """Blocks until every record queued so far is on disk."""
+        if self._thread is not None:
+            self.queue.join()
+
+    def close(self, timeout=CLOSE_TIMEOUT):
+        """Drains the queue and stops the writer. Later submits are written synchronously."""
+        with self._closing:
+            if self._closed:
+                return
+            self._closed = True
+            # Submits already past their closed check finish queueing first.
+            self._closing.wait_for(lambda: self._submitting == 0, timeout)
+        with self._lock:
+            thread = self._thread
+        if thread is not None:
+            self.queue.put(None)
+            thread.join(timeout)
+            if thread.is_alive():
+                logging.error("Persistence writer did not drain within %.1fs; %d record(s) pending",
+                              timeout, self.queue.qsize())
+                return
+        # Records still queued if a submit outlasted the wait above.
+        leftovers = []
+        while True:
+            try:
+                leftovers.append(self.queue.get_nowait())
+            except queue.Empty:
+                break
+        if leftovers:
+            self._write(leftovers)
+
+    def stats(self):
+        with self.stats_lock:
+            return {
+                "queue_depth": self.queue.qsize(),
+                "max_queue_depth": self.max_depth,
+                "queue_capacity": self.queue.maxsize,
+                "enqueued": self.enqueued,
+                "written": self.written,
+                "batches": self.batches,
+                "overflows": self.overflows,
+                "failures": self.failures,
+                "last_flush_ms": round(self.last_flush_ms, 2) if self.last_flush_ms is not None else None,
+                "p95_flush_ms": round(self.flush_p95.value, 2) if self.flush_p95.count else None,
+                "max_flush_ms": round(self.max_flush_ms, 2),
+                "closed": self._closed,
+            }
@@ -0,0 +1,109 @@
+"""
+Import-time profile of the backend: how long `import app` takes, how much memory it
+costs and which heavy libraries it pulls in, followed by the cost of the first use of
+each exercise (which is where the model stacks are loaded now).
+
+    python profile_startup.py                   # current tree
+    python profile_startup.py --baseline HEAD~1 # also profile another commit and compare
+
+Warm-up is disabled while profiling so only the main-thread import cost is measured.
+"""
+import argparse
+import json
+import os
+import re
+import shutil
+import subprocess
+import sys
+import tempfile
+
+HEAVY = ("tensorflow", "tensorflow_hub", "mediapipe", "cv2")
+ROUTES = ("squats_routes", "pushups_routes", "bicep_curls_routes")
+
+# Runs inside a fresh interpreter in the backend directory being profiled.
+PROBE = r"""
+import json, resource, sys, time
+start = time.perf_counter()
+import app
+import_sec = time.perf_counter() - start
+result = {
+    "import_sec": import_sec,
+    "maxrss_mb": resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024,
+    "heavy_loaded": sorted(m for m in %(heavy)r if m in sys.modules),
+    "first_use_sec": {},
+}
+for name in %(routes)r:
+    module = sys.modules.get(name)
+    if module is None or not hasattr(module, "exercise"):
+        continue  # Older trees build everything at import time.
+    start = time.perf_counter()
+    try:
+        module.exercise()
+    except ImportError as e:
+        result["first_use_sec"][name] = "failed: %%s" %% e
+        continue
+    result["first_use_sec"][name] = time.perf_counter() - start
+result["maxrss_after_first_use_mb"] = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+print("PROFILE " + json.dumps(result))
+"""
+
+def profile(backend_dir, top):
+    env = dict(os.environ, FITPAL_WARMUP="0")
+    code = PROBE % {"heavy": HEAVY, "routes": ROUTES}
+    proc = subprocess.run([sys.executable, "-X", "importtime", "-c", code], cwd=backend_dir,
+                          env=env, capture_output=True, text=True)
+    line = next((l for l in proc.stdout.splitlines() if l.startswith("PROFILE ")), None)
+    if line is None:
+        sys.exit(f"Profiling {backend_dir} failed:\n{proc.stderr[-2000:]}")
+    result = json.loads(line[len("PROFILE "):])
+
+    # -X importtime lines: "import time: self [us] | cumulative | imported package"
+    modules = []
+    for entry in proc.stderr.splitlines():
+        match = re.match(r"import time:\s+(\d+) \|\s+(\d+) \|(\s*)(\S+)", entry)
+        if match and len(match.group(3)) == 1:  # Top-level imports only
+            modules.append((int(match.group(2)) / 1e6, match.group(4)))
+    result["top_imports"] = sorted(modules, reverse=True)[:top]
+    return result
+
+def print_profile(title, result):
+    print(f"\n== {title} ==")
+    print(f"import app:        {result['import_sec']:.2f}s, max RSS {result['maxrss_mb']:.0f} MB")
+    print(f"heavy libs loaded: {', '.join(result['heavy_loaded']) or 'none'}")
+    for name, seconds in result["first_use_sec"].items():
+        timing = f"{seconds:.2f}s" if isinstance(seconds, float) else seconds
+        print(f"first use {name + ':':<20} {timing}")
+    if result["first_use_sec"]:
+        print(f"max RSS after first use of every exercise: {result['maxrss_after_first_use_mb']:.0f} MB")
+    print("slowest top-level imports:")
+    for seconds, module in result["top_imports"]:
+        print(f"  {seconds:7.3f}s  {module}")
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--baseline", help="git ref to profile for comparison (e.g. HEAD~1)")
+    parser.add_argument("--top", type=int, default=10, help="number of slowest imports to list")
+    args = parser.parse_args()
+
+    backend_dir = os.path.dirname(os.path.abspath(__file__))
+    current = profile(backend_dir, args.top)
+
+    if args.baseline:
+        repo_root = subprocess.check_output(["git", "rev-parse", "--show-toplevel"], cwd=backend_dir, text=True).strip()
+        worktree = tempfile.mkdtemp(prefix="fitpal-baseline-")
+        subprocess.run(["git", "worktree", "add", "--detach", worktree, args.baseline], cwd=repo_root,
+                       check=True, capture_output=True)
+        try:
+            baseline = profile(os.path.join(worktree, os.path.relpath(backend_dir, repo_root)), args.top)
+        finally:
+            subprocess.run(["git", "worktree", "remove", "--force", worktree], cwd=repo_root, capture_output=True)
+            shutil.rmtree(worktree, ignore_errors=True)
+        print_profile(f"before ({args.baseline})", baseline)
+        print_profile("after (working tree)", current)
+        print(f"\nimport app: {baseline['import_sec']:.2f}s -> {current['import_sec']:.2f}s, "
+              f"max RSS {baseline['maxrss_mb']:.0f} MB -> {current['maxrss_mb']:.0f} MB")
+    else:
+        print_profile("working tree", current)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,182 @@
+from flask import Blueprint, jsonify, request
+import logging
+import os
+import threading
+import time
+import uuid
+from models.tracing import span
+from utils import save_report, dry_run_requested
+
+try:
+    import resource
+except ImportError:  # Windows
+    resource = None
+
+logging.basicConfig(level=logging.INFO, format='%(asctime)s %(levelname)s: %(message)s')
+
+# Push mode: the client captures the video itself and posts JPEG frames or MoveNet keypoints,
+# so many sessions can run on one node without a camera each. load_test.py drives these routes.
+push_bp = Blueprint('push', __name__)
+
+EXERCISES = ("squats", "pushups", "bicep_curls")
+MAX_PUSH_SESSIONS = int(os.environ.get("FITPAL_MAX_PUSH_SESSIONS", 64))
+IDLE_TIMEOUT = 300  # Seconds without a push before a session is dropped
+sessions = {}       # session id -> PushSession
+sessions_lock = threading.Lock()
+
+class PushSession:
+    """One client's counter plus its frame buffers. Pushes to one session are serialised."""
+    def __init__(self, exercise, user):
+        from models.keypoint_cache import new_counter
+        self.exercise = exercise
+        self.user = user
+        self.counter = new_counter(exercise)
+        self.lock = threading.Lock()
+        self.started_at = time.time()
+        self.last_push = time.monotonic()
+        self.frames = 0
+        self.pool = None
+        self.preprocessor = None
+
+    def push_keypoints(self, keypoints, timestamp=None):
+        with self.lock:
+            self.last_push = time.monotonic()
+            self.frames += 1
+            with span("count"):
+                _, feedback = self.counter.process_keypoints(keypoints, timestamp=timestamp)
+            return feedback
+
+    def push_frame(self, jpeg, timestamp=None):
+        import cv2
+        import numpy as np
+        from models.pose_estimation import detect_keypoints
+        from models.preprocess import prepare_frame
+        frame = cv2.imdecode(np.frombuffer(jpeg, dtype=np.uint8), cv2.IMREAD_COLOR)
+        if frame is None:
+            raise ValueError("Body is not a decodable image")
+        with self.lock:
+            if self.pool is None:
+                from models.frame_pool import FramePool
+                from models.preprocess import InferencePreprocessor
+                self.pool = FramePool()
+                self.preprocessor = InferencePreprocessor(pool=self.pool)
+            with span("preprocess"):
+                prepared = prepare_frame(frame, self.preprocessor, self.pool)
+            keypoints = detect_keypoints(prepared)
+        return self.push_keypoints(keypoints, timestamp)
+
+    def stats(self):
+        return {"exercise": self.exercise, "user": self.user, "reps": self.counter.count, "frames": self.frames}
+
+def process_usage():
+    """CPU seconds and resident memory of this server process."""
+    if resource is not None:
+        usage = resource.getrusage(resource.RUSAGE_SELF)
+        cpu_sec, rss_mb = usage.ru_utime + usage.ru_stime, usage.ru_maxrss / 1024  # Peak RSS, if /proc is unavailable
+    else:
+        times = os.times()
+        cpu_sec, rss_mb = times.user + times.system, None
+    try:
+        with open("/proc/self/status") as f:
+            for line in f:
+                if line.startswith("VmRSS:"):
+                    rss_mb = int(line.split()[1]) / 1024
+                    break
+    except OSError:
+        pass
+    return {"cpu_sec": round(cpu_sec, 3), "rss_mb": round(rss_mb, 1) if rss_mb is not None else None,
+            "threads": threading.active_count()}
+
+def _drop_idle():
+    now = time.monotonic()
+    with sessions_lock:
+        for session_id in [s for s, push in sessions.items() if now - push.last_push > IDLE_TIMEOUT]:
+            logging.info("Dropping idle push session %s", session_id)
+            del sessions[session_id]
+
+def _session(session_id):
+    with sessions_lock:
+        return sessions.get(session_id)
+
+def _reply(push, feedback, start):
+    return jsonify({"reps": push.counter.count, "feedback": feedback,
+                    "server_ms": round((time.perf_counter() - start) * 1000, 2)})
+
+@push_bp.route('/start-push', methods=['GET', 'POST'])
+def start_push():
+    exercise = request.args.get('exercise', 'squats')
+    if exercise not in EXERCISES:
+        return jsonify({"message": f"Unknown exercise: {exercise}. Use one of {list(EXERCISES)}."}), 400
+    _drop_idle()
+    push = PushSession(exercise, request.args.get("user", "anonymous"))
+    with sessions_lock:
+        if len(sessions) >= MAX_PUSH_SESSIONS:
+            return jsonify({"message": f"Too many push sessions (limit {MAX_PUSH_SESSIONS})."}), 503
+        session_id = uuid.uuid4().hex
+        sessions[session_id] = push
+    return jsonify({"message": f"✅ Push {exercise} session started.", "session": session_id})
+
+@push_bp.route('/push/<session_id>/keypoints', methods=['POST'])
+def push_keypoints(session_id):
+    start = time.perf_counter()
+    push = _session(session_id)
+    if push is None:
+        return jsonify({"message": "Unknown push session."}), 404
+    import numpy as np
+    body = request.get_json(silent=True)
+    keypoints = None
+    if isinstance(body, dict):
+        try:
+            keypoints = np.asarray(body.get("keypoints"), dtype=np.float32)
+            timestamp = body.get("timestamp")
+            timestamp = None if timestamp is None else float(timestamp)
+        except (TypeError, ValueError):
+            keypoints = None
+    if keypoints is None or keypoints.shape != (17, 3):
+        return jsonify({"message": "Expected JSON {\"keypoints\": [[x, y, score] × 17], \"timestamp\": seconds}."}), 400
+    feedback = push.push_keypoints(keypoints, timestamp)
+    return _reply(push, feedback, start)
+
+@push_bp.route('/push/<session_id>/frame', methods=['POST'])
+def push_frame(session_id):
+    start = time.perf_counter()
+    push = _session(session_id)
+    if push is None:
+        return jsonify({"message": "Unknown push session."}), 404
+    timestamp = request.args.get("timestamp", type=float)
+    try:
+        feedback = push.push_frame(request.get_data(), timestamp)
+    except ValueError as e:
+        return jsonify({"message": str(e)}), 400
+    return _reply(push, feedback, start)
+
+@push_bp.route('/end-push/<session_id>', methods=['GET', 'POST'])
+def end_push(session_id):
+    push = _session(session_id)
+    if push is None:
+        return jsonify({"message": "Unknown push session."}), 404
+    return jsonify({"message": "Push session ended.", **push.stats()})
+
+@push_bp.route('/generate-push-report/<session_id>', methods=['GET'])
+def generate_push_report(session_id):
+    with sessions_lock:
+        push = sessions.pop(session_id, None)
+    if push is None:
+        return jsonify({"message": "Unknown push session."}), 404
+    duration = round(time.time() - push.started_at, 2)
+    reps = push.counter.count
+    report = save_report(push.exercise, reps, duration, mode="push",
+                         user=request.args.get("user", push.user), session=session_id,
+                         dry_run=dry_run_requested(request))
+    return jsonify({
+        "message": "📄 Push session report generated!",
+        "reps": reps,
+        "duration": duration,
+        "calories": report["calories"]
+    })
+
+@push_bp.route('/push/stats', methods=['GET'])
+def push_stats():
+    with sessions_lock:
+        active = len(sessions)
+    return jsonify({"sessions": active, "max_sessions": MAX_PUSH_SESSIONS, **process_usage()})
@@ -1,69 +1,142 @@
-from flask import Blueprint, Response, jsonify
-import cv2
-import mediapipe as mp
+from flask import Blueprint, Response, jsonify, request
 import logging
+import threading
 import time
-from models.pushups import Config, PushupCounter, process_pushup_frame
+from models.tracing import activate, get_tracer, span, trace_requested, enable_tracing, disable_tracing
 from resource_manager import ResourceManager
-from utils import save_report  # ✅ NEW import
+from session_store import SessionManager
+from utils import save_report, dry_run_requested  # ✅ NEW import
 
 logging.basicConfig(level=logging.INFO, format='%(asctime)s %(levelname)s: %(message)s')
 pushups_bp = Blueprint('pushups', __name__)
 
 resource_manager = ResourceManager.get_instance()
-pose = resource_manager.get_pose()
-config = Config()
-pushup_counter = PushupCounter(config)
-streaming_active_pushups = True
+sessions = SessionManager.get_instance()
+STREAM = "pushups"
+# models.pushups pulls in cv2, MediaPipe and TensorFlow, so it is imported by exercise() on first use.
+_exercise = None
+_exercise_lock = threading.Lock()
+config = None
+pushup_counter = None
 session_start_time = None
 
+def exercise():
+    """Imports the push-up model stack and builds the counter the first time it is needed."""
+    global _exercise, config, pushup_counter
+    with _exercise_lock:
+        if _exercise is None:
+            from models import pushups
+            config = pushups.Config()
+            pushup_counter = pushups.PushupCounter(config)
+            _exercise = pushups
+    return _exercise
+
 @pushups_bp.route('/start-pushups', methods=['GET'])
 def start_pushups():
-    global streaming_active_pushups, pushup_counter, session_start_time
-    streaming_active_pushups = True
-    session_start_time = time.time()
+    global pushup_counter, session_start_time
+    pushups = exercise()
+    resource_manager.start_stream(STREAM)
+    if trace_requested(request):
+        enable_tracing(STREAM)
+    else:
+        disable_tracing(STREAM)
+    session_id, saved = sessions.begin(STREAM, request, user=request.args.get("user", "anonymous"))
     cam = resource_manager.init_camera(source=config.VIDEO_SOURCE)
     if not cam.isOpened():
         return jsonify({"message": "Error: Unable to access camera."}), 500
-    pushup_counter = PushupCounter(config)
-    return jsonify({"message": "✅ Pushup trainer started successfully!"})
+    pushup_counter = pushups.PushupCounter(config)
+    if saved:
+        pushup_counter.restore(saved["counter"])
+        session_start_time = saved["session_start_time"]
+    else:
+        session_start_time = time.time()
+    return sessions.attach(jsonify({"message": "✅ Pushup trainer started successfully!",
+                                    "session": session_id, "session_token": sessions.token(STREAM),
+                                    "reps": pushup_counter.count}), STREAM)
 
 @pushups_bp.route('/video_feed/pushups', methods=['GET'])
 def video_feed_pushups():
+    if trace_requested(request):
+        enable_tracing(STREAM)
     if not resource_manager.init_camera().isOpened():
         return jsonify({"message": "Camera not started. Start workout first."}), 403
-    return Response(generate_frames_pushups(), mimetype="multipart/x-mixed-replace; boundary=frame")
+    return sessions.attach(Response(generate_frames_pushups(), mimetype="multipart/x-mixed-replace; boundary=frame"), STREAM)
 
-def generate_frames_pushups():
-    global streaming_active_pushups
-    cam = resource_manager.init_camera()
-    while streaming_active_pushups:
-        ret, frame = cam.read()
+def snapshot():
+    return {"counter": pushup_counter.snapshot(), "session_start_time": session_start_time}
+
+def read_jpeg_frame(token=None, pool=None, preprocessor=None, gate=None, recorder=None, cv2=None, model=None):
+    """
+    Reads, annotates and encodes one camera frame. Returns None once the stream should stop.
+    Pass the same FramePool, InferencePreprocessor, PresenceGate and Recorder on every call (one of each per stream),
+    and bind cv2 and the exercise module once per stream so a frame takes neither the import nor the exercise lock.
+    """
+    if cv2 is None:
+        import cv2
+    pushups = model or exercise()
+    token = token or resource_manager.stream_token(STREAM)
+    if token.cancelled:
+        return None
+    with activate(get_tracer(STREAM)), span("frame"):
+        with span("camera.read"):
+            ret, frame = pool.read('camera', resource_manager.read_frame) if pool is not None else resource_manager.read_frame()
         if not ret:
-            break
-        annotated_frame = process_pushup_frame(frame, pushup_counter, pose, config)
-        ret2, buffer = cv2.imencode('.jpg', annotated_frame)
-        if not ret2:
-            break
-        yield (b'--frame\r\n'
-               b'Content-Type: image/jpeg\r\n\r\n' + buffer.tobytes() + b'\r\n')
+            return None
+        with span("process"):
+            annotated_frame = pushups.process_pushup_frame(frame, pushup_counter, resource_manager.get_pose(), config, pool, preprocessor, gate)
+        if recorder is not None:
+            with span("record"):
+                recorder.offer(annotated_frame, pushup_counter.count, pushup_counter.last_rep_time)
+        with span("jpeg.encode"):
+            ret2, buffer = cv2.imencode('.jpg', annotated_frame)
+        sessions.checkpoint(STREAM, snapshot)
+    if not ret2:
+        return None
+    return buffer.tobytes()
+
+def session_stats():
+    exercise()
+    return {"reps": pushup_counter.count, "active": not resource_manager.stream_token(STREAM).cancelled}
+
+def generate_frames_pushups():
+    import cv2
+    from models.frame_pool import FramePool
+    from models.preprocess import InferencePreprocessor
+    from models.presence import new_presence_gate
+    from models.recorder import new_recorder
+    token = resource_manager.stream_token(STREAM)
+    pool = FramePool()
+    preprocessor = InferencePreprocessor(pool=pool)
+    gate = new_presence_gate()
+    recorder = new_recorder(STREAM)
+    model = exercise()
+    with token:
+        while True:
+            jpeg = read_jpeg_frame(token, pool, preprocessor, gate, recorder, cv2, model)
+            if jpeg is None:
+                break
+            yield (b'--frame\r\n'
+                   b'Content-Type: image/jpeg\r\n\r\n' + jpeg + b'\r\n')
 
 @pushups_bp.route('/end-pushups', methods=['GET'])
 def end_pushups():
-    global streaming_active_pushups
-    streaming_active_pushups = False
-    resource_manager.release_camera()
-    return jsonify({"message": "Pushup workout ended.", "pushups": pushup_counter.count})
+    resource_manager.end_stream(STREAM)
+    if _exercise is not None:  # Nothing to save, nor any reason to load the models, if it never started
+        sessions.checkpoint(STREAM, snapshot, force=True)
+    return jsonify({"message": "Pushup workout ended.", "pushups": pushup_counter.count if _exercise is not None else 0})
 
 @pushups_bp.route('/generate-pushups-report', methods=['GET'])
 def generate_pushups_report():
     global session_start_time
+    exercise()
     end_time = time.time()
     duration = round(end_time - session_start_time, 2) if session_start_time else 0
     reps = pushup_counter.count
 
-    report = save_report("pushups", reps, duration, mode="default")
+    report = save_report("pushups", reps, duration, mode="default", user=request.args.get("user", "anonymous"),
+                         session=sessions.session_id(STREAM), dry_run=dry_run_requested(request))
     pushup_counter.count = 0  # Reset counter manually
+    sessions.finish(STREAM)
 
     return jsonify({
         "message": "📄 Pushup report generated!",
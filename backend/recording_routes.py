@@ -0,0 +1,62 @@
+from flask import Blueprint, jsonify, request, send_file
+
+# The recorders are fed by each stream's frame loop (see models/recorder.py). That module
+# pulls in cv2, so it is imported on first use like the exercise models.
+recording_bp = Blueprint('recording', __name__)
+
+STREAMS = ("squats", "pushups", "bicep_curls", "group")
+
+def recorder_or_error(stream):
+    from models.recorder import RECORDER_ENABLED, get_recorder
+    if stream not in STREAMS:
+        return None, (jsonify({"message": f"Unknown stream: {stream}. Use one of {list(STREAMS)}."}), 404)
+    recorder = get_recorder(stream)
+    if recorder is None:
+        message = "Nothing recorded yet." if RECORDER_ENABLED else "Recording is disabled (FITPAL_RECORDER=0)."
+        return None, (jsonify({"message": message}), 404)
+    return recorder, None
+
+@recording_bp.route('/recording/<stream>', methods=['GET'])
+def recording_stats(stream):
+    recorder, error = recorder_or_error(stream)
+    if error:
+        return error
+    return jsonify(recorder.stats())
+
+@recording_bp.route('/recording/<stream>/persist', methods=['GET', 'POST'])
+def persist_recording(stream):
+    recorder, error = recorder_or_error(stream)
+    if error:
+        return error
+    return jsonify({"message": f"Recording {stream} to disk.", "path": recorder.persist()})
+
+@recording_bp.route('/recording/<stream>/stop', methods=['GET', 'POST'])
+def stop_recording(stream):
+    recorder, error = recorder_or_error(stream)
+    if error:
+        return error
+    path = recorder.stop_persist()
+    if path is None:
+        return jsonify({"message": f"{stream} is not being recorded to disk."}), 404
+    return jsonify({"message": f"Stopped recording {stream}.", "path": path})
+
+@recording_bp.route('/recording/<stream>/clip', methods=['GET'])
+def download_clip(stream):
+    # The last ?seconds= of the in-memory history (all of it by default).
+    recorder, error = recorder_or_error(stream)
+    if error:
+        return error
+    path = recorder.save_recent(request.args.get("seconds", type=float))
+    if path is None:
+        return jsonify({"message": "Nothing recorded yet."}), 404
+    return send_file(path, mimetype="video/mp4", as_attachment=True)
+
+@recording_bp.route('/recording/<stream>/highlights/<int:rep>', methods=['GET'])
+def download_highlight(stream, rep):
+    recorder, error = recorder_or_error(stream)
+    if error:
+        return error
+    highlight = recorder.highlight(rep)
+    if highlight is None:
+        return jsonify({"message": f"No highlight for rep {rep}."}), 404
+    return send_file(recorder.save_highlight(highlight), mimetype="video/mp4", as_attachment=True)
@@ -0,0 +1,300 @@
+# report_rollups.py
+
+import copy
+import json
+import os
+import threading
+from datetime import datetime, timedelta
+
+EMPTY_BUCKET = {"sessions": 0, "reps": 0, "duration_sec": 0.0, "calories": 0.0}
+LEADERBOARD_METRICS = ("total_reps", "best_reps")
+ANONYMOUS_USER = "anonymous"  # Default user of every route; kept out of the leaderboards
+DAY_RETENTION = 366           # Daily buckets kept (the longest /daily query)
+WEEK_RETENTION = 104          # Weekly buckets kept (the longest /weekly query)
+COMPACT_EVERY = 1000          # Logged reports before the snapshot is rewritten
+
+def _new_bucket():
+    return dict(EMPTY_BUCKET)
+
+def _add_to_bucket(bucket, report):
+    bucket["sessions"] += 1
+    bucket["reps"] += report["reps"]
+    bucket["duration_sec"] = round(bucket["duration_sec"] + report["duration_sec"], 2)
+    bucket["calories"] = round(bucket["calories"] + report["calories"], 2)
+
+def _add_to_period(periods, key, report):
+    # Each period keeps one bucket per exercise plus an "all" bucket.
+    period = periods.setdefault(key, {})
+    _add_to_bucket(period.setdefault(report["workout"], _new_bucket()), report)
+    _add_to_bucket(period.setdefault("all", _new_bucket()), report)
+
+def day_key(date):
+    return date.isoformat()
+
+def week_key(date):
+    year, week, _ = date.isocalendar()
+    return f"{year}-W{week:02d}"
+
+class ReportRollups:
+    """
+    Summary tables maintained incrementally on every save_report.
+
+    Every query is a dictionary lookup (or a walk over a bounded number of days/weeks),
+    so answering it never touches the raw report history. Leaderboards keep only the top
+    `leaderboard_size` users per exercise; because totals and personal bests only ever
+    grow, updating that bounded list on each report keeps it exact.
+
+    On disk the tables are a snapshot plus an append-only log of the reports applied since,
+    so persisting costs O(new reports). Every COMPACT_EVERY logged reports, day and week
+    buckets past the retention window are dropped and the snapshot is rewritten, pointing
+    at a fresh log (a crash between the two steps leaves the old snapshot and log valid).
+    """
+    _instance = None
+    _lock = threading.Lock()
+
+    def __init__(self, filename="report_rollups.json", reports_filename="reports.json", leaderboard_size=100):
+        self.filename = filename
+        self.leaderboard_size = leaderboard_size
+        self.lock = threading.Lock()
+        self.dirty = False
+        self.pending = []   # Reports applied but not yet in the log
+        self.logged = 0     # Reports in the current log
+        self.data = self._load()
+        if self.data is None:
+            self.data = self._empty()
+            self._backfill(reports_filename)
+        else:
+            self.logged = self._replay_log()
+            self._drop_from_leaderboards(ANONYMOUS_USER)
+
+    @classmethod
+    def get_instance(cls):
+        with cls._lock:
+            if cls._instance is None:
+                cls._instance = cls()
+            return cls._instance
+
+    @staticmethod
+    def _empty():
+        return {
+            "users": {},
+            "global": {"totals": {}, "days": {}, "weeks": {}},
+            "leaderboards": {},
+            "log_generation": 0,
+        }
+
+    def _load(self):
+        try:
+            with open(self.filename, 'r') as f:
+                return json.load(f)
+        except (FileNotFoundError, json.JSONDecodeError):
+            return None
+
+    def _backfill(self, reports_filename):
+        # One-off rebuild from the raw history the first time the rollups are created.
+        try:
+            with open(reports_filename, 'r') as f:
+                reports = json.load(f)
+        except (FileNotFoundError, json.JSONDecodeError):
+            return
+        with self.lock:
+            for report in reports:
+                self._apply(report)
+            self._compact()
+
+    def _log_filename(self, generation=None):
+        if generation is None:
+            generation = self.data.get("log_generation", 0)
+        return f"{os.path.splitext(self.filename)[0]}.{generation}.log"
+
+    def _replay_log(self):
+        count = 0
+        try:
+            with open(self._log_filename(), 'r') as f:
+                for line in f:
+                    try:
+                        report = json.loads(line)
+                    except json.JSONDecodeError:
+                        break  # Torn last line from a crash mid-append.
+                    self._apply(report)
+                    count += 1
+        except FileNotFoundError:
+            pass
+        return count
+
+    def _persist(self):
+        if self.pending:
+            with open(self._log_filename(), 'a') as f:
+                f.write("".join(json.dumps(report) + "\n" for report in self.pending))
+                f.flush()
+                os.fsync(f.fileno())
+            self.logged += len(self.pending)
+            self.pending = []
+        if self.logged >= COMPACT_EVERY:
+            self._compact()
+        self.dirty = False
+
+    def _compact(self):
+        self._prune(datetime.utcnow().date())
+        old_log = self._log_filename()
+        self.data["log_generation"] = self.data.get("log_generation", 0) + 1
+        tmp = self.filename + ".tmp"
+        with open(tmp, 'w') as f:
+            json.dump(self.data, f)
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(tmp, self.filename)
+        # The new snapshot already includes everything in the old log.
+        try:
+            os.remove(old_log)
+        except FileNotFoundError:
+            pass
+        self.logged = 0
+        self.pending = []
+
+    def _prune(self, today):
+        oldest_day = day_key(today - timedelta(days=DAY_RETENTION))
+        oldest_week = week_key(today - timedelta(weeks=WEEK_RETENTION))
+        for scope in [self.data["global"], *self.data["users"].values()]:
+            for periods, oldest in ((scope["days"], oldest_day), (scope["weeks"], oldest_week)):
+                for key in [key for key in periods if key < oldest]:
+                    del periods[key]
+
+    def _drop_from_leaderboards(self, user):
+        for metrics in self.data["leaderboards"].values():
+            for metric, board in metrics.items():
+                metrics[metric] = [entry for entry in board if entry[0] != user]
+
+    def add_report(self, report, persist=True):
+        """Applies a report. With persist=False the tables are only written by the next persist()."""
+        with self.lock:
+            self._apply(report)
+            self.pending.append(report)
+            self.dirty = True
+            if persist:
+                self._persist()
+
+    def persist(self):
+        """Writes the tables if any report was added without persisting."""
+        with self.lock:
+            if self.dirty:
+                self._persist()
+
+    def _apply(self, report):
+        user = report.get("user", ANONYMOUS_USER)
+        exercise = report["workout"]
+        date = datetime.fromisoformat(report["timestamp"]).date()
+
+        user_data = self.data["users"].setdefault(user, {
+            "totals": {},
+            "days": {},
+            "weeks": {},
+            "bests": {},
+            "streak": {"current": 0, "longest": 0, "last_day": None},
+        })
+        for scope in (user_data, self.data["global"]):
+            _add_to_bucket(scope["totals"].setdefault(exercise, _new_bucket()), report)
+            _add_to_period(scope["days"], day_key(date), report)
+            _add_to_period(scope["weeks"], week_key(date), report)
+
+        best = user_data["bests"].get(exercise)
+        if best is None or report["reps"] > best["reps"]:
+            user_data["bests"][exercise] = {
+                "reps": report["reps"],
+                "duration_sec": report["duration_sec"],
+                "timestamp": report["timestamp"],
+            }
+
+        self._update_streak(user_data["streak"], date)
+        if user == ANONYMOUS_USER:
+            return  # Every unattributed session lands here, so it would top every board.
+        self._update_leaderboard(exercise, "total_reps", user, user_data["totals"][exercise]["reps"])
+        self._update_leaderboard(exercise, "best_reps", user, user_data["bests"][exercise]["reps"])
+
+    @staticmethod
+    def _update_streak(streak, date):
+        last_day = streak["last_day"]
+        last = datetime.fromisoformat(last_day).date() if last_day else None
+        if last is not None and date <= last:
+            return  # Same day, or an out-of-order report that cannot extend the streak.
+        if last is not None and date - last == timedelta(days=1):
+            streak["current"] += 1
+        else:
+            streak["current"] = 1
+        streak["longest"] = max(streak["longest"], streak["current"])
+        streak["last_day"] = day_key(date)
+
+    def _update_leaderboard(self, exercise, metric, user, value):
+        board = self.data["leaderboards"].setdefault(exercise, {}).setdefault(metric, [])
+        for entry in board:
+            if entry[0] == user:
+                entry[1] = value
+                break
+        else:
+            if len(board) < self.leaderboard_size:
+                board.append([user, value])
+            elif value > board[-1][1]:
+                board[-1] = [user, value]
+            else:
+                return
+        board.sort(key=lambda entry: entry[1], reverse=True)
+
+    # ----- QUERIES -----
+    def user_summary(self, user):
+        with self.lock:
+            user_data = self.data["users"].get(user)
+            if user_data is None:
+                return None
+            today = datetime.utcnow().date()
+            streak = dict(user_data["streak"])
+            # A streak only counts as current if it reached today or yesterday.
+            if streak["last_day"] and today - datetime.fromisoformat(streak["last_day"]).date() > timedelta(days=1):
+                streak["current"] = 0
+            return copy.deepcopy({
+                "user": user,
+                "totals": user_data["totals"],
+                "personal_bests": user_data["bests"],
+                "streak": streak,
+                "today": user_data["days"].get(day_key(today), {}),
+                "this_week": user_data["weeks"].get(week_key(today), {}),
+            })
+
+    def daily_totals(self, user=None, days=7):
+        with self.lock:
+            scope = self._scope(user)
+            if scope is None:
+                return None
+            today = datetime.utcnow().date()
+            keys = [day_key(today - timedelta(days=offset)) for offset in range(days)]
+            return copy.deepcopy([{"day": key, "totals": scope["days"].get(key, {})} for key in keys])
+
+    def weekly_totals(self, user=None, weeks=4):
+        with self.lock:
+            scope = self._scope(user)
+            if scope is None:
+                return None
+            today = datetime.utcnow().date()
+            keys = [week_key(today - timedelta(weeks=offset)) for offset in range(weeks)]
+            return copy.deepcopy([{"week": key, "totals": scope["weeks"].get(key, {})} for key in keys])
+
+    def global_summary(self):
+        with self.lock:
+            today = datetime.utcnow().date()
+            scope = self.data["global"]
+            return copy.deepcopy({
+                "totals": scope["totals"],
+                "users": len(self.data["users"]),
+                "today": scope["days"].get(day_key(today), {}),
+                "this_week": scope["weeks"].get(week_key(today), {}),
+            })
+
+    def leaderboard(self, exercise, metric="total_reps", limit=10):
+        with self.lock:
+            board = self.data["leaderboards"].get(exercise, {}).get(metric, [])
+            return [{"rank": rank, "user": user, metric: value}
+                    for rank, (user, value) in enumerate(board[:limit], start=1)]
+
+    def _scope(self, user):
+        if user is None:
+            return self.data["global"]
+        return self.data["users"].get(user)
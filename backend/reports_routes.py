@@ -0,0 +1,54 @@
+from flask import Blueprint, jsonify, request
+from report_rollups import ReportRollups, LEADERBOARD_METRICS, DAY_RETENTION, WEEK_RETENTION
+
+reports_bp = Blueprint('reports', __name__)
+rollups = ReportRollups.get_instance()
+
+MAX_DAYS = DAY_RETENTION
+MAX_WEEKS = WEEK_RETENTION
+
+def bounded_arg(name, default, maximum):
+    """An integer query argument clamped to 1..maximum."""
+    return max(1, min(request.args.get(name, default, type=int), maximum))
+
+@reports_bp.route('/reports/users/<user>/summary', methods=['GET'])
+def user_summary(user):
+    summary = rollups.user_summary(user)
+    if summary is None:
+        return jsonify({"message": f"No reports found for {user}."}), 404
+    return jsonify(summary)
+
+@reports_bp.route('/reports/users/<user>/daily', methods=['GET'])
+def user_daily(user):
+    days = bounded_arg('days', 7, MAX_DAYS)
+    totals = rollups.daily_totals(user, days=days)
+    if totals is None:
+        return jsonify({"message": f"No reports found for {user}."}), 404
+    return jsonify({"user": user, "days": totals})
+
+@reports_bp.route('/reports/users/<user>/weekly', methods=['GET'])
+def user_weekly(user):
+    weeks = bounded_arg('weeks', 4, MAX_WEEKS)
+    totals = rollups.weekly_totals(user, weeks=weeks)
+    if totals is None:
+        return jsonify({"message": f"No reports found for {user}."}), 404
+    return jsonify({"user": user, "weeks": totals})
+
+@reports_bp.route('/reports/global', methods=['GET'])
+def global_summary():
+    summary = rollups.global_summary()
+    summary["daily"] = rollups.daily_totals(days=bounded_arg('days', 7, MAX_DAYS))
+    return jsonify(summary)
+
+@reports_bp.route('/reports/leaderboard', methods=['GET'])
+def leaderboard():
+    exercise = request.args.get('exercise', 'squats')
+    metric = request.args.get('metric', 'total_reps')
+    if metric not in LEADERBOARD_METRICS:
+        return jsonify({"message": f"Unknown metric: {metric}. Use one of {list(LEADERBOARD_METRICS)}."}), 400
+    limit = bounded_arg('limit', 10, rollups.leaderboard_size)
+    return jsonify({
+        "exercise": exercise,
+        "metric": metric,
+        "leaderboard": rollups.leaderboard(exercise, metric, limit)
+    })
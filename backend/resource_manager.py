@@ -1,8 +1,53 @@
 # resource_manager.py
 
-import cv2
+import logging
+import os
 import threading
-import mediapipe as mp
+import time
+
+CAMERA_IDLE_TIMEOUT = 30     # Seconds without a frame read before the camera is released
+MODEL_IDLE_TIMEOUT = 300     # Seconds without a frame read before the pose model is closed
+# Set FITPAL_PIN_MODELS=1 to keep the pose model loaded however long the node is idle.
+PIN_MODELS = os.environ.get("FITPAL_PIN_MODELS", "0") == "1"
+WATCHDOG_INTERVAL = 5        # Seconds between idle checks
+END_STREAM_TIMEOUT = 2.0     # Seconds to wait for stream generators to exit before releasing the camera
+
+class CancellationToken:
+    """
+    Cooperative stop signal shared by every generator serving one stream.
+
+    Generators enter the token (`with token:`) for as long as they run, so the owner
+    can cancel it and then wait until the last one has actually left its loop.
+    Leaving covers normal exit, cancellation and client disconnects alike: the server
+    closes the response generator on disconnect, which unwinds the `with` block.
+    """
+    def __init__(self, name):
+        self.name = name
+        self._cancelled = threading.Event()
+        self._cond = threading.Condition()
+        self.active = 0
+
+    def cancel(self):
+        self._cancelled.set()
+
+    @property
+    def cancelled(self):
+        return self._cancelled.is_set()
+
+    def __enter__(self):
+        with self._cond:
+            self.active += 1
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        with self._cond:
+            self.active -= 1
+            self._cond.notify_all()
+        return False
+
+    def wait_finished(self, timeout=None):
+        with self._cond:
+            return self._cond.wait_for(lambda: self.active == 0, timeout)
 
 class ResourceManager:
     _instance = None
@@ -11,6 +56,17 @@ class ResourceManager:
     def __init__(self):
         self.camera = None
         self.pose = None
+        # Reads and releases share this lock so the camera is never released mid-read.
+        self.camera_lock = threading.RLock()
+        self.pose_lock = threading.Lock()
+        self.streams = {}
+        self.streams_lock = threading.Lock()
+        self.last_used = time.monotonic()
+        self.camera_idle_timeout = CAMERA_IDLE_TIMEOUT
+        self.model_idle_timeout = None if PIN_MODELS else MODEL_IDLE_TIMEOUT  # None keeps the model loaded
+        self.pose_released = False  # Set when the watchdog closed the model; the next stream re-warms it
+        self._stopping = threading.Event()
+        self._watchdog = None
 
     @classmethod
     def get_instance(cls):
@@ -19,25 +75,122 @@ class ResourceManager:
                 cls._instance = cls()
             return cls._instance
 
+    def touch(self):
+        self.last_used = time.monotonic()
+
     def init_camera(self, source=0):
         # If the camera is not initialized or not opened, create a new one.
-        if self.camera is None or not self.camera.isOpened():
-            self.camera = cv2.VideoCapture(source)
+        import cv2
+        with self.camera_lock:
+            if self.camera is None or not self.camera.isOpened():
+                self.camera = cv2.VideoCapture(source)
+            self.touch()
+        self._start_watchdog()
         return self.camera
 
+    def read_frame(self, out=None):
+        """
+        Reads one frame from the camera, into `out` when given (see FramePool.read).
+        Returns (False, None) if the camera was released.
+        """
+        with self.camera_lock:
+            if self.camera is None:
+                return False, None
+            self.touch()
+            return self.camera.read(out)
+
     def release_camera(self):
-        if self.camera is not None:
-            self.camera.release()
-            self.camera = None
+        with self.camera_lock:
+            if self.camera is not None:
+                self.camera.release()
+                self.camera = None
 
     def get_pose(self):
         # Initialize the MediaPipe Pose instance if it doesn't exist.
-        if self.pose is None:
-            mp_pose = mp.solutions.pose
-            self.pose = mp_pose.Pose(min_detection_confidence=0.7, min_tracking_confidence=0.5)
-        return self.pose
+        with self.pose_lock:
+            if self.pose is None:
+                import mediapipe as mp  # Deferred: importing MediaPipe is slow and memory-hungry.
+                mp_pose = mp.solutions.pose
+                self.pose = mp_pose.Pose(min_detection_confidence=0.7, min_tracking_confidence=0.5)
+            return self.pose
 
     def reset_pose(self):
-        if self.pose is not None:
-            self.pose.close()  # Release underlying resources.
-            self.pose = None
+        with self.pose_lock:
+            if self.pose is not None:
+                self.pose.close()  # Release underlying resources.
+                self.pose = None
+
+    # ----- STREAM LIFECYCLE -----
+    def start_stream(self, name):
+        """Cancels any running stream with this name and returns a fresh token for the new one."""
+        with self.streams_lock:
+            previous = self.streams.get(name)
+            if previous is not None:
+                previous.cancel()
+            token = CancellationToken(name)
+            self.streams[name] = token
+        if self.pose_released:
+            # Rebuild the model the watchdog closed while the camera opens, not on the first frame.
+            self.pose_released = False
+            threading.Thread(target=self.get_pose, name="pose-rewarm", daemon=True).start()
+        return token
+
+    def stream_token(self, name):
+        """Returns the current token for a stream, creating an active one if it was never started."""
+        with self.streams_lock:
+            token = self.streams.get(name)
+            if token is None:
+                token = self.streams[name] = CancellationToken(name)
+            return token
+
+    def end_stream(self, name, timeout=END_STREAM_TIMEOUT):
+        """Cancels a stream, waits for its generators to leave their loops, flushes its recorder and releases the camera."""
+        with self.streams_lock:
+            token = self.streams.get(name)
+        if token is not None:
+            token.cancel()
+            if not token.wait_finished(timeout):
+                logging.warning("Stream %s still has %d generator(s) after %.1fs", name, token.active, timeout)
+        # Finish the session's recording: last highlights cut, persisted file finalized, encoder stopped.
+        from models.recorder import get_recorder
+        recorder = get_recorder(name)
+        if recorder is not None and not recorder.flush(timeout):
+            logging.warning("Recorder for %s did not stop after %.1fs", name, timeout)
+        self.release_camera()
+
+    def active_streams(self):
+        with self.streams_lock:
+            return [name for name, token in self.streams.items() if token.active and not token.cancelled]
+
+    # ----- IDLE WATCHDOG & SHUTDOWN -----
+    def _start_watchdog(self):
+        with self._lock:
+            if self._stopping.is_set() or (self._watchdog is not None and self._watchdog.is_alive()):
+                return
+            self._watchdog = threading.Thread(target=self._watch_idle, name="resource-watchdog", daemon=True)
+            self._watchdog.start()
+
+    def _watch_idle(self):
+        while not self._stopping.wait(WATCHDOG_INTERVAL):
+            if self.active_streams():
+                continue
+            idle = time.monotonic() - self.last_used
+            if self.camera is not None and self.camera_idle_timeout is not None and idle > self.camera_idle_timeout:
+                logging.info("Releasing camera after %.0fs idle.", idle)
+                self.release_camera()
+            if self.pose is not None and self.model_idle_timeout is not None and idle > self.model_idle_timeout:
+                logging.info("Closing pose model after %.0fs idle.", idle)
+                self.reset_pose()
+                self.pose_released = True
+
+    def shutdown(self, timeout=END_STREAM_TIMEOUT):
+        """Stops every stream and frees the camera and model. Safe to call more than once."""
+        self._stopping.set()
+        with self.streams_lock:
+            tokens = list(self.streams.values())
+        for token in tokens:
+            token.cancel()
+        for token in tokens:
+            token.wait_finished(timeout)
+        self.release_camera()
+        self.reset_pose()
@@ -0,0 +1,254 @@
+# session_store.py
+"""
+Shared session state so several backend nodes can sit behind one load balancer.
+
+Each exercise session has an id, metadata (owner node, exercise, start time) and a
+snapshot of its rep counter, kept in a pluggable store:
+
+    FITPAL_SESSION_STORE=memory                  # default: this process only
+    FITPAL_SESSION_STORE=redis://host:6379/0     # shared between nodes (pip install redis)
+    FITPAL_SESSION_STORE=local                   # RedisStore over an in-process stand-in, for testing
+
+Start responses carry a signed affinity token, as a cookie and as `session_token` in the
+JSON, naming the node that holds the session's camera, model and tracker, so the load
+balancer keeps the stream there. If a request lands on another node anyway (failover,
+rebalancing), that node verifies the token, restores the counter from the last snapshot
+and takes the session over without losing reps. A bare session id resumes nothing.
+"""
+import base64
+import hashlib
+import hmac
+import json
+import logging
+import os
+import secrets
+import socket
+import threading
+import time
+import uuid
+
+NODE_ID = os.environ.get("FITPAL_NODE_ID") or f"{socket.gethostname()}-{os.getpid()}"
+SESSION_STORE_URL = os.environ.get("FITPAL_SESSION_STORE", "memory")
+# Every node behind one load balancer must share this secret to accept each other's tokens.
+# Without it, tokens are signed with a random per-process key and only this node accepts them.
+AFFINITY_SECRET_SET = bool(os.environ.get("FITPAL_AFFINITY_SECRET"))
+AFFINITY_SECRET = (os.environ["FITPAL_AFFINITY_SECRET"].encode() if AFFINITY_SECRET_SET
+                   else secrets.token_bytes(32))
+AFFINITY_COOKIE = "fitpal_affinity"
+SESSION_TTL = 6 * 60 * 60      # Seconds a session survives without a snapshot
+SNAPSHOT_INTERVAL = 1.0        # Minimum seconds between snapshots from the frame loop
+KEY_PREFIX = "fitpal:session:"
+
+# ----- STORES -----
+class MemoryStore:
+    """Process-local store. Sessions do not survive a restart or move between nodes."""
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.items = {}
+
+    def get(self, key):
+        with self.lock:
+            item = self.items.get(key)
+            if item is None:
+                return None
+            value, expires = item
+            if expires < time.time():
+                del self.items[key]
+                return None
+            return json.loads(value)
+
+    def set(self, key, value, ttl):
+        with self.lock:
+            self.items[key] = (json.dumps(value), time.time() + ttl)
+
+    def delete(self, key):
+        with self.lock:
+            self.items.pop(key, None)
+
+class LocalRedis:
+    """In-process stand-in for the subset of the redis-py client RedisStore uses."""
+    def __init__(self):
+        self.store = MemoryStore()
+
+    def get(self, name):
+        value = self.store.get(name)
+        return value.encode() if value is not None else None
+
+    def set(self, name, value, ex=None):
+        self.store.set(name, value.decode() if isinstance(value, bytes) else value, ex or SESSION_TTL)
+        return True
+
+    def delete(self, *names):
+        for name in names:
+            self.store.delete(name)
+        return len(names)
+
+class RedisStore:
+    """Store on any Redis-compatible server, shared by every node."""
+    def __init__(self, client):
+        self.client = client
+
+    @classmethod
+    def from_url(cls, url):
+        try:
+            import redis
+        except ImportError as e:
+            raise ImportError("FITPAL_SESSION_STORE points at Redis but the redis package is not installed") from e
+        return cls(redis.Redis.from_url(url))
+
+    def get(self, key):
+        value = self.client.get(key)
+        return json.loads(value) if value is not None else None
+
+    def set(self, key, value, ttl):
+        self.client.set(key, json.dumps(value), ex=int(ttl))
+
+    def delete(self, key):
+        self.client.delete(key)
+
+def create_store(url=SESSION_STORE_URL):
+    if url == "memory":
+        return MemoryStore()
+    if url == "local":
+        return RedisStore(LocalRedis())
+    if url.startswith(("redis://", "rediss://", "unix://")):
+        if not AFFINITY_SECRET_SET:
+            raise RuntimeError("FITPAL_SESSION_STORE is shared between nodes, so FITPAL_AFFINITY_SECRET "
+                               "must be set (to the same value on every node)")
+        return RedisStore.from_url(url)
+    raise ValueError(f"Unknown session store: {url}")
+
+# ----- AFFINITY TOKENS -----
+def _b64(data):
+    return base64.urlsafe_b64encode(data).rstrip(b"=").decode()
+
+def _unb64(text):
+    return base64.urlsafe_b64decode(text + "=" * (-len(text) % 4))
+
+def issue_token(session_id, node_id=NODE_ID, ttl=SESSION_TTL, secret=AFFINITY_SECRET):
+    payload = _b64(json.dumps({"session": session_id, "node": node_id, "exp": int(time.time() + ttl)}).encode())
+    signature = _b64(hmac.new(secret, payload.encode(), hashlib.sha256).digest())
+    return f"{payload}.{signature}"
+
+def verify_token(token, secret=AFFINITY_SECRET):
+    """The token's {"session", "node", "exp"} payload, or None if it is malformed, forged or expired."""
+    try:
+        payload, signature = token.split(".")
+        expected = _b64(hmac.new(secret, payload.encode(), hashlib.sha256).digest())
+        if not hmac.compare_digest(signature, expected):
+            return None
+        claims = json.loads(_unb64(payload))
+    except (AttributeError, ValueError):
+        return None
+    return claims if claims.get("exp", 0) >= time.time() else None
+
+# ----- SESSIONS -----
+class SessionManager:
+    """
+    Tracks this node's current session per stream and mirrors it into the shared store.
+
+    The route modules call begin() when a workout starts, checkpoint() from the frame
+    loop (rate-limited to one write per SNAPSHOT_INTERVAL) and finish() once the report
+    is saved. Snapshots are plain dicts built by each exercise's counter.
+    """
+    _instance = None
+    _lock = threading.Lock()
+
+    def __init__(self, store=None, node_id=NODE_ID, secret=AFFINITY_SECRET):
+        self.store = store if store is not None else create_store()
+        self.node_id = node_id
+        self.secret = secret
+        self.lock = threading.Lock()
+        self.current = {}      # stream -> session id
+        self.metadata = {}     # stream -> session metadata
+        self.last_saved = {}   # stream -> monotonic time of the last snapshot
+
+    @classmethod
+    def get_instance(cls):
+        with cls._lock:
+            if cls._instance is None:
+                cls._instance = cls()
+            return cls._instance
+
+    @staticmethod
+    def _key(session_id):
+        return KEY_PREFIX + session_id
+
+    def requested_session(self, request):
+        """Session id from a valid signed token in ?session_token= or the affinity cookie."""
+        token = request.args.get("session_token") or request.cookies.get(AFFINITY_COOKIE)
+        claims = verify_token(token, self.secret) if token else None
+        return claims["session"] if claims else None
+
+    def begin(self, stream, request, user="anonymous"):
+        """
+        Starts or resumes the session for `stream`. Returns (session id, snapshot), where
+        snapshot is the stored counter state when an existing session is resumed (possibly
+        one another node was running) and None for a new session.
+        """
+        session_id = self.requested_session(request)
+        record = self.store.get(self._key(session_id)) if session_id else None
+        if record is None or record["exercise"] != stream:
+            session_id, record = uuid.uuid4().hex, None
+        elif record["owner"] != self.node_id:
+            logging.info("Taking over session %s from node %s", session_id, record["owner"])
+
+        metadata = {
+            "session": session_id,
+            "exercise": stream,
+            "user": record["user"] if record else user,
+            "owner": self.node_id,
+            "started_at": record["started_at"] if record else time.time(),
+        }
+        snapshot = record["snapshot"] if record else None
+        with self.lock:
+            self.current[stream] = session_id
+            self.metadata[stream] = metadata
+        self._save(stream, snapshot or {})
+        return session_id, snapshot
+
+    def session_id(self, stream):
+        return self.current.get(stream)
+
+    def token(self, stream):
+        """Signed token another node accepts to resume the stream's session, or None."""
+        session_id = self.current.get(stream)
+        return issue_token(session_id, self.node_id, secret=self.secret) if session_id else None
+
+    def _save(self, stream, snapshot):
+        with self.lock:
+            metadata = self.metadata.get(stream)
+            if metadata is None:
+                return
+            self.last_saved[stream] = time.monotonic()
+        record = dict(metadata, snapshot=snapshot, updated_at=time.time())
+        try:
+            self.store.set(self._key(metadata["session"]), record, SESSION_TTL)
+        except Exception:
+            logging.exception("Failed to save session %s", metadata["session"])
+
+    def checkpoint(self, stream, snapshot_fn, force=False):
+        """Saves snapshot_fn() for the stream's session if SNAPSHOT_INTERVAL has passed (or force)."""
+        last = self.last_saved.get(stream)
+        if stream not in self.metadata or (not force and last is not None
+                                           and time.monotonic() - last < SNAPSHOT_INTERVAL):
+            return False
+        self._save(stream, snapshot_fn())
+        return True
+
+    def finish(self, stream):
+        """Forgets the stream's session here and in the store (its reps are in a saved report now)."""
+        with self.lock:
+            metadata = self.metadata.pop(stream, None)
+            self.current.pop(stream, None)
+            self.last_saved.pop(stream, None)
+        if metadata is not None:
+            self.store.delete(self._key(metadata["session"]))
+
+    def attach(self, response, stream):
+        """Adds the affinity cookie and node header for the stream's session to a Flask response."""
+        token = self.token(stream)
+        response.headers["X-FitPal-Node"] = self.node_id
+        if token:
+            response.set_cookie(AFFINITY_COOKIE, token, max_age=SESSION_TTL, httponly=True, samesite="Lax")
+        return response
@@ -1,70 +1,142 @@
-from flask import Blueprint, Response, jsonify
-import cv2
-import mediapipe as mp
+from flask import Blueprint, Response, jsonify, request
 import logging
+import threading
 import time
-from models.squats import Config, SquatCounter, process_squat_frame, save_progress
+from models.tracing import activate, get_tracer, span, trace_requested, enable_tracing, disable_tracing
 from resource_manager import ResourceManager
-from utils import save_report  # ⬅️ Import the new save_report utility
+from session_store import SessionManager
+from utils import save_report, dry_run_requested  # ⬅️ Import the new save_report utility
 
 logging.basicConfig(level=logging.INFO, format='%(asctime)s %(levelname)s: %(message)s')
 
 squats_bp = Blueprint('squats', __name__)
 resource_manager = ResourceManager.get_instance()
+sessions = SessionManager.get_instance()
 
-config = Config()
-squat_counter = SquatCounter(config)
-pose = resource_manager.get_pose()
-
-streaming_active = True
+STREAM = "squats"
+# models.squats pulls in cv2, MediaPipe and TensorFlow, so it is imported by exercise() on first use.
+_exercise = None
+_exercise_lock = threading.Lock()
+config = None
+squat_counter = None
 session_start_time = None
 
+def exercise():
+    """Imports the squat model stack and builds the counter the first time it is needed."""
+    global _exercise, config, squat_counter
+    with _exercise_lock:
+        if _exercise is None:
+            from models import squats
+            config = squats.Config()
+            squat_counter = squats.SquatCounter(config)
+            _exercise = squats
+    return _exercise
+
 @squats_bp.route('/start-squats', methods=['GET'])
 def start_squats():
-    global streaming_active, session_start_time
-    streaming_active = True
-    session_start_time = time.time()
+    global session_start_time
+    exercise()
+    resource_manager.start_stream(STREAM)
+    if trace_requested(request):
+        enable_tracing(STREAM)
+    else:
+        disable_tracing(STREAM)
+    session_id, saved = sessions.begin(STREAM, request, user=request.args.get("user", "anonymous"))
+    if saved:
+        squat_counter.restore(saved["counter"])
+        session_start_time = saved["session_start_time"]
+    else:
+        session_start_time = time.time()
     cam = resource_manager.init_camera(source=0)
     if not cam.isOpened():
         return jsonify({"message": "Error: Unable to access camera."}), 500
-    return jsonify({"message": "✅ Squat trainer started successfully!"})
+    return sessions.attach(jsonify({"message": "✅ Squat trainer started successfully!",
+                                    "session": session_id, "session_token": sessions.token(STREAM),
+                                    "reps": squat_counter.squat_count}), STREAM)
 
 @squats_bp.route('/video_feed/squats', methods=['GET'])
 def video_feed_squats():
+    if trace_requested(request):
+        enable_tracing(STREAM)
     if not resource_manager.init_camera().isOpened():
         return jsonify({"message": "Camera not started. Start workout first."}), 403
-    return Response(generate_frames(), mimetype="multipart/x-mixed-replace; boundary=frame")
+    return sessions.attach(Response(generate_frames(), mimetype="multipart/x-mixed-replace; boundary=frame"), STREAM)
 
-def generate_frames():
-    global streaming_active
-    cam = resource_manager.init_camera()
-    while streaming_active:
-        ret, frame = cam.read()
+def snapshot():
+    return {"counter": squat_counter.snapshot(), "session_start_time": session_start_time}
+
+def read_jpeg_frame(token=None, pool=None, preprocessor=None, gate=None, recorder=None, cv2=None, model=None):
+    """
+    Reads, annotates and encodes one camera frame. Returns None once the stream should stop.
+    Pass the same FramePool, InferencePreprocessor, PresenceGate and Recorder on every call (one of each per stream),
+    and bind cv2 and the exercise module once per stream so a frame takes neither the import nor the exercise lock.
+    """
+    if cv2 is None:
+        import cv2
+    squats = model or exercise()
+    token = token or resource_manager.stream_token(STREAM)
+    if token.cancelled:
+        return None
+    with activate(get_tracer(STREAM)), span("frame"):
+        with span("camera.read"):
+            ret, frame = pool.read('camera', resource_manager.read_frame) if pool is not None else resource_manager.read_frame()
         if not ret:
-            break
-        processed_frame = process_squat_frame(frame, squat_counter, config, pose)
-        ret2, buffer = cv2.imencode('.jpg', processed_frame)
-        if not ret2:
-            break
-        yield (b'--frame\r\n'
-               b'Content-Type: image/jpeg\r\n\r\n' + buffer.tobytes() + b'\r\n')
+            return None
+        with span("process"):
+            processed_frame = squats.process_squat_frame(frame, squat_counter, config, resource_manager.get_pose(), pool, preprocessor, gate)
+        if recorder is not None:
+            with span("record"):
+                recorder.offer(processed_frame, squat_counter.squat_count, squat_counter.last_rep_time)
+        with span("jpeg.encode"):
+            ret2, buffer = cv2.imencode('.jpg', processed_frame)
+        sessions.checkpoint(STREAM, snapshot)
+    if not ret2:
+        return None
+    return buffer.tobytes()
+
+def session_stats():
+    exercise()
+    return {"reps": squat_counter.squat_count, "active": not resource_manager.stream_token(STREAM).cancelled}
+
+def generate_frames():
+    import cv2
+    from models.frame_pool import FramePool
+    from models.preprocess import InferencePreprocessor
+    from models.presence import new_presence_gate
+    from models.recorder import new_recorder
+    token = resource_manager.stream_token(STREAM)
+    pool = FramePool()
+    preprocessor = InferencePreprocessor(pool=pool)
+    gate = new_presence_gate()
+    recorder = new_recorder(STREAM)
+    model = exercise()
+    with token:
+        while True:
+            jpeg = read_jpeg_frame(token, pool, preprocessor, gate, recorder, cv2, model)
+            if jpeg is None:
+                break
+            yield (b'--frame\r\n'
+                   b'Content-Type: image/jpeg\r\n\r\n' + jpeg + b'\r\n')
 
 @squats_bp.route('/end-squats', methods=['GET'])
 def end_squats():
-    global streaming_active
-    streaming_active = False
-    resource_manager.release_camera()
-    return jsonify({"message": "🏁 Squat workout ended.", "reps": squat_counter.squat_count})
+    resource_manager.end_stream(STREAM)
+    if _exercise is not None:  # Nothing to save, nor any reason to load the models, if it never started
+        sessions.checkpoint(STREAM, snapshot, force=True)
+    return jsonify({"message": "🏁 Squat workout ended.", "reps": squat_counter.squat_count if _exercise is not None else 0})
 
 @squats_bp.route('/generate-squats-report', methods=['GET'])
 def generate_report():
     global session_start_time
+    exercise()
     end_time = time.time()
     duration = round(end_time - session_start_time, 2) if session_start_time else 0
     reps = squat_counter.squat_count
 
-    report = save_report("squats", reps, duration, mode="default")
+    report = save_report("squats", reps, duration, mode="default", user=request.args.get("user", "anonymous"),
+                         session=sessions.session_id(STREAM), dry_run=dry_run_requested(request))
     squat_counter.reset()
+    sessions.finish(STREAM)
 
     return jsonify({
         "message": "📄 Report generated successfully!",
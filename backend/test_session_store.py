@@ -0,0 +1,53 @@
+"""
+Session store round trip over the in-process Redis stand-in:
+
+    python -m unittest test_session_store
+"""
+import unittest
+from flask import Flask, request
+
+from session_store import AFFINITY_COOKIE, KEY_PREFIX, LocalRedis, RedisStore, SessionManager, issue_token
+
+SECRET = b"test-secret"
+
+class SessionStoreTest(unittest.TestCase):
+    def setUp(self):
+        self.app = Flask(__name__)
+        self.store = RedisStore(LocalRedis())
+        self.node_a = SessionManager(self.store, node_id="node-a", secret=SECRET)
+        self.node_b = SessionManager(self.store, node_id="node-b", secret=SECRET)
+
+    def begin(self, node, path="/start-squats", **kwargs):
+        with self.app.test_request_context(path, **kwargs):
+            return node.begin("squats", request, user="u1")
+
+    def test_resume_on_another_node(self):
+        session_id, snapshot = self.begin(self.node_a)
+        self.assertIsNone(snapshot)
+        self.node_a.checkpoint("squats", lambda: {"counter": {"squat_count": 7}}, force=True)
+
+        token = self.node_a.token("squats")
+        resumed, snapshot = self.begin(self.node_b, f"/start-squats?session_token={token}")
+        self.assertEqual(resumed, session_id)
+        self.assertEqual(snapshot, {"counter": {"squat_count": 7}})
+        self.assertEqual(self.store.get(KEY_PREFIX + session_id)["owner"], "node-b")
+
+        # The affinity cookie works the same way.
+        with self.app.test_request_context("/", headers={"Cookie": f"{AFFINITY_COOKIE}={token}"}):
+            self.assertEqual(self.node_b.requested_session(request), session_id)
+
+        self.node_b.finish("squats")
+        self.assertIsNone(self.store.get(KEY_PREFIX + session_id))
+
+    def test_bare_or_forged_session_id_starts_fresh(self):
+        session_id, _ = self.begin(self.node_a)
+        self.node_a.checkpoint("squats", lambda: {"counter": {"squat_count": 3}}, force=True)
+
+        for path in (f"/start-squats?session={session_id}",
+                     f"/start-squats?session_token={issue_token(session_id, 'node-a', secret=b'wrong')}"):
+            other, snapshot = self.begin(self.node_b, path)
+            self.assertNotEqual(other, session_id)
+            self.assertIsNone(snapshot)
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,56 @@
+import json
+import threading
+from flask import Blueprint, Response, jsonify, request
+from models.tracing import SamplingProfiler, enable_tracing, disable_tracing, get_tracer
+
+tracing_bp = Blueprint('tracing', __name__)
+
+MAX_PROFILE_SECONDS = 120
+profiler = None
+profiler_lock = threading.Lock()
+
+def attachment(body, filename, mimetype):
+    return Response(body, mimetype=mimetype,
+                    headers={"Content-Disposition": f"attachment; filename={filename}"})
+
+# ----- PER-SESSION TRACES -----
+@tracing_bp.route('/trace/<session>/start', methods=['GET', 'POST'])
+def start_trace(session):
+    enable_tracing(session)
+    return jsonify({"message": f"Tracing {session}.", "session": session})
+
+@tracing_bp.route('/trace/<session>/stop', methods=['GET', 'POST'])
+def stop_trace(session):
+    tracer = disable_tracing(session)
+    if tracer is None:
+        return jsonify({"message": f"{session} is not being traced."}), 404
+    return attachment(json.dumps(tracer.chrome_trace()), f"{session}-trace.json", "application/json")
+
+@tracing_bp.route('/trace/<session>', methods=['GET'])
+def download_trace(session):
+    # Snapshot of a running trace; recording continues.
+    tracer = get_tracer(session)
+    if tracer is None:
+        return jsonify({"message": f"{session} is not being traced."}), 404
+    return attachment(json.dumps(tracer.chrome_trace()), f"{session}-trace.json", "application/json")
+
+# ----- SAMPLING PROFILER -----
+@tracing_bp.route('/profile/start', methods=['GET', 'POST'])
+def start_profile():
+    global profiler
+    seconds = min(request.args.get('seconds', 10, type=float), MAX_PROFILE_SECONDS)
+    with profiler_lock:
+        if profiler is not None and profiler.running:
+            return jsonify({"message": "A profile is already running."}), 409
+        profiler = SamplingProfiler(seconds).start()
+    return jsonify({"message": f"Profiling for {seconds}s.", "seconds": seconds})
+
+@tracing_bp.route('/profile', methods=['GET'])
+def download_profile():
+    if profiler is None:
+        return jsonify({"message": "No profile has been recorded."}), 404
+    if profiler.running:
+        return jsonify({"message": "Profile still running."}), 409
+    if request.args.get('format', 'speedscope') == 'folded':
+        return attachment(profiler.folded(), "fitpal-profile.folded", "text/plain")
+    return attachment(json.dumps(profiler.speedscope()), "fitpal-profile.speedscope.json", "application/json")
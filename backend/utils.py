@@ -1,7 +1,22 @@
-import json
 from datetime import datetime
+from persistence import PersistenceQueue
+from report_rollups import ReportRollups
 
-def save_report(workout_type, reps, duration, mode="default", filename="reports.json"):
+persistence = PersistenceQueue.get_instance()
+# The summary tables are written once per batch of reports rather than on every save.
+persistence.after_flush.append(ReportRollups.get_instance().persist)
+
+def dry_run_requested(request):
+    """True if a report request asks with ?dry_run=1 not to save the report (load_test.py does)."""
+    return request.args.get("dry_run") == "1"
+
+def save_report(workout_type, reps, duration, mode="default", filename="reports.json", user="anonymous",
+                session=None, dry_run=False):
+    """
+    Builds a session report and queues it for the write-behind worker (see persistence.py).
+    The summary tables are updated right away, so /reports/* queries include it at once.
+    With dry_run=True the report is only built, leaving reports.json and the summary tables alone.
+    """
     calories_per_rep = {
         "pushups": 0.29,
         "squats": 0.32,
@@ -9,24 +24,24 @@ def save_report(workout_type, reps, duration, mode="default", filename="reports.
     }
     calories = round(calories_per_rep.get(workout_type, 0.3) * reps, 2)
 
+    timestamp = datetime.utcnow().isoformat()
     report = {
+        "user": user,
+        "session": session or timestamp,
         "workout": workout_type,
-        "timestamp": datetime.utcnow().isoformat(),
+        "timestamp": timestamp,
         "reps": reps,
         "duration_sec": duration,
         "mode": mode,
         "calories": calories
     }
 
-    try:
-        with open(filename, 'r') as f:
-            data = json.load(f)
-    except (FileNotFoundError, json.JSONDecodeError):
-        data = []
-
-    data.append(report)
+    if dry_run:
+        return report
 
-    with open(filename, 'w') as f:
-        json.dump(data, f, indent=2)
+    # Keep the summary tables behind the /reports/* queries in step with the raw log;
+    # they are written to disk after each batch of reports.
+    ReportRollups.get_instance().add_report(report, persist=False)
+    persistence.submit("report", filename, user=user, session=report["session"], report=report)
 
     return report
\ No newline at end of file
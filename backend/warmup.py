@@ -0,0 +1,120 @@
+# warmup.py
+
+import logging
+import os
+import threading
+import time
+
+from resource_manager import ResourceManager
+
+WARMUP_ENABLED = os.environ.get("FITPAL_WARMUP", "1") != "0"
+WARMUP_BACKENDS = [b.strip() for b in os.environ.get("FITPAL_WARMUP_BACKENDS", "mediapipe,movenet").split(",") if b.strip()]
+REQUIRE_CAMERA = os.environ.get("FITPAL_REQUIRE_CAMERA", "1") != "0"
+WARMUP_FRAME_SHAPE = (480, 640, 3)   # Typical webcam frame, so traced shapes match real traffic
+WARMUP_ITERATIONS = 2                # The first call builds/traces the graph, the second checks it is fast
+CAMERA_PROBE_MAX_AGE = 30            # Seconds a camera probe result is reused by /readyz
+
+def _warm_mediapipe(frame):
+    pose = ResourceManager.get_instance().get_pose()
+    for _ in range(WARMUP_ITERATIONS):
+        pose.process(frame)
+
+def _warm_movenet(frame):
+    from models.pose_estimation import detect_pose  # The first call loads TensorFlow and the TF Hub model
+    for _ in range(WARMUP_ITERATIONS):
+        detect_pose(frame)
+
+WARMERS = {
+    "mediapipe": _warm_mediapipe,
+    "movenet": _warm_movenet,
+}
+
+class Warmup:
+    """
+    Loads the configured pose backends and runs dummy inferences on a background
+    thread at startup, so the first /video_feed/* request does not pay for graph
+    construction and tracing. Timings for each phase are reported by /readyz.
+    """
+    _instance = None
+    _lock = threading.Lock()
+
+    def __init__(self, backends=None, camera_source=0):
+        if backends is None:
+            backends = WARMUP_BACKENDS if WARMUP_ENABLED else []
+        self.backends = backends
+        self.camera_source = camera_source
+        self.started_at = time.time()
+        self.phases = {name: {"status": "pending"} for name in self.backends}
+        self.thread = None
+        self.camera_probe = None
+
+    @classmethod
+    def get_instance(cls):
+        with cls._lock:
+            if cls._instance is None:
+                cls._instance = cls()
+            return cls._instance
+
+    def start(self):
+        if self.thread is not None:
+            return
+        self.thread = threading.Thread(target=self._run, name="warmup", daemon=True)
+        self.thread.start()
+
+    def _run(self):
+        import numpy as np
+        frame = np.zeros(WARMUP_FRAME_SHAPE, dtype=np.uint8)
+        for name in self.backends:
+            warmer = WARMERS.get(name)
+            if warmer is None:
+                self.phases[name] = {"status": "failed", "error": f"Unknown backend: {name}"}
+                continue
+            self.phases[name] = {"status": "running"}
+            start = time.perf_counter()
+            try:
+                warmer(frame)
+            except Exception as e:
+                logging.exception("Warm-up of %s failed", name)
+                self.phases[name] = {"status": "failed", "error": str(e),
+                                     "seconds": round(time.perf_counter() - start, 3)}
+                continue
+            self.phases[name] = {"status": "done", "seconds": round(time.perf_counter() - start, 3)}
+            logging.info("Warmed up %s in %.2fs", name, self.phases[name]["seconds"])
+        self.probe_camera(max_age=0)
+
+    def probe_camera(self, max_age=CAMERA_PROBE_MAX_AGE):
+        """Checks that the camera can be opened, reusing a recent result to keep /readyz cheap."""
+        if self.camera_probe is not None and time.time() - self.camera_probe["checked_at"] < max_age:
+            return self.camera_probe
+        import cv2
+        resource_manager = ResourceManager.get_instance()
+        start = time.perf_counter()
+        with resource_manager.camera_lock:
+            if resource_manager.camera is not None and resource_manager.camera.isOpened():
+                available = True  # Already held by a session.
+            else:
+                cam = cv2.VideoCapture(self.camera_source)
+                available = cam.isOpened()
+                cam.release()
+        self.camera_probe = {
+            "available": available,
+            "seconds": round(time.perf_counter() - start, 3),
+            "checked_at": time.time(),
+        }
+        return self.camera_probe
+
+    @property
+    def models_ready(self):
+        return all(phase["status"] == "done" for phase in self.phases.values())
+
+    def status(self):
+        models_ready = self.models_ready
+        camera = self.probe_camera() if models_ready and REQUIRE_CAMERA else self.camera_probe
+        camera_ok = not REQUIRE_CAMERA or bool(camera and camera["available"])
+        return {
+            "ready": models_ready and camera_ok,
+            "models_ready": models_ready,
+            "camera": camera,
+            "phases": self.phases,
+            "uptime_sec": round(time.time() - self.started_at, 2),
+        }